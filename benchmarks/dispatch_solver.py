@@ -0,0 +1,72 @@
+"""Courier dispatch: solver time and fleet utilization on synthetic fleets.
+
+Generates --parcels pending parcels around --hubs pickup hotspots in Nairobi
+and, for each fleet size, times utils/dispatch_solver.solve_dispatch inline
+and through a process pool (what POST /api/admin/dispatch uses), then
+reports how many parcels were assigned and how full the couriers are:
+
+    python benchmarks/dispatch_solver.py --parcels 10000 --fleets 100 400 1000
+
+--capacity is each courier's spare capacity in kg (DISPATCH_COURIER_CAPACITY_KG).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from utils.dispatch_solver import solve_dispatch  # noqa: E402
+
+
+def synthetic_batch(parcels, hubs, seed=42):
+    rng = random.Random(seed)
+    centres = [(-1.29 + rng.uniform(-0.15, 0.15), 36.82 + rng.uniform(-0.15, 0.15)) for _ in range(hubs)]
+    lat, lng, weights = [], [], []
+    for _ in range(parcels):
+        hub_lat, hub_lng = rng.choice(centres)
+        lat.append(hub_lat + rng.gauss(0, 0.01))
+        lng.append(hub_lng + rng.gauss(0, 0.01))
+        weights.append(round(min(rng.expovariate(1 / 4), 60), 1))
+    return {'parcel_ids': list(range(1, parcels + 1)), 'lat': lat, 'lng': lng, 'weights': weights}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--parcels', type=int, default=10000)
+    parser.add_argument('--hubs', type=int, default=25)
+    parser.add_argument('--fleets', type=int, nargs='+', default=[100, 400, 1000])
+    parser.add_argument('--capacity', type=float, default=100.0)
+    args = parser.parse_args()
+
+    batch = synthetic_batch(args.parcels, args.hubs)
+    total_weight = sum(batch['weights'])
+    print(f'{args.parcels} parcels, {total_weight:.0f} kg around {args.hubs} hubs')
+
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        pool.submit(sum, []).result()  # start the worker before timing
+        for fleet in args.fleets:
+            couriers = {'courier_ids': list(range(1, fleet + 1)), 'capacities': [args.capacity] * fleet}
+
+            began = time.perf_counter()
+            assignments, unassigned = solve_dispatch(**batch, **couriers)
+            inline = (time.perf_counter() - began) * 1000
+
+            began = time.perf_counter()
+            pool.submit(solve_dispatch, **batch, **couriers).result()
+            pooled = (time.perf_counter() - began) * 1000
+
+            loads = {}
+            for parcel_id, courier_id in assignments.items():
+                loads[courier_id] = loads.get(courier_id, 0) + batch['weights'][parcel_id - 1]
+            used = sum(loads.values())
+            print(f'  {fleet:>5} couriers: inline {inline:7.1f} ms, pool {pooled:7.1f} ms; '
+                  f'{len(assignments)} assigned, {len(unassigned)} unassigned, '
+                  f'{used / (fleet * args.capacity):.0%} of fleet capacity used, '
+                  f'max load {max(loads.values(), default=0):.1f} kg')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Login throughput and parcel-request latency during a login burst.
+
+Fires --logins concurrent logins from --concurrency threads against the app
+in-process while another thread keeps hitting the public tracking endpoint,
+then reports logins/s, login latency and how long the tracking requests
+took meanwhile. Run it once per PASSWORD_HASH_WORKERS value to compare:
+
+    python benchmarks/login_throughput.py --hash-workers 1 2 4 --concurrency 32
+
+Logins that were shed with 503 (no hashing slot within
+PASSWORD_HASH_QUEUE_TIMEOUT) are counted separately.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+BASE_URL = 'https://localhost'
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def build_app(hash_workers, queue_timeout, users):
+    from app import create_app
+    from models import db, User, Parcel
+
+    app = create_app()
+    app.config.update(
+        TESTING=True,
+        PASSWORD_HASH_WORKERS=hash_workers,
+        PASSWORD_HASH_QUEUE_TIMEOUT=queue_timeout,
+        EMAIL_OUTBOX_WORKERS=0,
+    )
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        template = User(name='seed', email='seed@example.com', phone='0700000000')
+        template.set_password('password123')
+        password_hash = template.password_hash
+        db.session.add_all([
+            User(name=f'User {i}', email=f'user{i}@example.com', phone='0700000000',
+                 password_hash=password_hash)
+            for i in range(users)
+        ])
+        db.session.flush()
+        db.session.add(Parcel(
+            tracking_number='DELBENCH', sender_name='a', receiver_name='b',
+            pickup_address='a', destination_address='b', pickup_lat=0, pickup_lng=0,
+            destination_lat=1, destination_lng=1, weight=1, price=1, user_id=1
+        ))
+        db.session.commit()
+    return app
+
+
+def run(app, logins, concurrency, users):
+    statuses, latencies, tracking = [], [], []
+    done = threading.Event()
+
+    def login(n):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post('/api/auth/login', base_url=BASE_URL, json={
+            'email': f'user{n % users}@example.com', 'password': 'password123'
+        })
+        latencies.append(time.perf_counter() - start)
+        statuses.append(response.status_code)
+
+    def track():
+        client = app.test_client()
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get('/api/parcels/track/DELBENCH', base_url=BASE_URL)
+            tracking.append(time.perf_counter() - start)
+
+    tracker = threading.Thread(target=track)
+    tracker.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    tracker.join()
+
+    ok = [latency for latency, status in zip(latencies, statuses) if status == 200]
+    return {
+        'logins/s': len(ok) / elapsed,
+        'shed (503)': statuses.count(503),
+        'login p50 ms': percentile(ok, 50) * 1000,
+        'login p95 ms': percentile(ok, 95) * 1000,
+        'tracking p50 ms': percentile(tracking, 50) * 1000,
+        'tracking p95 ms': percentile(tracking, 95) * 1000,
+        'tracking requests': len(tracking),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='database URL (default: temporary SQLite file)')
+    parser.add_argument('--hash-workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--queue-timeout', type=float, default=5.0)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--users', type=int, default=50)
+    args = parser.parse_args()
+
+    # Read by Config when the app module is first imported
+    os.environ['DATABASE_URL'] = args.url or f'sqlite:///{os.path.join(tempfile.mkdtemp(), "bench_login.db")}'
+    for workers in args.hash_workers:
+        app = build_app(workers, args.queue_timeout, args.users)
+        results = run(app, args.logins, args.concurrency, args.users)
+        print(f'PASSWORD_HASH_WORKERS={workers}')
+        for name, value in results.items():
+            print(f'  {name:<18} {value:10.1f}' if isinstance(value, float) else f'  {name:<18} {value:10d}')
+
+
+if __name__ == '__main__':
+    main()
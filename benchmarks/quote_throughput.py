@@ -0,0 +1,65 @@
+"""Batch quoting: the vectorized pricing engine against pricing item by item.
+
+Builds a synthetic merchant CSV (--items shipments from --depots pickup
+points to random destinations around Nairobi) and times utils/pricing.quote
+on the whole batch, cold and with the distance memo warm, against calling
+quote_price once per item:
+
+    python benchmarks/quote_throughput.py --items 10000 --depots 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - began) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--depots', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from app import create_app
+    from utils.pricing import quote, quote_price
+
+    rng = random.Random(42)
+    depots = [(-1.29 + rng.uniform(-0.05, 0.05), 36.82 + rng.uniform(-0.05, 0.05)) for _ in range(args.depots)]
+    weights, coords = [], []
+    for _ in range(args.items):
+        pickup = rng.choice(depots)
+        weights.append(round(rng.uniform(0.1, 50), 1))
+        coords.append((*pickup, -1.29 + rng.uniform(-0.5, 0.5), 36.82 + rng.uniform(-0.5, 0.5)))
+
+    app = create_app()
+    with app.app_context():
+        app.extensions.pop('deliveroo_distance_memo', None)
+        began = time.perf_counter()
+        quote(weights, coords)
+        cold = (time.perf_counter() - began) * 1000
+        warm = timed(lambda: quote(weights, coords), args.repeat)
+        per_item = timed(lambda: [
+            quote_price(weight, {'lat': c[0], 'lng': c[1]}, {'lat': c[2], 'lng': c[3]})
+            for weight, c in zip(weights, coords)
+        ], 1)
+
+    print(f'{args.items} quotes: batch {cold:.1f} ms cold, {warm:.1f} ms warm; '
+          f'one call per item {per_item:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Courier route planning: route quality and latency against the time budget.
+
+For each stop count, builds --routes synthetic couriers around Nairobi
+(half their parcels still to be picked up) and plans each with
+utils/routing.plan_route, reporting the nearest-neighbour distance, the
+distance after 2-opt, how long planning took and how often 2-opt finished
+inside the budget. Every route is planned twice, the second time with its
+distance matrix cached:
+
+    python benchmarks/route_planner.py --parcels 25 100 250 --budget-ms 50 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+
+def synthetic_stops(parcels, rng):
+    coords, pickup_of = [], []
+    for i in range(parcels):
+        pickup = -1
+        if i % 2 == 0:
+            pickup = len(coords)
+            coords.append((-1.29 + rng.uniform(-0.1, 0.1), 36.82 + rng.uniform(-0.1, 0.1)))
+            pickup_of.append(-1)
+        coords.append((-1.29 + rng.uniform(-0.1, 0.1), 36.82 + rng.uniform(-0.1, 0.1)))
+        pickup_of.append(pickup)
+    return coords, pickup_of
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--parcels', type=int, nargs='+', default=[25, 100, 250])
+    parser.add_argument('--budget-ms', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--routes', type=int, default=10)
+    args = parser.parse_args()
+
+    from app import create_app
+    from utils.routing import plan_route
+
+    app = create_app()
+    with app.app_context():
+        for budget_ms in args.budget_ms:
+            print(f'budget {budget_ms} ms')
+            for parcels in args.parcels:
+                rng = random.Random(parcels)
+                app.extensions.pop('deliveroo_route_matrices', None)
+                cold, warm, gains, converged = [], [], [], 0
+                for _ in range(args.routes):
+                    coords, pickup_of = synthetic_stops(parcels, rng)
+                    start = (-1.29, 36.82)
+                    plan = plan_route(coords, pickup_of, start=start, budget=budget_ms / 1000)
+                    cold.append(plan['elapsedMs'])
+                    warm.append(plan_route(coords, pickup_of, start=start, budget=budget_ms / 1000)['elapsedMs'])
+                    gains.append(1 - plan['distance'] / plan['initialDistance'])
+                    converged += plan['converged']
+                print(f'  {len(coords):>4} stops: nearest neighbour -> 2-opt {statistics.mean(gains):5.1%} shorter, '
+                      f'{statistics.median(cold):6.1f} ms cold, {statistics.median(warm):6.1f} ms cached, '
+                      f'max {max(cold + warm):6.1f} ms, converged {converged}/{args.routes}')
+
+
+if __name__ == '__main__':
+    main()
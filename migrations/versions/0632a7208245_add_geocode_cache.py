@@ -0,0 +1,33 @@
+"""Add geocode cache
+
+Revision ID: 0632a7208245
+Revises: cf4f70b0843c
+Create Date: 2026-10-18 12:05:31.902214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0632a7208245'
+down_revision = 'cf4f70b0843c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('geocode_cache',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('address_key', sa.String(length=500), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('provider', sa.String(length=50), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('address_key')
+    )
+
+
+def downgrade():
+    op.drop_table('geocode_cache')
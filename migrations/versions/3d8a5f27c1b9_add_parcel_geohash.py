@@ -0,0 +1,29 @@
+"""Add parcel geohash
+
+Revision ID: 3d8a5f27c1b9
+Revises: 9b7e1c4d2a61
+Create Date: 2026-10-18 16:12:48.530719
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d8a5f27c1b9'
+down_revision = '9b7e1c4d2a61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows are filled in afterwards with `flask geo backfill`
+    with op.batch_alter_table('parcel', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geohash', sa.String(length=12), nullable=True))
+        batch_op.create_index('ix_parcel_geohash', ['geohash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('parcel', schema=None) as batch_op:
+        batch_op.drop_index('ix_parcel_geohash')
+        batch_op.drop_column('geohash')
@@ -0,0 +1,42 @@
+"""Add analytics rollup tables
+
+Revision ID: 7c2e9a4b5d13
+Revises: 3d8a5f27c1b9
+Create Date: 2026-10-18 17:03:21.644152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e9a4b5d13'
+down_revision = '3d8a5f27c1b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled in from existing parcels with `flask analytics backfill`
+    op.create_table('daily_parcel_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('created', sa.Integer(), nullable=False),
+    sa.Column('created_revenue', sa.Float(), nullable=False),
+    sa.Column('created_weight', sa.Float(), nullable=False),
+    sa.Column('delivered', sa.Integer(), nullable=False),
+    sa.Column('delivered_revenue', sa.Float(), nullable=False),
+    sa.Column('delivered_weight', sa.Float(), nullable=False),
+    sa.Column('delivery_seconds', sa.Float(), nullable=False),
+    sa.Column('cancelled', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    op.create_table('parcel_status_count',
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('status')
+    )
+
+
+def downgrade():
+    op.drop_table('parcel_status_count')
+    op.drop_table('daily_parcel_stats')
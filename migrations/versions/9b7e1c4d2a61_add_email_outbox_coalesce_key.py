@@ -0,0 +1,28 @@
+"""Add email outbox coalesce key
+
+Revision ID: 9b7e1c4d2a61
+Revises: 0477323f19f5
+Create Date: 2026-10-18 14:05:37.912204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b7e1c4d2a61'
+down_revision = '0477323f19f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('coalesce_key', sa.String(length=255), nullable=True))
+        batch_op.create_index('ix_email_outbox_coalesce_key_status', ['coalesce_key', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_email_outbox_coalesce_key_status')
+        batch_op.drop_column('coalesce_key')
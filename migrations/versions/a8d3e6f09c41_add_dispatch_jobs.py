@@ -0,0 +1,38 @@
+"""Add dispatch jobs
+
+Revision ID: a8d3e6f09c41
+Revises: e5a9c3f71b28
+Create Date: 2026-10-18 22:04:17.318420
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d3e6f09c41'
+down_revision = 'e5a9c3f71b28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('dispatch_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('running', sa.Boolean(), nullable=True),
+    sa.Column('parcels', sa.Integer(), nullable=True),
+    sa.Column('couriers', sa.Integer(), nullable=True),
+    sa.Column('assigned', sa.Integer(), nullable=True),
+    sa.Column('unassigned', sa.Integer(), nullable=True),
+    sa.Column('skipped', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('running')
+    )
+
+
+def downgrade():
+    op.drop_table('dispatch_jobs')
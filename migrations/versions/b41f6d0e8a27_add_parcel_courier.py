@@ -0,0 +1,30 @@
+"""Add parcel courier
+
+Revision ID: b41f6d0e8a27
+Revises: 7c2e9a4b5d13
+Create Date: 2026-10-18 18:20:54.218337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41f6d0e8a27'
+down_revision = '7c2e9a4b5d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('parcel', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('courier_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_parcel_courier_id_users', 'users', ['courier_id'], ['id'])
+        batch_op.create_index('ix_parcel_courier_id_status', ['courier_id', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('parcel', schema=None) as batch_op:
+        batch_op.drop_index('ix_parcel_courier_id_status')
+        batch_op.drop_constraint('fk_parcel_courier_id_users', type_='foreignkey')
+        batch_op.drop_column('courier_id')
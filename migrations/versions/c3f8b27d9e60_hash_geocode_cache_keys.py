@@ -0,0 +1,54 @@
+"""Hash geocode cache keys
+
+Revision ID: c3f8b27d9e60
+Revises: a8d3e6f09c41
+Create Date: 2026-10-19 09:41:26.205873
+
+"""
+import hashlib
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8b27d9e60'
+down_revision = 'a8d3e6f09c41'
+branch_labels = None
+depends_on = None
+
+geocode_cache = sa.table('geocode_cache',
+                         sa.column('id', sa.Integer), sa.column('address_key', sa.String), sa.column('address', sa.Text))
+
+
+def upgrade():
+    # address_key becomes the sha1 of the normalized address, which moves to address
+    with op.batch_alter_table('geocode_cache', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('address', sa.Text(), nullable=True))
+
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(geocode_cache.c.id, geocode_cache.c.address_key)).all()
+    if rows:
+        connection.execute(
+            geocode_cache.update().where(geocode_cache.c.id == sa.bindparam('row_id')).values(
+                address=sa.bindparam('text'), address_key=sa.bindparam('key')
+            ),
+            [{'row_id': row.id, 'text': row.address_key,
+              'key': hashlib.sha1(row.address_key.encode()).hexdigest()} for row in rows]
+        )
+
+    with op.batch_alter_table('geocode_cache', schema=None) as batch_op:
+        batch_op.alter_column('address', existing_type=sa.Text(), nullable=False)
+        batch_op.alter_column('address_key', existing_type=sa.String(length=500), type_=sa.String(length=40),
+                              existing_nullable=False)
+
+
+def downgrade():
+    connection = op.get_bind()
+    # Addresses that didn't fit the old key are only a cache, drop them
+    connection.execute(geocode_cache.delete().where(sa.func.length(geocode_cache.c.address) > 500))
+    with op.batch_alter_table('geocode_cache', schema=None) as batch_op:
+        batch_op.alter_column('address_key', existing_type=sa.String(length=40), type_=sa.String(length=500),
+                              existing_nullable=False)
+    connection.execute(geocode_cache.update().values(address_key=geocode_cache.c.address))
+    with op.batch_alter_table('geocode_cache', schema=None) as batch_op:
+        batch_op.drop_column('address')
@@ -0,0 +1,28 @@
+"""Hot query path indexes
+
+Revision ID: cf4f70b0843c
+Revises: f59b06279e72
+Create Date: 2026-10-18 10:41:07.118344
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cf4f70b0843c'
+down_revision = 'f59b06279e72'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # (user_id, created_at, id) already comes from f59b06279e72 and covers
+    # get_user_parcels, so only the timeline and status paths are added here
+    op.create_index('ix_location_parcel_id_timestamp', 'location', ['parcel_id', 'timestamp'], unique=False)
+    op.create_index('ix_parcel_status_updated_at', 'parcel', ['status', 'updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_parcel_status_updated_at', table_name='parcel')
+    op.drop_index('ix_location_parcel_id_timestamp', table_name='location')
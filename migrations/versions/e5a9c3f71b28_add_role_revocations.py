@@ -0,0 +1,29 @@
+"""Add role revocations
+
+Revision ID: e5a9c3f71b28
+Revises: b41f6d0e8a27
+Create Date: 2026-10-18 21:12:40.537129
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a9c3f71b28'
+down_revision = 'b41f6d0e8a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('role_revocations',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('revoked_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('role_revocations')
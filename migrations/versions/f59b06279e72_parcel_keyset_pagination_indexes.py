@@ -0,0 +1,26 @@
+"""Parcel keyset pagination indexes
+
+Revision ID: f59b06279e72
+Revises: 5f01d9744513
+Create Date: 2026-10-18 09:12:44.531802
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f59b06279e72'
+down_revision = '5f01d9744513'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_parcel_created_at_id', 'parcel', ['created_at', 'id'], unique=False)
+    op.create_index('ix_parcel_user_id_created_at_id', 'parcel', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_parcel_user_id_created_at_id', table_name='parcel')
+    op.drop_index('ix_parcel_created_at_id', table_name='parcel')
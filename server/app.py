@@ -10,6 +10,12 @@ from models import db
 from routes.auth_routes import auth_bp
 from routes.parcel_routes import parcel_bp
 from routes.admin_routes import admin_bp
+from utils.query_counter import init_query_counter
+from utils.outbox import init_outbox
+from utils.location_buffer import init_location_buffer
+from utils.analytics import init_analytics
+from utils.clusters import init_clusters
+from commands import register_commands
 
 migrate = Migrate()
 mail = Mail()
@@ -30,6 +36,12 @@ def create_app():
     migrate.init_app(app, db)
     JWTManager(app)
     mail.init_app(app)
+    init_query_counter(app)
+    init_outbox(app)
+    init_location_buffer(app)
+    init_analytics(app)
+    init_clusters(app)
+    register_commands(app)
     
 
     # Register blueprints
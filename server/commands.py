@@ -0,0 +1,93 @@
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from utils.outbox import drain_outbox, OutboxWorkerPool
+from utils.location_buffer import flush_location_buffer
+from utils.trajectory import compact_trajectories
+from utils.nearby import backfill_geohashes
+from utils.analytics import backfill_rollups
+from utils.dispatch import run_dispatch
+
+outbox_cli = AppGroup('outbox', help='Email outbox maintenance.')
+
+@outbox_cli.command('drain')
+def drain_outbox_command():
+    """Send every due outbox email, then exit (e.g. from cron)."""
+    total = 0
+    while True:
+        processed = drain_outbox()
+        if not processed:
+            break
+        total += processed
+    click.echo(f'Processed {total} outbox emails')
+
+@outbox_cli.command('work')
+@click.option('--workers', type=int, default=None, help='Defaults to EMAIL_OUTBOX_WORKERS.')
+def work_outbox_command(workers):
+    """Run the outbox worker pool in the foreground."""
+    app = current_app._get_current_object()
+    pool = OutboxWorkerPool(app, workers or app.config['EMAIL_OUTBOX_WORKERS'] or 1,
+                            app.config['EMAIL_OUTBOX_POLL_INTERVAL'])
+    pool.start()
+    click.echo(f'Outbox worker pool running with {pool.workers} workers')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pool.stop()
+
+locations_cli = AppGroup('locations', help='Parcel location maintenance.')
+
+@locations_cli.command('flush')
+def flush_locations_command():
+    """Write buffered GPS pings now (only useful with the redis backend)."""
+    click.echo(f'Flushed {flush_location_buffer()} buffered locations')
+
+@locations_cli.command('compact')
+@click.option('--tolerance', type=float, default=None, help='Meters, defaults to TRAJECTORY_TOLERANCE_M.')
+@click.option('--max-gap', type=int, default=None, help='Seconds, defaults to TRAJECTORY_MAX_GAP.')
+@click.option('--min-age', type=int, default=None, help='Seconds, defaults to TRAJECTORY_COMPACT_MIN_AGE.')
+def compact_locations_command(tolerance, max_gap, min_age):
+    """Simplify stored GPS trails, keeping status changes (e.g. nightly from cron)."""
+    config = current_app.config
+    compacted, deleted = compact_trajectories(
+        tolerance if tolerance is not None else config['TRAJECTORY_TOLERANCE_M'],
+        max_gap_s=max_gap if max_gap is not None else config['TRAJECTORY_MAX_GAP'],
+        min_age_s=min_age if min_age is not None else config['TRAJECTORY_COMPACT_MIN_AGE'],
+        batch_size=config['TRAJECTORY_COMPACT_BATCH_SIZE']
+    )
+    click.echo(f'Deleted {deleted} locations from {compacted} parcels')
+
+geo_cli = AppGroup('geo', help='Parcel geohash maintenance.')
+
+@geo_cli.command('backfill')
+@click.option('--batch-size', type=int, default=1000)
+@click.option('--all', 'recompute', is_flag=True, help='Recompute every geohash, not just missing ones.')
+def backfill_geohash_command(batch_size, recompute):
+    """Fill in parcel geohashes, e.g. after the column was added."""
+    click.echo(f'Updated {backfill_geohashes(batch_size, recompute)} parcel geohashes')
+
+analytics_cli = AppGroup('analytics', help='Analytics rollup maintenance.')
+
+@analytics_cli.command('backfill')
+def backfill_analytics_command():
+    """Rebuild the analytics rollups from all parcels (after deploying, or to repair drift)."""
+    click.echo(f'Rebuilt analytics rollups from {backfill_rollups()} parcels')
+
+dispatch_cli = AppGroup('dispatch', help='Courier dispatch.')
+
+@dispatch_cli.command('run')
+@click.option('--batch-size', type=int, default=None, help='Defaults to DISPATCH_BATCH_SIZE.')
+def run_dispatch_command(batch_size):
+    """Assign pending parcels to couriers once, in the foreground (e.g. from cron)."""
+    summary = run_dispatch(batch_size or current_app.config['DISPATCH_BATCH_SIZE'])
+    click.echo(f"Assigned {summary['assigned']} of {summary['parcels']} pending parcels "
+               f"to {summary['couriers']} couriers ({summary['unassigned']} left over)")
+
+def register_commands(app):
+    app.cli.add_command(outbox_cli)
+    app.cli.add_command(locations_cli)
+    app.cli.add_command(geo_cli)
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(dispatch_cli)
@@ -17,6 +17,18 @@ class Config:
     JWT_COOKIE_SECURE = True  # Render uses HTTPS
     JWT_COOKIE_SAMESITE = "None"
     JWT_COOKIE_CSRF_PROTECT = False 
+    # Password hashing (see utils/passwords.py); stored hashes made with other
+    # parameters are upgraded on the user's next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH') or 16)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)  # concurrent hashes per process
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT') or 5)  # seconds
+
+    # Roles of users whose token can't be trusted (see utils/roles.py)
+    USER_ROLE_CACHE_TTL = int(os.environ.get('USER_ROLE_CACHE_TTL') or 60)
+    USER_ROLE_CACHE_SIZE = int(os.environ.get('USER_ROLE_CACHE_SIZE') or 10000)
+    # Other workers keep trusting a revoked role claim for up to this long
+    USER_ROLE_REVOCATION_REFRESH = float(os.environ.get('USER_ROLE_REVOCATION_REFRESH') or 5)  # seconds
     
     # Email configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
@@ -25,5 +37,99 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     
+    # Email outbox (see utils/outbox.py)
+    EMAIL_OUTBOX_WORKERS = int(os.environ.get('EMAIL_OUTBOX_WORKERS') or 2)
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE') or 50)
+    EMAIL_OUTBOX_POLL_INTERVAL = float(os.environ.get('EMAIL_OUTBOX_POLL_INTERVAL') or 2)
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS') or 5)
+    EMAIL_OUTBOX_RETRY_BACKOFF = int(os.environ.get('EMAIL_OUTBOX_RETRY_BACKOFF') or 30)  # seconds, doubled per attempt
+    # The first status email is sent at once; later ones within the window are
+    # merged into one digest, per 'parcel' or per 'user'. A window of 0 sends
+    # every transition on its own
+    EMAIL_DIGEST_WINDOW = int(os.environ.get('EMAIL_DIGEST_WINDOW') or 60)  # seconds
+    EMAIL_DIGEST_SCOPE = os.environ.get('EMAIL_DIGEST_SCOPE') or 'parcel'
+    FRONTEND_URL = os.environ.get('FRONTEND_URL') or 'http://localhost:3000'
+    
     # Google Maps API
-    GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY')
+    GOOGLE_MAPS_API_KEY = os.environ.get('GOOGLE_MAPS_API_KEY') or os.environ.get('VITE_GOOGLE_MAPS_API_KEY')
+
+    # Geocoding (see utils/geocoding.py); GEOCODING_URL can point at a stub server
+    GEOCODING_PROVIDER = os.environ.get('GEOCODING_PROVIDER') or 'google'
+    GEOCODING_URL = os.environ.get('GEOCODING_URL') or 'https://maps.googleapis.com/maps/api/geocode/json'
+    GEOCODING_TIMEOUT = float(os.environ.get('GEOCODING_TIMEOUT') or 5)
+    GEOCODING_RETRIES = int(os.environ.get('GEOCODING_RETRIES') or 3)
+    GEOCODING_MAX_WORKERS = int(os.environ.get('GEOCODING_MAX_WORKERS') or 8)
+    GEOCODING_CACHE_SIZE = int(os.environ.get('GEOCODING_CACHE_SIZE') or 5000)
+    GEOCODING_CACHE_TTL = int(os.environ.get('GEOCODING_CACHE_TTL') or 24 * 3600)
+
+    # Pagination
+    DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE') or 20)
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE') or 100)
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000)
+    BULK_CREATE_MAX_ITEMS = int(os.environ.get('BULK_CREATE_MAX_ITEMS') or 5000)
+    LOCATION_BATCH_MAX_POINTS = int(os.environ.get('LOCATION_BATCH_MAX_POINTS') or 10000)
+
+    # Write-behind for batch GPS pings (see utils/location_buffer.py): the
+    # newest ping per parcel is buffered on CACHE_BACKEND and flushed every
+    # interval, or once that many parcels are waiting
+    LOCATION_WRITE_BEHIND = os.environ.get('LOCATION_WRITE_BEHIND', 'false').lower() in ['true', 'on', '1']
+    LOCATION_FLUSH_INTERVAL = float(os.environ.get('LOCATION_FLUSH_INTERVAL') or 5)  # seconds
+    LOCATION_FLUSH_BATCH_SIZE = int(os.environ.get('LOCATION_FLUSH_BATCH_SIZE') or 1000)
+
+    # Trajectory compaction (`flask locations compact`, utils/trajectory.py)
+    TRAJECTORY_TOLERANCE_M = float(os.environ.get('TRAJECTORY_TOLERANCE_M') or 25)
+    TRAJECTORY_MAX_GAP = int(os.environ.get('TRAJECTORY_MAX_GAP') or 600)  # seconds, keeps stops visible
+    TRAJECTORY_COMPACT_MIN_AGE = int(os.environ.get('TRAJECTORY_COMPACT_MIN_AGE') or 3600)  # seconds
+    TRAJECTORY_COMPACT_BATCH_SIZE = int(os.environ.get('TRAJECTORY_COMPACT_BATCH_SIZE') or 500)  # parcels
+
+    # Proximity search (utils/nearby.py): radius searches reading more
+    # candidates than this are refused, boxes are counted in SQL
+    NEARBY_MAX_CANDIDATES = int(os.environ.get('NEARBY_MAX_CANDIDATES') or 50000)
+
+    # Admin map clusters (utils/clusters.py): an in-memory index of the
+    # parcels in these statuses, rebuilt after the TTL to pick up other workers' writes
+    CLUSTER_STATUSES = (os.environ.get('CLUSTER_STATUSES') or 'pending,picked_up,in_transit').split(',')
+    CLUSTER_INDEX_TTL = int(os.environ.get('CLUSTER_INDEX_TTL') or 300)  # seconds
+    CLUSTER_CELL_PX = int(os.environ.get('CLUSTER_CELL_PX') or 64)  # smallest cluster on screen
+    CLUSTER_MAX_CELLS = int(os.environ.get('CLUSTER_MAX_CELLS') or 1024)
+
+    # ETAs of in-transit parcels (utils/eta.py)
+    ETA_SPEED_WINDOW = int(os.environ.get('ETA_SPEED_WINDOW') or 1800)  # seconds of GPS history used for speed
+    ETA_MIN_SAMPLE_SECONDS = int(os.environ.get('ETA_MIN_SAMPLE_SECONDS') or 120)  # less falls back to the fleet
+    ETA_DEFAULT_SPEED_KMH = float(os.environ.get('ETA_DEFAULT_SPEED_KMH') or 30)
+    ETA_MIN_SPEED_KMH = float(os.environ.get('ETA_MIN_SPEED_KMH') or 5)
+    ETA_MAX_SPEED_KMH = float(os.environ.get('ETA_MAX_SPEED_KMH') or 90)
+    ETA_ROUTE_FACTOR = float(os.environ.get('ETA_ROUTE_FACTOR') or 1.3)  # road vs great-circle distance
+    ETA_CACHE_TTL = int(os.environ.get('ETA_CACHE_TTL') or 300)
+    ETA_CACHE_SIZE = int(os.environ.get('ETA_CACHE_SIZE') or 10000)
+
+    # Pricing (utils/pricing.py); the UI gets its quotes from POST /api/parcels/quote
+    PRICING_PER_KM = float(os.environ.get('PRICING_PER_KM') or 15)  # Ksh
+    PRICING_INCLUDED_KM = float(os.environ.get('PRICING_INCLUDED_KM') or 5)
+    PRICING_ROUTE_FACTOR = float(os.environ.get('PRICING_ROUTE_FACTOR') or 1.3)  # road vs great-circle distance
+    PRICING_QUOTE_MAX_ITEMS = int(os.environ.get('PRICING_QUOTE_MAX_ITEMS') or 10000)
+    PRICING_DISTANCE_MEMO_SIZE = int(os.environ.get('PRICING_DISTANCE_MEMO_SIZE') or 100000)
+
+    # Courier dispatch (utils/dispatch.py); 0 workers solves inside the request
+    DISPATCH_WORKERS = int(os.environ.get('DISPATCH_WORKERS') or 1)
+    DISPATCH_BATCH_SIZE = int(os.environ.get('DISPATCH_BATCH_SIZE') or 10000)  # pending parcels per run
+    DISPATCH_COURIER_CAPACITY_KG = float(os.environ.get('DISPATCH_COURIER_CAPACITY_KG') or 100)
+    DISPATCH_JOB_TIMEOUT = int(os.environ.get('DISPATCH_JOB_TIMEOUT') or 600)  # seconds before a run's slot is freed
+
+    # Courier route planning (utils/routing.py)
+    ROUTE_TIME_BUDGET_MS = int(os.environ.get('ROUTE_TIME_BUDGET_MS') or 200)  # 2-opt stops improving after this
+    ROUTE_MAX_TIME_BUDGET_MS = int(os.environ.get('ROUTE_MAX_TIME_BUDGET_MS') or 2000)
+    ROUTE_MAX_STOPS = int(os.environ.get('ROUTE_MAX_STOPS') or 1000)
+    ROUTE_MATRIX_CACHE_SIZE = int(os.environ.get('ROUTE_MATRIX_CACHE_SIZE') or 256)
+    ROUTE_MATRIX_CACHE_TTL = int(os.environ.get('ROUTE_MATRIX_CACHE_TTL') or 3600)
+
+    # Caching: 'memory' (per worker process, single-process deployments only:
+    # other workers never see its invalidations) or 'redis' (shared via
+    # REDIS_URL). Defaults to 'redis' whenever REDIS_URL is set.
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or ('redis' if os.environ.get('REDIS_URL') else 'memory')
+    REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+    TRACKING_CACHE_TTL = int(os.environ.get('TRACKING_CACHE_TTL') or 60)
+    TRACKING_CACHE_SIZE = int(os.environ.get('TRACKING_CACHE_SIZE') or 10000)
+
+    # Adds an X-Query-Count header with the number of SQL statements per request
+    SQL_QUERY_COUNTER = os.environ.get('SQL_QUERY_COUNTER', 'false').lower() in ['true', 'on', '1']
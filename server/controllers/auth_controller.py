@@ -1,7 +1,9 @@
 from flask import jsonify, make_response
 from flask_jwt_extended import create_access_token
 from models import db, User
-from utils.email import send_welcome_email
+from utils.email import queue_welcome_email
+from utils.roles import role_claims
+from utils.passwords import PasswordHasherBusy
 
 class AuthController:
     def register(self, data):
@@ -19,13 +21,12 @@ class AuthController:
             user.set_password(data['password'])
             
             db.session.add(user)
+            # Welcome email goes out from the outbox once this commits
+            queue_welcome_email(user.email, user.name)
             db.session.commit()
             
-            # Send welcome email
-            send_welcome_email(user.email, user.name)
-            
             # Create access token
-            access_token = create_access_token(identity=user.id)
+            access_token = create_access_token(identity=user.id, additional_claims=role_claims(user))
             response = make_response(jsonify({'user': user.to_dict()}), 200)
             response.set_cookie(
                 "access_token_cookie",
@@ -36,6 +37,9 @@ class AuthController:
                         )
             return response
             
+        except PasswordHasherBusy as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 503
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
@@ -46,7 +50,15 @@ class AuthController:
             if not user or not user.check_password(data['password']):
                 return jsonify({'error': 'Invalid credentials'}), 401
             
-            access_token = create_access_token(identity=user.id)
+            # Upgrade hashes made with old parameters while we have the password
+            if user.password_needs_rehash():
+                try:
+                    user.set_password(data['password'])
+                    db.session.commit()
+                except PasswordHasherBusy:
+                    db.session.rollback()  # not worth failing the login, retried next time
+            
+            access_token = create_access_token(identity=user.id, additional_claims=role_claims(user))
             response = make_response(jsonify({'user': user.to_dict()}), 200)
             response.set_cookie(
                 "access_token_cookie",
@@ -57,6 +69,9 @@ class AuthController:
                         )
             return response
                     
+        except PasswordHasherBusy as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 503
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
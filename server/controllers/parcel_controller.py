@@ -1,21 +1,40 @@
 import os
-from flask import jsonify
+from flask import jsonify, Response, stream_with_context, current_app
+from datetime import datetime
+from marshmallow import ValidationError
+from sqlalchemy import select, insert
+from sqlalchemy.orm import selectinload
 from models import db, Parcel, Location, User
-from utils.email import send_status_update_email
+from utils.email import queue_status_update_email
 import uuid
 import traceback 
-from flask_jwt_extended import get_jwt_identity
-import requests 
-apiKey = os.getenv("VITE_GOOGLE_MAPS_API_KEY")
+from utils.pagination import parse_page_args, paginate_keyset, keyset_page_query, InvalidPageRequest
+from utils.projections import parse_fields, project_query, InvalidFieldsRequest
+from utils.export import EXPORT_FORMATS, ndjson_chunks, csv_chunks
+from utils.cache import tracking_cache, invalidate_tracking
+from utils.http_cache import (version_query, version_from_parcel, version_from_dict, validators,
+                              is_conditional, is_not_modified, not_modified, with_validators)
+from models.parcel import PARCEL_FIELDS, parcel_geohash
+from schemas.parcel_schema import ParcelCreateSchema, LocationPingSchema
+from utils.locations import apply_location_pings
+from utils.location_buffer import buffer_location_pings, buffered_position
+from utils.timeline import parse_timeline_options, timeline_variant, shape_timeline, InvalidTimelineRequest
+from utils.geocoding import get_geocoder
+from utils.nearby import parse_area, parcels_in_area, unindexed_count, InvalidAreaRequest
+from utils.clusters import cluster_index, zoom_precision, record_cluster_changes, MAX_ZOOM
+from utils.pricing import quote, quote_price, parse_quote_items
+from utils.dispatch import start_dispatch, get_dispatch_job
+from utils.routing import parse_route_args, courier_route, InvalidRouteRequest
+from utils.eta import compute_etas, parcel_eta, refresh_etas, invalidate_etas, eta_cache
+from utils.analytics import (track_created, write_rollups, parse_analytics_range, analytics_summary,
+                             InvalidAnalyticsRequest)
 class ParcelController:
     def create_parcel(self, user_id, data):
         try:
             print("🚀 Incoming parcel data:", data)
             print("🧠 Authenticated user_id:", user_id)
-            tracking_number = f"DEL{str(uuid.uuid4())[:8].upper()}"
-            
             parcel = Parcel(
-                tracking_number=tracking_number,
+                tracking_number=self._new_tracking_numbers(1)[0],
                 sender_name=data['senderName'],
                 receiver_name=data['receiverName'],
                 pickup_address=data['pickupAddress'],
@@ -25,21 +44,18 @@ class ParcelController:
                 destination_lat=data['destinationCoords']['lat'],
                 destination_lng=data['destinationCoords']['lng'],
                 weight=data['weight'],
-                price=data['price'],
+                price=quote_price(data['weight'], data['pickupCoords'], data['destinationCoords']),
                 user_id=user_id
             )
             
-            db.session.add(parcel)
-            db.session.commit()
-            
-            location = Location(
+            # The parcel and its first timeline row go in one transaction
+            parcel.locations.append(Location(
                 status='pending',
                 location_description=data['pickupAddress'],
                 latitude=data['pickupCoords']['lat'],
-                longitude=data['pickupCoords']['lng'],
-                parcel_id=parcel.id
-            )
-            db.session.add(location)
+                longitude=data['pickupCoords']['lng']
+            ))
+            db.session.add(parcel)
             db.session.commit()
             
             return jsonify(parcel.to_dict()), 201
@@ -50,23 +66,372 @@ class ParcelController:
             traceback.print_exc()
             return jsonify({'error': str(e)}), 500
 
-    def get_user_parcels(self, user_id):
+    def create_parcels_bulk(self, user_id, data):
+        """Create many parcels in one transaction, reporting a result per item.
+
+        Items are validated with ParcelCreateSchema; invalid ones are reported
+        and skipped while the valid ones are created, priced in one quote(). Parcels and their first
+        timeline rows are written with two multi-row INSERTs however many
+        items there are.
+        """
+        items = data.get('parcels') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Expected a non-empty list of parcels'}), 400
+        max_items = current_app.config['BULK_CREATE_MAX_ITEMS']
+        if len(items) > max_items:
+            return jsonify({'error': f'At most {max_items} parcels can be created per request'}), 400
+
+        schema = ParcelCreateSchema()
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, schema.load(item)))
+            except ValidationError as e:
+                results[index] = {'index': index, 'status': 'error', 'errors': e.messages}
+
+        if not valid:
+            return jsonify({'results': results, 'created': 0, 'failed': len(items)}), 400
+
+        try:
+            now = datetime.utcnow()
+            tracking_numbers = self._new_tracking_numbers(len(valid))
+            prices = quote([item['weight'] for _, item in valid], [
+                (item['pickup_coords']['lat'], item['pickup_coords']['lng'],
+                 item['destination_coords']['lat'], item['destination_coords']['lng'])
+                for _, item in valid
+            ])['price'].tolist()
+            parcel_rows = [{
+                'tracking_number': tracking_number,
+                'sender_name': item['sender_name'],
+                'receiver_name': item['receiver_name'],
+                'pickup_address': item['pickup_address'],
+                'destination_address': item['destination_address'],
+                'pickup_lat': item['pickup_coords']['lat'],
+                'pickup_lng': item['pickup_coords']['lng'],
+                'destination_lat': item['destination_coords']['lat'],
+                'destination_lng': item['destination_coords']['lng'],
+                'geohash': parcel_geohash(None, None, item['pickup_coords']['lat'], item['pickup_coords']['lng']),
+                'weight': item['weight'],
+                'price': price,
+                'status': 'pending',
+                'created_at': now,
+                'updated_at': now,
+                'user_id': user_id
+            } for tracking_number, (_, item), price in zip(tracking_numbers, valid, prices)]
+
+            # Batched INSERT .. RETURNING; rows may come back in any order, so
+            # ids are matched up through the unique tracking number
+            ids = dict(db.session.execute(
+                insert(Parcel).returning(Parcel.tracking_number, Parcel.id), parcel_rows
+            ).all())
+            parcel_ids = [ids[row['tracking_number']] for row in parcel_rows]
+            db.session.execute(insert(Location), [{
+                'status': 'pending',
+                'location_description': row['pickup_address'],
+                'latitude': row['pickup_lat'],
+                'longitude': row['pickup_lng'],
+                'timestamp': now,
+                'parcel_id': parcel_id
+            } for parcel_id, row in zip(parcel_ids, parcel_rows)])
+            record_cluster_changes(db.session, {parcel_id: (row['pickup_lat'], row['pickup_lng'], 'pending')
+                                                for parcel_id, row in zip(parcel_ids, parcel_rows)})
+            for row in parcel_rows:
+                track_created(db.session, now, row['price'], row['weight'])
+            write_rollups(db.session)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+
+        for (index, _), parcel_id, row in zip(valid, parcel_ids, parcel_rows):
+            results[index] = {'index': index, 'status': 'created', 'id': parcel_id,
+                              'trackingNumber': row['tracking_number']}
+        failed = len(items) - len(valid)
+        return jsonify({'results': results, 'created': len(valid), 'failed': failed}), 207 if failed else 201
+
+    def quote_parcels(self, data):
+        """Price a batch of candidate shipments without creating anything.
+
+        Accepts a list of {weight, pickupCoords, destinationCoords} (or
+        {"items": [...]}) and answers with one quote per valid item, by
+        index, priced in a single vectorized call (utils/pricing.py).
+        """
+        items = data.get('items') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Expected a non-empty list of items'}), 400
+        max_items = current_app.config['PRICING_QUOTE_MAX_ITEMS']
+        if len(items) > max_items:
+            return jsonify({'error': f'At most {max_items} items can be quoted per request'}), 400
+
+        weights, coords, indexes, rejected = parse_quote_items(items)
+        try:
+            quotes = quote(weights, coords)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+        columns = {name: values.tolist() for name, values in quotes.items()}
+        return jsonify({
+            'quotes': [{'index': index, **{name: values[i] for name, values in columns.items()}}
+                       for i, index in enumerate(indexes)],
+            'rejected': rejected,
+            'currency': 'KES'
+        }), 200 if indexes else 400
+
+    def _new_tracking_numbers(self, count):
+        """`count` distinct tracking numbers not already used by a parcel"""
+        numbers = set()
+        while len(numbers) < count:
+            candidates = {f"DEL{uuid.uuid4().hex[:8].upper()}" for _ in range(count - len(numbers))}
+            taken = set(db.session.scalars(
+                select(Parcel.tracking_number).where(Parcel.tracking_number.in_(candidates))
+            ))
+            numbers |= candidates - taken
+        return list(numbers)
+
+    def get_user_parcels(self, user_id, args):
+        try:
+            limit, cursor = parse_page_args(args)
+            query = Parcel.query.filter_by(user_id=user_id)
+            return self._parcel_page(query, args, limit, cursor)
+        except (InvalidPageRequest, InvalidFieldsRequest, InvalidTimelineRequest) as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    def get_all_parcels(self, args):
+        try:
+            # admin_required on the route has already checked the role
+            limit, cursor = parse_page_args(args)
+            return self._parcel_page(Parcel.query, args, limit, cursor)
+        except (InvalidPageRequest, InvalidFieldsRequest, InvalidTimelineRequest) as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    def _parcel_page(self, query, args, limit, cursor):
+        fields = parse_fields(args.get('fields'))
+        timeline_options = parse_timeline_options(args)
+        variant = timeline_variant(timeline_options)
+
+        # Conditional GETs are answered from one metadata query over the page
+        if is_conditional():
+            versions = version_query(keyset_page_query(query, Parcel, limit, cursor))
+            etag, last_modified = validators(versions[:limit], fields, has_more=len(versions) > limit,
+                                             variant=variant)
+            if is_not_modified(etag, last_modified):
+                return not_modified(etag, last_modified)
+
+        # Only the requested columns are selected; when the timeline is asked
+        # for, every timeline on the page comes back in one batched query
+        parcels, next_cursor = paginate_keyset(project_query(query, fields), Parcel, limit, cursor)
+        etag, last_modified = validators(
+            [version_from_parcel(parcel, fields) for parcel in parcels], fields,
+            has_more=next_cursor is not None, variant=variant
+        )
+        response = jsonify({
+            'parcels': [shape_timeline(parcel.to_dict(fields), timeline_options) for parcel in parcels],
+            'next_cursor': next_cursor
+        })
+        return with_validators(response, etag, last_modified), 200
+
+    def find_parcels_nearby(self, args):
+        """Parcels within ?radius= meters of ?lat=&lng=, or inside ?bbox=.
+
+        Optional ?status= and ?fields= (summary by default) narrow the
+        result; at most ?limit= (clamped to MAX_PAGE_SIZE) parcels come back
+        with `count` giving the total. Radius searches add each parcel's
+        `distance` in meters, nearest first. `unindexed` counts parcels
+        left out because `flask geo backfill` hasn't given them a geohash
+        yet. See utils/nearby.py.
+        """
+        try:
+            area = parse_area(args)
+            fields = parse_fields(args.get('fields'), default='summary')
+            limit, _ = parse_page_args(args)
+            page, count = parcels_in_area(area, args.get('status'), limit)
+            parcels = {parcel.id: parcel for parcel in project_query(
+                Parcel.query.filter(Parcel.id.in_([parcel_id for parcel_id, _ in page])), fields
+            )}
+            results = []
+            for parcel_id, distance in page:
+                data = parcels[parcel_id].to_dict(fields)
+                if distance is not None:
+                    data['distance'] = round(distance, 1)
+                results.append(data)
+            return jsonify({'parcels': results, 'count': count,
+                            'unindexed': unindexed_count(args.get('status'))}), 200
+        except (InvalidAreaRequest, InvalidFieldsRequest, InvalidPageRequest) as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    def get_parcel_clusters(self, args):
+        """Map clusters of the live fleet inside ?bbox= at ?zoom=.
+
+        Each cluster is a geohash cell with its parcel count, centroid and
+        count per status; ?status= (comma separated) narrows the statuses
+        counted. Served from the in-memory index in utils/clusters.py.
+        """
+        try:
+            if not args.get('bbox'):
+                raise InvalidAreaRequest('bbox is required')
+            area = parse_area(args)
+            try:
+                zoom = int(args.get('zoom', ''))
+            except ValueError:
+                raise InvalidAreaRequest('zoom must be an integer')
+            if not 0 <= zoom <= MAX_ZOOM:
+                raise InvalidAreaRequest(f'zoom must be between 0 and {MAX_ZOOM}')
+            statuses = args.get('status')
+            statuses = [status.strip() for status in statuses.split(',')] if statuses else None
+
+            box = (area.min_lat, area.min_lng, area.max_lat, area.max_lng)
+            precision = zoom_precision(zoom, *box)
+            clusters = cluster_index().clusters(*box, precision, statuses)
+            return jsonify({
+                'precision': precision,
+                'clusters': clusters,
+                'total': sum(cluster['count'] for cluster in clusters)
+            }), 200
+        except InvalidAreaRequest as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    def get_analytics(self, args):
+        """Dashboard analytics for ?range=week|month|<days>, from the rollup tables"""
+        try:
+            first_day, last_day = parse_analytics_range(args)
+            return jsonify({'range': args.get('range') or 'week', **analytics_summary(first_day, last_day)}), 200
+        except InvalidAnalyticsRequest as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    def get_parcel_etas(self, args):
+        """ETAs of in-transit parcels, computed in one pass per page.
+
+        Pages through every in-transit parcel newest first (?limit=,
+        ?cursor=), or takes up to MAX_PAGE_SIZE ids in ?ids=1,2,3.
+        """
+        try:
+            ids = args.get('ids')
+            parcel_ids = [int(parcel_id) for parcel_id in ids.split(',')] if ids else None
+        except ValueError:
+            return jsonify({'error': 'ids must be a comma separated list of parcel ids'}), 400
+        max_ids = current_app.config['MAX_PAGE_SIZE']
+        if parcel_ids is not None and len(parcel_ids) > max_ids:
+            return jsonify({'error': f'At most {max_ids} ids can be given'}), 400
+        try:
+            next_cursor = None
+            if parcel_ids is None:
+                limit, cursor = parse_page_args(args)
+                rows, next_cursor = paginate_keyset(
+                    db.session.query(Parcel.id, Parcel.created_at).filter(Parcel.status == 'in_transit'),
+                    Parcel, limit, cursor
+                )
+                parcel_ids = [row.id for row in rows]
+            etas = compute_etas(parcel_ids) if parcel_ids else {}
+            return jsonify({'etas': [{'id': parcel_id, **eta} for parcel_id, eta in etas.items()],
+                            'count': len(etas), 'next_cursor': next_cursor}), 200
+        except InvalidPageRequest as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    def start_dispatch(self):
+        """Assign pending parcels to couriers in the background, see utils/dispatch.py"""
+        try:
+            job, started = start_dispatch()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+        if not started:
+            return jsonify({'error': 'A dispatch run is already in progress', 'job': job}), 409
+        return jsonify(job), 202
+
+    def get_dispatch_job(self, job_id):
+        job = get_dispatch_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Dispatch job not found'}), 404
+        return jsonify(job), 200
+
+    def plan_courier_route(self, courier_id, args):
+        """Stop sequence for a courier's active parcels, pickups before drop-offs.
+
+        ?lat=&lng= start the route where the courier is; ?budgetMs= caps the
+        time spent improving it (ROUTE_TIME_BUDGET_MS by default). See
+        utils/routing.py.
+        """
+        try:
+            start, budget = parse_route_args(args)
+        except InvalidRouteRequest as e:
+            return jsonify({'error': str(e)}), 400
+        courier = db.session.get(User, courier_id)
+        if courier is None or courier.role != 'courier':
+            return jsonify({'error': 'Courier not found'}), 404
         try:
-            parcels = Parcel.query.filter_by(user_id=user_id).all()
-            return jsonify([parcel.to_dict() for parcel in parcels]), 200
+            return jsonify(courier_route(courier.id, start=start, budget=budget)), 200
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
-    def get_all_parcels(self):
+    def export_parcels(self, args):
+        export_format = args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': f'format must be one of: {", ".join(EXPORT_FORMATS)}'}), 400
         try:
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
+            fields = parse_fields(args.get('fields'), default='summary')
+        except InvalidFieldsRequest as e:
+            return jsonify({'error': str(e)}), 400
+        if 'timeline' in fields:
+            return jsonify({'error': 'timeline cannot be exported, use the parcel endpoints'}), 400
+
+        columns = {'id'}
+        for name in fields:
+            columns.update(PARCEL_FIELDS[name][0])
+        batch_size = current_app.config['EXPORT_BATCH_SIZE']
+
+        def generate():
+            # Plain rows streamed through a server-side cursor, yield_per rows
+            # at a time, so memory stays flat however big the table is
+            statement = (
+                select(*(getattr(Parcel, column) for column in sorted(columns)))
+                .order_by(Parcel.id)
+                .execution_options(yield_per=batch_size)
+            )
+            partitions = db.session.execute(statement).partitions()
+            chunks = csv_chunks if export_format == 'csv' else ndjson_chunks
+            yield from chunks(partitions, fields)
 
-            if not user or user.role != 'admin':
-                return jsonify({'error': 'Unauthorized'}), 403
+        return Response(
+            stream_with_context(generate()),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={'Content-Disposition': f'attachment; filename=parcels.{export_format}'}
+        )
 
-            parcels = Parcel.query.all()
-            return jsonify([parcel.to_dict() for parcel in parcels]), 200
+    def get_parcel(self, user_id, parcel_id, args):
+        try:
+            fields = parse_fields(args.get('fields'))
+            timeline_options = parse_timeline_options(args)
+            variant = timeline_variant(timeline_options)
+            query = Parcel.query.filter_by(id=parcel_id, user_id=user_id)
+
+            if is_conditional():
+                versions = version_query(query)
+                if not versions:
+                    return jsonify({'error': 'Parcel not found'}), 404
+                etag, last_modified = validators(versions, fields, variant=variant)
+                if is_not_modified(etag, last_modified):
+                    return not_modified(etag, last_modified)
+
+            parcel = project_query(query, fields).first()
+            if not parcel:
+                return jsonify({'error': 'Parcel not found'}), 404
+            etag, last_modified = validators([version_from_parcel(parcel, fields)], fields, variant=variant)
+            data = shape_timeline(parcel.to_dict(fields), timeline_options)
+            return with_validators(jsonify(data), etag, last_modified), 200
+        except (InvalidFieldsRequest, InvalidTimelineRequest) as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
@@ -90,11 +455,14 @@ class ParcelController:
             )
             db.session.add(location)
 
-            db.session.commit()
-
+            # Queued in the same transaction, sent by the outbox workers
             user = User.query.get(parcel.user_id)
             if user:
-                send_status_update_email(user.email, parcel.tracking_number, old_status, data['status'])
+                queue_status_update_email(user.email, parcel.tracking_number, old_status, data['status'])
+
+            db.session.commit()
+            invalidate_tracking(parcel.tracking_number)
+            refresh_etas(parcel.id)
 
             return jsonify(parcel.to_dict()), 200
         except Exception as e:
@@ -115,6 +483,7 @@ class ParcelController:
             )
             db.session.add(location)
             db.session.commit()
+            invalidate_tracking(parcel.tracking_number)
 
             return jsonify({'message': 'Parcel cancelled successfully', 'parcel': parcel.to_dict()}), 200
         except Exception as e:
@@ -134,27 +503,36 @@ class ParcelController:
             parcel.sender_name = data.get('senderName', parcel.sender_name)
             parcel.receiver_name = data.get('receiverName', parcel.receiver_name)
             parcel.weight = data.get('weight', parcel.weight)
-            parcel.price = data.get('price', parcel.price)
 
-            # Handle pickup address update
+            # Handle pickup/destination address updates, geocoding both at once
             new_pickup_address = data.get('pickupAddress')
-            if new_pickup_address and new_pickup_address != parcel.pickup_address:
+            if new_pickup_address == parcel.pickup_address:
+                new_pickup_address = None
+            new_dest_address = data.get('destinationAddress')
+            if new_dest_address == parcel.destination_address:
+                new_dest_address = None
+
+            coords = self._geocode_addresses([a for a in (new_pickup_address, new_dest_address) if a])
+
+            if new_pickup_address:
                 parcel.pickup_address = new_pickup_address
-                coords = self._geocode_address(new_pickup_address)
-                if coords:
-                    parcel.pickup_lat = coords['lat']
-                    parcel.pickup_lng = coords['lng']
+                if coords.get(new_pickup_address):
+                    parcel.pickup_lat = coords[new_pickup_address]['lat']
+                    parcel.pickup_lng = coords[new_pickup_address]['lng']
 
-            # Handle destination address update
-            new_dest_address = data.get('destinationAddress')
-            if new_dest_address and new_dest_address != parcel.destination_address:
+            if new_dest_address:
                 parcel.destination_address = new_dest_address
-                coords = self._geocode_address(new_dest_address)
-                if coords:
-                    parcel.destination_lat = coords['lat']
-                    parcel.destination_lng = coords['lng']
+                if coords.get(new_dest_address):
+                    parcel.destination_lat = coords[new_dest_address]['lat']
+                    parcel.destination_lng = coords[new_dest_address]['lng']
+
+            # Priced on the server like new parcels, any price sent is ignored
+            parcel.price = quote_price(parcel.weight, {'lat': parcel.pickup_lat, 'lng': parcel.pickup_lng},
+                                       {'lat': parcel.destination_lat, 'lng': parcel.destination_lng})
 
             db.session.commit()
+            invalidate_tracking(parcel.tracking_number)
+            refresh_etas(parcel.id)
 
             return jsonify({'message': 'Parcel updated successfully', 'parcel': parcel.to_dict()}), 200
         except Exception as e:
@@ -188,6 +566,8 @@ class ParcelController:
             )
             db.session.add(location_entry)
             db.session.commit()
+            invalidate_tracking(parcel.tracking_number)
+            refresh_etas(parcel.id)
 
             return jsonify({'message': 'Parcel location updated', 'parcel': parcel.to_dict()}), 200
 
@@ -197,6 +577,56 @@ class ParcelController:
             return jsonify({'error': str(e)}), 500
 
     
+    def ingest_locations(self, data):
+        """Apply a batch of GPS pings in one transaction and acknowledge compactly.
+
+        Accepts a list of {parcel_id, lat, lng, ts} points (or {"points": [...]});
+        ts is ISO 8601 or epoch seconds and defaults to now. Invalid points
+        and points for unknown parcels are listed by index, the rest are
+        written with bulk statements, see utils/locations.py.
+        """
+        points = data.get('points') if isinstance(data, dict) else data
+        if not isinstance(points, list) or not points:
+            return jsonify({'error': 'Expected a non-empty list of points'}), 400
+        max_points = current_app.config['LOCATION_BATCH_MAX_POINTS']
+        if len(points) > max_points:
+            return jsonify({'error': f'At most {max_points} points can be sent per request'}), 400
+
+        schema = LocationPingSchema()
+        now = datetime.utcnow()
+        pings, rejected = [], []
+        for index, point in enumerate(points):
+            try:
+                ping = schema.load(point)
+            except ValidationError as e:
+                rejected.append({'index': index, 'errors': e.messages})
+                continue
+            ping['index'] = index
+            ping['ts'] = ping['ts'] or now
+            pings.append(ping)
+
+        # Write-behind: acknowledge now, the flusher writes the newest ping
+        # per parcel later (pings for unknown parcels are dropped then)
+        if current_app.config['LOCATION_WRITE_BEHIND']:
+            buffer_location_pings(pings)
+            return jsonify({'accepted': len(pings), 'rejected': rejected, 'buffered': True}), 202
+
+        try:
+            applied, tracking_numbers = apply_location_pings(pings) if pings else ([], [])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+        invalidate_tracking(*tracking_numbers)
+        # Recomputed when next read, keeping the ingest path to its few statements
+        invalidate_etas(*{ping['parcel_id'] for ping in applied})
+
+        applied_indexes = {ping['index'] for ping in applied}
+        rejected.extend({'index': ping['index'], 'errors': {'parcel_id': ['Parcel not found']}}
+                        for ping in pings if ping['index'] not in applied_indexes)
+        rejected.sort(key=lambda item: item['index'])
+        return jsonify({'accepted': len(applied), 'rejected': rejected}), 200
+
     def update_user_parcel_destination(self, user_id, parcel_id, data):
         parcel = Parcel.query.get(parcel_id)
         if not parcel:
@@ -221,6 +651,8 @@ class ParcelController:
         parcel.destination_lat = geo['lat']
         parcel.destination_lng = geo['lng']
         db.session.commit()
+        invalidate_tracking(parcel.tracking_number)
+        refresh_etas(parcel.id)
 
         return jsonify({
             'message': 'Destination updated',
@@ -235,23 +667,76 @@ class ParcelController:
             parcel.receiver_name = receiverName
 
         db.session.commit()
+        invalidate_tracking(parcel.tracking_number)
         return parcel.to_dict(), 200
-    def track_parcel(self, tracking_number):
-        parcel = Parcel.query.filter_by(tracking_number=tracking_number).first()
-        if not parcel:
-            return jsonify({"error": "Parcel not found"}), 404
-        return jsonify(parcel.to_dict()), 200
-
+    def track_parcel(self, tracking_number, args):
+        try:
+            fields = parse_fields(args.get('fields'))
+            timeline_options = parse_timeline_options(args)
+        except (InvalidFieldsRequest, InvalidTimelineRequest) as e:
+            return jsonify({'error': str(e)}), 400
+        variant = timeline_variant(timeline_options)
+
+        # Read-through: the full response is cached and projected per request,
+        # and every write path drops the entry after committing. A cache hit
+        # answers conditional GETs without touching the database at all.
+        cache = tracking_cache()
+        data = cache.get(tracking_number)
+        if data is None:
+            # Taken before reading so a commit racing this read wins
+            generation = cache.generation(tracking_number)
+            query = Parcel.query.filter_by(tracking_number=tracking_number)
+            if is_conditional():
+                versions = version_query(query)
+                if not versions:
+                    return jsonify({"error": "Parcel not found"}), 404
+                version = self._buffered_version(versions[0], buffered_position(versions[0].id))
+                # No ETA cached means a new one would be computed, which no
+                # client can have a tag for yet
+                eta = eta_cache().get(str(version.id))
+                etag, last_modified = self._tracking_validators(version, fields, variant, eta)
+                if is_not_modified(etag, last_modified):
+                    return not_modified(etag, last_modified)
+
+            parcel = query.options(selectinload(Parcel.locations)).first()
+            if not parcel:
+                return jsonify({"error": "Parcel not found"}), 404
+            data = parcel.to_dict()
+            cache.set_if_generation(tracking_number, data, generation)
+
+        # With write-behind on, the freshest position may not be flushed yet
+        position = buffered_position(data['id'])
+        if position:
+            data = {**data, 'currentLocation': {'lat': position['lat'], 'lng': position['lng']}}
+        eta = parcel_eta(data['id'], data['status'])
+        etag, last_modified = self._tracking_validators(
+            self._buffered_version(version_from_dict(data), position), fields, variant, eta
+        )
+        if is_not_modified(etag, last_modified):
+            return not_modified(etag, last_modified)
+        body = shape_timeline({name: data[name] for name in fields}, timeline_options)
+        body['eta'] = eta
+        response = jsonify(body)
+        return with_validators(response, etag, last_modified), 200
+
+
+    def _tracking_validators(self, version, fields, variant, eta):
+        # ETAs are recomputed on their own schedule (ETA_CACHE_TTL), so the
+        # one in the body is part of the representation's version
+        etag, last_modified = validators([version], fields,
+                                         variant=f"{variant}|eta:{eta['computedAt'] if eta else ''}")
+        if eta:
+            last_modified = max(last_modified, datetime.fromisoformat(eta['computedAt']))
+        return etag, last_modified
+
+    def _buffered_version(self, version, position):
+        # A buffered ping changes the representation like an update would
+        if position is None:
+            return version
+        return version._replace(updated_at=max(version.updated_at, position['received_at']))
 
     def _geocode_address(self, address):
-        try:
-            API_KEY = apiKey
-  
-            response = requests.get(f'https://maps.googleapis.com/maps/api/geocode/json?address={address}&key={API_KEY}')
-            res_json = response.json()
-            if res_json['status'] == 'OK':
-                location = res_json['results'][0]['geometry']['location']
-                return {'lat': location['lat'], 'lng': location['lng']}
-        except Exception as e:
-            print(f'Geocoding failed for "{address}":', e)
-        return None
+        return get_geocoder().geocode(address)
+
+    def _geocode_addresses(self, addresses):
+        return get_geocoder().geocode_many(addresses) if addresses else {}
@@ -5,4 +5,10 @@ db = SQLAlchemy()
 from .user import User
 from .parcel import Parcel
 from .location import Location
-__all__ = ['db', 'User', 'Parcel', 'Location']
+from .geocode_cache import GeocodeCache
+from .email_outbox import EmailOutbox
+from .analytics import DailyParcelStats, ParcelStatusCount
+from .role_revocation import RoleRevocation
+from .dispatch_job import DispatchJob
+__all__ = ['db', 'User', 'Parcel', 'Location', 'GeocodeCache', 'EmailOutbox', 'DailyParcelStats', 'ParcelStatusCount',
+           'RoleRevocation', 'DispatchJob']
@@ -0,0 +1,21 @@
+from . import db
+
+class DailyParcelStats(db.Model):
+    """Per-day rollup of parcel events, maintained by utils/analytics.py"""
+    __tablename__ = 'daily_parcel_stats'
+    day = db.Column(db.Date, primary_key=True)  # UTC
+    created = db.Column(db.Integer, nullable=False, default=0)
+    created_revenue = db.Column(db.Float, nullable=False, default=0)
+    created_weight = db.Column(db.Float, nullable=False, default=0)
+    delivered = db.Column(db.Integer, nullable=False, default=0)
+    delivered_revenue = db.Column(db.Float, nullable=False, default=0)
+    delivered_weight = db.Column(db.Float, nullable=False, default=0)
+    delivery_seconds = db.Column(db.Float, nullable=False, default=0)  # sum over `delivered`
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ParcelStatusCount(db.Model):
+    """How many parcels are in each status right now"""
+    __tablename__ = 'parcel_status_count'
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
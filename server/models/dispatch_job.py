@@ -0,0 +1,28 @@
+from datetime import datetime
+from . import db
+
+class DispatchJob(db.Model):
+    """A dispatch run (utils/dispatch.py). Kept in the database so any
+    worker can answer polls for it and only one run goes at a time."""
+    __tablename__ = 'dispatch_jobs'
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, done, failed
+    # True while running, NULL once finished; being unique, one run holds it at a time
+    running = db.Column(db.Boolean, unique=True)
+    parcels = db.Column(db.Integer)
+    couriers = db.Column(db.Integer)
+    assigned = db.Column(db.Integer)
+    unassigned = db.Column(db.Integer)
+    skipped = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        job = {'id': self.id, 'status': self.status, 'startedAt': self.started_at.isoformat()}
+        for name in ('parcels', 'couriers', 'assigned', 'unassigned', 'skipped', 'error'):
+            if getattr(self, name) is not None:
+                job[name] = getattr(self, name)
+        if self.finished_at:
+            job['finishedAt'] = self.finished_at.isoformat()
+        return job
@@ -0,0 +1,22 @@
+from datetime import datetime
+from . import db
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        # Workers poll for due pending rows
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+        # Digest lookups for an open coalescing window
+        db.Index('ix_email_outbox_coalesce_key_status', 'coalesce_key', 'status'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # template name, see utils/email.py
+    recipient = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON template context
+    coalesce_key = db.Column(db.String(255))  # events sharing a key are merged into one digest
+    status = db.Column(db.String(20), default='pending')  # pending, sent, dead
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
@@ -0,0 +1,16 @@
+from datetime import datetime
+from . import db
+
+class GeocodeCache(db.Model):
+    __tablename__ = 'geocode_cache'
+    id = db.Column(db.Integer, primary_key=True)
+    # sha1 of the normalized address, so any length of address fits the unique index
+    address_key = db.Column(db.String(40), unique=True, nullable=False)
+    address = db.Column(db.Text, nullable=False)  # normalized address
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    provider = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {'lat': self.latitude, 'lng': self.longitude}
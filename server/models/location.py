@@ -2,6 +2,11 @@ from datetime import datetime
 from . import db
 
 class Location(db.Model):
+    __table_args__ = (
+        # Timeline loads are WHERE parcel_id IN (...) ORDER BY timestamp
+        db.Index('ix_location_parcel_id_timestamp', 'parcel_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     status = db.Column(db.String(20), nullable=False)
     location_description = db.Column(db.String(255), nullable=False)
@@ -1,7 +1,21 @@
 from datetime import datetime
+from sqlalchemy import event, inspect
 from . import db
+from utils import geohash
 
 class Parcel(db.Model):
+    __table_args__ = (
+        # Keyset pagination walks these newest first, see utils/pagination.py
+        db.Index('ix_parcel_created_at_id', 'created_at', 'id'),
+        db.Index('ix_parcel_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        # Status filters, most recently touched first
+        db.Index('ix_parcel_status_updated_at', 'status', 'updated_at'),
+        # Proximity queries scan geohash prefix ranges, see utils/geohash.py
+        db.Index('ix_parcel_geohash', 'geohash'),
+        # Courier loads and the dispatch queue, see utils/dispatch.py
+        db.Index('ix_parcel_courier_id_status', 'courier_id', 'status'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     tracking_number = db.Column(db.String(50), unique=True, nullable=False)
     sender_name = db.Column(db.String(100), nullable=False)
@@ -14,6 +28,9 @@ class Parcel(db.Model):
     destination_lng = db.Column(db.Float, nullable=False)
     current_lat = db.Column(db.Float)
     current_lng = db.Column(db.Float)
+    # Geohash of the current position, or of the pickup point before the
+    # first location update; kept in sync by parcel_geohash() below
+    geohash = db.Column(db.String(12))
     weight = db.Column(db.Float, nullable=False)
     price = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, picked_up, in_transit, delivered, cancelled
@@ -22,28 +39,66 @@ class Parcel(db.Model):
     
     # Foreign keys
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    courier_id = db.Column(db.Integer, db.ForeignKey('users.id'))  # set by dispatch
     
     # Relationships
-    locations = db.relationship('Location', backref='parcel', lazy=True, cascade='all, delete-orphan')
+    locations = db.relationship('Location', backref='parcel', lazy=True, cascade='all, delete-orphan',
+                                order_by='Location.timestamp')
+    courier = db.relationship('User', foreign_keys=[courier_id], lazy=True)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'trackingNumber': self.tracking_number,
-            'senderName': self.sender_name,
-            'receiverName': self.receiver_name,
-            'pickupAddress': self.pickup_address,
-            'destinationAddress': self.destination_address,
-            'pickupCoords': {'lat': self.pickup_lat, 'lng': self.pickup_lng},
-            'destinationCoords': {'lat': self.destination_lat, 'lng': self.destination_lng},
-            'currentLocation': {'lat': self.current_lat, 'lng': self.current_lng} if self.current_lat else None,
-            'weight': self.weight,
-            'price': self.price,
-            'status': self.status,
-            'createdAt': self.created_at.isoformat(),
-            'updatedAt': self.updated_at.isoformat(),
-            'userId': self.user_id,
-            'timeline': [location.to_dict() for location in self.locations],
-            'canUpdate': self.status == 'pending',
-   
-        }
+    def to_dict(self, fields=None):
+        # Only the requested fields are read, so columns left out of a
+        # load_only() projection are never lazily fetched
+        return {name: PARCEL_FIELDS[name][1](self) for name in (fields or PARCEL_FIELDS)}
+
+
+def parcel_geohash(current_lat, current_lng, pickup_lat, pickup_lng):
+    """Geohash of where a parcel is: its current position, else its pickup point"""
+    if current_lat is not None and current_lng is not None:
+        return geohash.encode(current_lat, current_lng)
+    if pickup_lat is not None and pickup_lng is not None:
+        return geohash.encode(pickup_lat, pickup_lng)
+    return None
+
+
+POSITION_COLUMNS = ('current_lat', 'current_lng', 'pickup_lat', 'pickup_lng')
+
+
+# Unit-of-work writes; bulk INSERT/UPDATE statements set geohash themselves
+@event.listens_for(Parcel, 'before_insert')
+def _set_geohash(mapper, connection, parcel):
+    parcel.geohash = parcel_geohash(*(getattr(parcel, column) for column in POSITION_COLUMNS))
+
+
+@event.listens_for(Parcel, 'before_update')
+def _update_geohash(mapper, connection, parcel):
+    # History checks don't load columns a projection left out
+    attrs = inspect(parcel).attrs
+    if any(attrs[column].history.has_changes() for column in POSITION_COLUMNS):
+        _set_geohash(mapper, connection, parcel)
+
+
+# API field name -> (columns the field reads, serializer)
+PARCEL_FIELDS = {
+    'id': (('id',), lambda p: p.id),
+    'trackingNumber': (('tracking_number',), lambda p: p.tracking_number),
+    'senderName': (('sender_name',), lambda p: p.sender_name),
+    'receiverName': (('receiver_name',), lambda p: p.receiver_name),
+    'pickupAddress': (('pickup_address',), lambda p: p.pickup_address),
+    'destinationAddress': (('destination_address',), lambda p: p.destination_address),
+    'pickupCoords': (('pickup_lat', 'pickup_lng'),
+                     lambda p: {'lat': p.pickup_lat, 'lng': p.pickup_lng}),
+    'destinationCoords': (('destination_lat', 'destination_lng'),
+                          lambda p: {'lat': p.destination_lat, 'lng': p.destination_lng}),
+    'currentLocation': (('current_lat', 'current_lng'),
+                        lambda p: {'lat': p.current_lat, 'lng': p.current_lng} if p.current_lat else None),
+    'weight': (('weight',), lambda p: p.weight),
+    'price': (('price',), lambda p: p.price),
+    'status': (('status',), lambda p: p.status),
+    'createdAt': (('created_at',), lambda p: p.created_at.isoformat()),
+    'updatedAt': (('updated_at',), lambda p: p.updated_at.isoformat()),
+    'userId': (('user_id',), lambda p: p.user_id),
+    'courierId': (('courier_id',), lambda p: p.courier_id),
+    'timeline': ((), lambda p: [location.to_dict() for location in p.locations]),
+    'canUpdate': (('status',), lambda p: p.status == 'pending'),
+}
@@ -0,0 +1,9 @@
+from . import db
+
+class RoleRevocation(db.Model):
+    """When a user's role last changed, so tokens issued before it stop
+    being trusted on every worker. Written in the same transaction as the
+    change by utils/roles.py and pruned once no token can predate it."""
+    __tablename__ = 'role_revocations'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    revoked_at = db.Column(db.DateTime, nullable=False)  # UTC
@@ -1,7 +1,7 @@
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
 from . import db 
+from utils.passwords import get_password_hasher
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -14,13 +14,16 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
-    parcels = db.relationship('Parcel', backref='owner', lazy=True)
+    parcels = db.relationship('Parcel', backref='owner', lazy=True, foreign_keys='Parcel.user_id')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = get_password_hasher().hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return get_password_hasher().verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return get_password_hasher().needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
@@ -48,7 +48,13 @@ VALID_STATUSES = {'pending', 'picked_up', 'in_transit', 'delivered', 'cancelled'
 def get_all_parcels():
     if request.method == 'OPTIONS':
         return jsonify({'ok': True}), 200
-    return parcel_controller.get_all_parcels()
+    return parcel_controller.get_all_parcels(request.args)
+
+@admin_bp.route('/parcels/export', methods=['GET'])
+@jwt_required()
+@admin_required
+def export_parcels():
+    return parcel_controller.export_parcels(request.args)
 
 @admin_bp.route('/parcels/<string:parcel_id>/status', methods=['PUT'])
 @jwt_required()
@@ -95,8 +101,50 @@ def update_parcel_location(parcel_id):
     
     return parcel_controller.update_parcel_location(parcel_id, data)
 
+@admin_bp.route('/parcels/locations', methods=['POST'])
+@jwt_required()
+@admin_required
+def ingest_locations():
+    return parcel_controller.ingest_locations(request.get_json())
+
+@admin_bp.route('/parcels/nearby', methods=['GET'])
+@jwt_required()
+@admin_required
+def find_parcels_nearby():
+    return parcel_controller.find_parcels_nearby(request.args)
+
+@admin_bp.route('/parcels/clusters', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_parcel_clusters():
+    return parcel_controller.get_parcel_clusters(request.args)
+
+@admin_bp.route('/parcels/eta', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_parcel_etas():
+    return parcel_controller.get_parcel_etas(request.args)
+
+@admin_bp.route('/dispatch', methods=['POST'])
+@jwt_required()
+@admin_required
+def start_dispatch():
+    return parcel_controller.start_dispatch()
+
+@admin_bp.route('/dispatch/<string:job_id>', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_dispatch_job(job_id):
+    return parcel_controller.get_dispatch_job(job_id)
+
+@admin_bp.route('/couriers/<int:courier_id>/route', methods=['GET'])
+@jwt_required()
+@admin_required
+def plan_courier_route(courier_id):
+    return parcel_controller.plan_courier_route(courier_id, request.args)
+
 @admin_bp.route('/analytics', methods=['GET'])
 @jwt_required()
 @admin_required
 def get_analytics():
-    return parcel_controller.get_analytics()
\ No newline at end of file
+    return parcel_controller.get_analytics(request.args)
\ No newline at end of file
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from controllers.parcel_controller import ParcelController
+from utils.roles import current_user_role
 
 parcel_bp = Blueprint('parcels', __name__)
 parcel_controller = ParcelController()
@@ -9,7 +10,7 @@ parcel_controller = ParcelController()
 @jwt_required()
 def get_parcels():
     user_id = get_jwt_identity()
-    return parcel_controller.get_user_parcels(user_id)
+    return parcel_controller.get_user_parcels(user_id, request.args)
 
 @parcel_bp.route('', methods=['POST'])
 @jwt_required()
@@ -17,12 +18,30 @@ def create_parcel():
     user_id = get_jwt_identity()
     return parcel_controller.create_parcel(user_id, request.get_json())
 
+@parcel_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def create_parcels_bulk():
+    user_id = get_jwt_identity()
+    return parcel_controller.create_parcels_bulk(user_id, request.get_json())
+
+@parcel_bp.route('/quote', methods=['POST'])
+@jwt_required()
+def quote_parcels():
+    return parcel_controller.quote_parcels(request.get_json())
+
+@parcel_bp.route('/route', methods=['GET'])
+@jwt_required()
+def get_my_route():
+    # Couriers plan their own route; admins use /api/admin/couriers/<id>/route
+    if current_user_role() != 'courier':
+        return jsonify({'error': 'Courier access required'}), 403
+    return parcel_controller.plan_courier_route(int(get_jwt_identity()), request.args)
+
 @parcel_bp.route('/<string:parcel_id>', methods=['GET'])
 @jwt_required()
 def get_parcel(parcel_id):
     user_id = get_jwt_identity()
-    parcel= parcel_controller.get_parcel(user_id, parcel_id)
-    return jsonify(parcel.to_dict())
+    return parcel_controller.get_parcel(user_id, parcel_id, request.args)
 
 @parcel_bp.route('/<string:parcel_id>', methods=['PUT'])
 @jwt_required()
@@ -60,4 +79,4 @@ def updateParcelReceiver(parcel_id):
     return jsonify(result)
 @parcel_bp.route('/track/<string:tracking_number>', methods=['GET'])
 def track_parcel(tracking_number):
-    return parcel_controller.track_parcel(tracking_number)
+    return parcel_controller.track_parcel(tracking_number, request.args)
@@ -1,3 +1,4 @@
+from datetime import datetime, timezone
 from marshmallow import Schema, fields, validate, validates, ValidationError
 
 class CoordinatesSchema(Schema):
@@ -5,14 +6,17 @@ class CoordinatesSchema(Schema):
     lng = fields.Float(required=True, validate=validate.Range(min=-180, max=180))
 
 class ParcelCreateSchema(Schema):
-    sender_name = fields.Str(required=True, validate=validate.Length(min=2, max=100))
-    receiver_name = fields.Str(required=True, validate=validate.Length(min=2, max=100))
-    pickup_address = fields.Str(required=True, validate=validate.Length(min=5, max=500))
-    destination_address = fields.Str(required=True, validate=validate.Length(min=5, max=500))
-    pickup_coords = fields.Nested(CoordinatesSchema, required=True)
-    destination_coords = fields.Nested(CoordinatesSchema, required=True)
+    # Request bodies use the same camelCase keys as Parcel.to_dict()
+    sender_name = fields.Str(required=True, data_key='senderName', validate=validate.Length(min=2, max=100))
+    receiver_name = fields.Str(required=True, data_key='receiverName', validate=validate.Length(min=2, max=100))
+    pickup_address = fields.Str(required=True, data_key='pickupAddress', validate=validate.Length(min=5, max=500))
+    destination_address = fields.Str(required=True, data_key='destinationAddress',
+                                     validate=validate.Length(min=5, max=500))
+    pickup_coords = fields.Nested(CoordinatesSchema, required=True, data_key='pickupCoords')
+    destination_coords = fields.Nested(CoordinatesSchema, required=True, data_key='destinationCoords')
     weight = fields.Float(required=True, validate=validate.Range(min=0.1, max=1000))
-    price = fields.Float(required=True, validate=validate.Range(min=0.01))
+    # Accepted for older clients but ignored, prices come from utils/pricing.py
+    price = fields.Float(validate=validate.Range(min=0.01))
 
 class ParcelUpdateSchema(Schema):
     receiver_name = fields.Str(validate=validate.Length(min=2, max=100))
@@ -30,6 +34,26 @@ class ParcelLocationUpdateSchema(Schema):
     longitude = fields.Float(required=True, validate=validate.Range(min=-180, max=180))
     location_description = fields.Str(validate=validate.Length(max=255))
 
+class PingTimestamp(fields.Field):
+    """ISO 8601 string or Unix epoch seconds, loaded as naive UTC"""
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        try:
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+            parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise ValidationError('Not a valid ISO 8601 or epoch timestamp.')
+        if parsed.tzinfo:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+
+class LocationPingSchema(Schema):
+    parcel_id = fields.Int(required=True)
+    lat = fields.Float(required=True, validate=validate.Range(min=-90, max=90))
+    lng = fields.Float(required=True, validate=validate.Range(min=-180, max=180))
+    ts = PingTimestamp(load_default=None)
+
 class LocationResponseSchema(Schema):
     id = fields.Int()
     status = fields.Str()
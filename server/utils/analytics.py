@@ -0,0 +1,229 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect, select, delete, func, case
+from sqlalchemy.orm import Session
+from models import db, Parcel, Location, DailyParcelStats, ParcelStatusCount
+from utils.db import upsert
+
+# ?range= values, in days
+ANALYTICS_RANGES = {'week': 7, 'month': 30}
+MAX_RANGE_DAYS = 366
+
+
+class InvalidAnalyticsRequest(ValueError):
+    """Raised when the analytics query params can't be used"""
+
+
+def _pending(session):
+    # (per-day counters, per-status deltas) waiting to be written
+    return session.info.setdefault('analytics_rollups', (defaultdict(Counter), Counter()))
+
+
+def track_created(session, created_at, price, weight, status='pending'):
+    days, statuses = _pending(session)
+    days[created_at.date()].update(created=1, created_revenue=price, created_weight=weight)
+    statuses[status] += 1
+
+
+def track_status_change(session, old_status, new_status, price, weight, at, delivery_seconds=None):
+    days, statuses = _pending(session)
+    if old_status is not None:
+        statuses[old_status] -= 1
+    statuses[new_status] += 1
+    if new_status == 'delivered':
+        days[at.date()].update(delivered=1, delivered_revenue=price, delivered_weight=weight,
+                               delivery_seconds=delivery_seconds or 0)
+    elif new_status == 'cancelled':
+        days[at.date()].update(cancelled=1)
+
+
+def _increment(connection, model, key, deltas):
+    """Add `deltas` to the row of `model` at `key`, creating it if needed"""
+    table = model.__table__
+    try:
+        statement = upsert(model).values(**key, **deltas)
+    except NotImplementedError:
+        pass
+    else:
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={column: table.c[column] + statement.excluded[column] for column in deltas}
+        ))
+        return
+    # Other databases: update, then insert the first time a key is seen
+    where = [table.c[column] == value for column, value in key.items()]
+    result = connection.execute(table.update().where(*where).values(
+        {column: table.c[column] + value for column, value in deltas.items()}
+    ))
+    if not result.rowcount:
+        connection.execute(table.insert().values(**key, **deltas))
+
+
+def write_rollups(session):
+    """Write the tracked changes to the rollup tables in the session's transaction.
+
+    Runs after every flush; bulk statements, which don't flush, call it
+    after tracking their rows. One upsert per day and status touched.
+    """
+    pending = session.info.pop('analytics_rollups', None)
+    if not pending:
+        return
+    days, statuses = pending
+    connection = session.connection()
+    for day, deltas in sorted(days.items()):
+        _increment(connection, DailyParcelStats, {'day': day}, dict(deltas))
+    for status, delta in sorted(statuses.items()):
+        if delta:
+            _increment(connection, ParcelStatusCount, {'status': status}, {'count': delta})
+
+
+def _timeline_start(connection, parcel):
+    started = connection.execute(
+        select(func.min(Location.timestamp)).where(Location.parcel_id == parcel.id)
+    ).scalar()
+    return started or parcel.created_at
+
+
+def _track_parcel_insert(mapper, connection, parcel):
+    track_created(inspect(parcel).session, parcel.created_at, parcel.price, parcel.weight,
+                  parcel.status or 'pending')
+
+
+def _track_parcel_status(mapper, connection, parcel):
+    history = inspect(parcel).attrs.status.history
+    if not history.has_changes() or parcel.status in history.deleted:
+        return
+    now = datetime.utcnow()
+    delivery_seconds = None
+    if parcel.status == 'delivered':
+        delivery_seconds = (now - _timeline_start(connection, parcel)).total_seconds()
+    track_status_change(inspect(parcel).session, history.deleted[0] if history.deleted else None,
+                        parcel.status, parcel.price, parcel.weight, now, delivery_seconds)
+
+
+def _track_parcel_delete(mapper, connection, parcel):
+    _pending(inspect(parcel).session)[1][parcel.status] -= 1
+
+
+def _write_flushed_rollups(session, flush_context):
+    write_rollups(session)
+
+
+def _forget_rollups(session):
+    session.info.pop('analytics_rollups', None)
+
+
+_LISTENERS = [
+    (Parcel, 'after_insert', _track_parcel_insert),
+    (Parcel, 'after_update', _track_parcel_status),
+    (Parcel, 'after_delete', _track_parcel_delete),
+    (Session, 'after_flush', _write_flushed_rollups),
+    (Session, 'after_rollback', _forget_rollups),
+]
+
+
+def init_analytics(app):
+    """Keep the rollup tables in step with parcel writes.
+
+    Registered from the app factory, once however many apps are created,
+    so a parcel is never counted twice.
+    """
+    for target, name, listener in _LISTENERS:
+        if not event.contains(target, name, listener):
+            event.listen(target, name, listener)
+
+
+def parse_analytics_range(args, today=None):
+    """Days covered by ?range=week|month|<days>, as (first day, last day)"""
+    value = args.get('range') or 'week'
+    if value in ANALYTICS_RANGES:
+        days = ANALYTICS_RANGES[value]
+    else:
+        try:
+            days = int(value)
+        except ValueError:
+            raise InvalidAnalyticsRequest(f'range must be {", ".join(ANALYTICS_RANGES)} or a number of days')
+        if not 1 <= days <= MAX_RANGE_DAYS:
+            raise InvalidAnalyticsRequest(f'range must be between 1 and {MAX_RANGE_DAYS} days')
+    today = today or datetime.utcnow().date()
+    return today - timedelta(days=days - 1), today
+
+
+def analytics_summary(first_day, last_day):
+    """Dashboard numbers for a range of days, read from the rollups only.
+
+    At most one row per day plus one per status, whatever the number of
+    parcels. Delivery time is from the first timeline entry to delivery.
+    """
+    rows = {row.day: row for row in db.session.scalars(
+        select(DailyParcelStats).where(DailyParcelStats.day.between(first_day, last_day))
+    )}
+    days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+    total = Counter()
+    for row in rows.values():
+        for column in ('created', 'created_revenue', 'created_weight', 'delivered', 'delivered_revenue',
+                       'delivered_weight', 'delivery_seconds', 'cancelled'):
+            total[column] += getattr(row, column)
+    status_counts = {row.status: row.count for row in db.session.scalars(select(ParcelStatusCount))
+                     if row.count}
+
+    finished = total['delivered'] + total['cancelled']
+    return {
+        'from': first_day.isoformat(),
+        'to': last_day.isoformat(),
+        'totalParcels': total['created'],
+        'totalDeliveries': total['delivered'],
+        'successRate': round(100.0 * total['delivered'] / finished, 1) if finished else None,
+        'avgDeliveryTime': (round(total['delivery_seconds'] / total['delivered'] / 3600, 1)
+                            if total['delivered'] else None),  # hours
+        'revenue': round(total['delivered_revenue'], 2),
+        'bookedRevenue': round(total['created_revenue'], 2),
+        'totalWeight': round(total['created_weight'], 2),
+        'dailyDeliveries': [rows[day].delivered if day in rows else 0 for day in days],
+        'statusBreakdown': status_counts,
+    }
+
+
+def backfill_rollups(batch_size=10000):
+    """Rebuild both rollup tables from the parcels and their timelines.
+
+    Deliveries and cancellations are dated by the first timeline row with
+    that status, falling back to the parcel's updated_at. Runs in one
+    transaction, so the dashboard keeps serving the old numbers meanwhile.
+    Returns the number of parcels read.
+    """
+    db.session.execute(delete(DailyParcelStats))
+    db.session.execute(delete(ParcelStatusCount))
+    db.session.info.pop('analytics_rollups', None)
+
+    timeline = (
+        select(Location.parcel_id,
+               func.min(Location.timestamp).label('started_at'),
+               func.min(case((Location.status == 'delivered', Location.timestamp))).label('delivered_at'),
+               func.min(case((Location.status == 'cancelled', Location.timestamp))).label('cancelled_at'))
+        .group_by(Location.parcel_id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(Parcel.status, Parcel.price, Parcel.weight, Parcel.created_at, Parcel.updated_at,
+               timeline.c.started_at, timeline.c.delivered_at, timeline.c.cancelled_at)
+        .outerjoin(timeline, timeline.c.parcel_id == Parcel.id)
+        .execution_options(yield_per=batch_size)
+    )
+    days, statuses = _pending(db.session)
+    parcels = 0
+    for status, price, weight, created_at, updated_at, started_at, delivered_at, cancelled_at in rows:
+        parcels += 1
+        statuses[status] += 1
+        days[created_at.date()].update(created=1, created_revenue=price, created_weight=weight)
+        if status == 'delivered':
+            delivered_at = delivered_at or updated_at
+            days[delivered_at.date()].update(
+                delivered=1, delivered_revenue=price, delivered_weight=weight,
+                delivery_seconds=max((delivered_at - (started_at or created_at)).total_seconds(), 0)
+            )
+        elif status == 'cancelled':
+            days[(cancelled_at or updated_at).date()].update(cancelled=1)
+    write_rollups(db.session)
+    db.session.commit()
+    return parcels
@@ -0,0 +1,218 @@
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+try:
+    import redis
+except ImportError:  # redis is optional, the in-process backend needs nothing
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._generations = OrderedDict()
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def generation(self, key):
+        """Token to pass to set_if_generation, taken before reading the source"""
+        with self._lock:
+            return self._generations.get(key)
+
+    def set_if_generation(self, key, value, generation, ttl=None):
+        """set() unless `key` was invalidated since generation() was taken"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if self._generations.get(key) != generation:
+                return False
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def invalidate(self, *keys):
+        """Delete `keys` and stop in-flight reads from caching what they loaded"""
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+                self._generations[key] = next(self._counter)
+                self._generations.move_to_end(key)
+            # Generations only matter while a read is in flight, keep plenty
+            while len(self._generations) > 4 * self.maxsize:
+                self._generations.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """Same interface as TTLCache, shared between workers through Redis.
+
+    Values must be JSON serializable. Redis being unreachable is treated as
+    a miss (and logged) so callers fall back to the database; a failed
+    invalidate() leaves entries to expire with their TTL.
+    """
+
+    # Only write the entry if the key's generation is still what the reader saw
+    _SET_IF_GENERATION = """
+    if (redis.call('GET', KEYS[2]) or '') == ARGV[2] then
+        redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, client, prefix, ttl=60):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self._set_if_generation = client.register_script(self._SET_IF_GENERATION)
+
+    def _key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def _generation_key(self, key):
+        return f'{self.prefix}:gen:{key}'
+
+    def _expiry(self, ttl):
+        return max(1, int(self.ttl if ttl is None else ttl))
+
+    def get(self, key, default=None):
+        try:
+            raw = self.client.get(self._key(key))
+        except redis.RedisError as e:
+            logger.warning(f'Cache {self.prefix} unavailable, reading through: {e}')
+            return default
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        try:
+            self.client.set(self._key(key), json.dumps(value), ex=self._expiry(ttl))
+        except redis.RedisError as e:
+            logger.warning(f'Cache {self.prefix} unavailable, not storing {key}: {e}')
+
+    def delete(self, *keys):
+        if not keys:
+            return
+        try:
+            self.client.delete(*(self._key(key) for key in keys))
+        except redis.RedisError as e:
+            logger.error(f'Cache {self.prefix} unavailable, {len(keys)} entries expire by TTL: {e}')
+
+    def generation(self, key):
+        try:
+            raw = self.client.get(self._generation_key(key))
+        except redis.RedisError:
+            return None
+        return raw.decode() if raw is not None else ''
+
+    def set_if_generation(self, key, value, generation, ttl=None):
+        if generation is None:
+            return False  # Redis was down when the read started
+        try:
+            return bool(self._set_if_generation(
+                keys=[self._key(key), self._generation_key(key)],
+                args=[json.dumps(value), generation, self._expiry(ttl)]
+            ))
+        except redis.RedisError as e:
+            logger.warning(f'Cache {self.prefix} unavailable, not storing {key}: {e}')
+            return False
+
+    def invalidate(self, *keys):
+        if not keys:
+            return
+        try:
+            pipe = self.client.pipeline()
+            pipe.delete(*(self._key(key) for key in keys))
+            for key in keys:
+                # Outlives any read that could still be in flight
+                pipe.incr(self._generation_key(key))
+                pipe.expire(self._generation_key(key), self._expiry(None) + 60)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f'Cache {self.prefix} unavailable, {len(keys)} entries expire by TTL: {e}')
+
+    def clear(self):
+        try:
+            for key in self.client.scan_iter(match=f'{self.prefix}:*'):
+                self.client.delete(key)
+        except redis.RedisError as e:
+            logger.error(f'Cache {self.prefix} unavailable, not cleared: {e}')
+
+
+def get_cache(name, maxsize=1024, ttl=60):
+    """Return the app's cache called `name`, creating it on first use.
+
+    CACHE_BACKEND picks the backend: 'memory' keeps a TTLCache per worker
+    process, so invalidations only reach that process and it's only right
+    for single-process deployments; 'redis' shares entries (and
+    invalidations) between workers via REDIS_URL.
+    """
+    caches = current_app.extensions.setdefault('deliveroo_caches', {})
+    cache = caches.get(name)
+    if cache is None:
+        if current_app.config['CACHE_BACKEND'] == 'redis':
+            if redis is None:
+                raise RuntimeError("CACHE_BACKEND is 'redis' but the redis package is not installed")
+            client = redis.Redis.from_url(current_app.config['REDIS_URL'])
+            cache = RedisCache(client, prefix=f'deliveroo:{name}', ttl=ttl)
+        else:
+            cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        caches[name] = cache
+    return cache
+
+
+def tracking_cache():
+    """Cache of public tracking responses, keyed by tracking number"""
+    return get_cache(
+        'tracking',
+        maxsize=current_app.config['TRACKING_CACHE_SIZE'],
+        ttl=current_app.config['TRACKING_CACHE_TTL']
+    )
+
+
+def invalidate_tracking(*tracking_numbers):
+    """Drop cached tracking responses, call after committing a parcel change.
+
+    Also bumps their generation, so a request that read the parcel before
+    the commit can't put the old response back (see track_parcel).
+    """
+    tracking_cache().invalidate(*tracking_numbers)
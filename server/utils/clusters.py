@@ -0,0 +1,211 @@
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from models import db, Parcel
+from models.parcel import POSITION_COLUMNS
+from utils import geohash
+
+# Deepest level kept, cells of roughly 38 x 19 meters
+INDEX_PRECISION = 8
+# Screen pixels per map tile, see zoom_precision()
+TILE_SIZE = 256
+MAX_ZOOM = 22
+
+_build_lock = threading.Lock()
+
+
+class ClusterIndex:
+    """Parcel counts and coordinate sums per geohash cell, at every precision.
+
+    Each parcel contributes to the cell holding it at each of the
+    INDEX_PRECISION levels, per status, so a cluster's count, centroid and
+    status breakdown are one dict lookup whatever the fleet size. Parcels
+    moving or changing status are applied incrementally with apply().
+    """
+
+    def __init__(self, statuses):
+        self.statuses = frozenset(statuses)
+        self.built_at = time.monotonic()
+        self._parcels = {}
+        self._levels = [{} for _ in range(INDEX_PRECISION + 1)]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._parcels)
+
+    def _add(self, parcel_id, entry):
+        cell_hash, lat, lng, status = entry
+        self._parcels[parcel_id] = entry
+        for precision in range(1, INDEX_PRECISION + 1):
+            sums = self._levels[precision].setdefault(cell_hash[:precision], {}).setdefault(status, [0, 0.0, 0.0])
+            sums[0] += 1
+            sums[1] += lat
+            sums[2] += lng
+
+    def _remove(self, parcel_id):
+        entry = self._parcels.pop(parcel_id, None)
+        if entry is None:
+            return
+        cell_hash, lat, lng, status = entry
+        for precision in range(1, INDEX_PRECISION + 1):
+            cell = self._levels[precision][cell_hash[:precision]]
+            sums = cell[status]
+            sums[0] -= 1
+            sums[1] -= lat
+            sums[2] -= lng
+            if not sums[0]:
+                del cell[status]
+                if not cell:
+                    del self._levels[precision][cell_hash[:precision]]
+
+    def apply(self, changes):
+        """Apply {parcel_id: (lat, lng, status) or None} after a commit"""
+        with self._lock:
+            for parcel_id, position in changes.items():
+                self._remove(parcel_id)
+                if position is not None and position[2] in self.statuses:
+                    lat, lng, status = position
+                    self._add(parcel_id, (geohash.encode(lat, lng, INDEX_PRECISION), lat, lng, status))
+
+    def clusters(self, min_lat, min_lng, max_lat, max_lng, precision, statuses=None):
+        """Non-empty cells of `precision` overlapping the box, as API dicts"""
+        statuses = self.statuses if statuses is None else self.statuses & set(statuses)
+        result = []
+        with self._lock:
+            level = self._levels[precision]
+            for cell_hash in geohash.cells(min_lat, min_lng, max_lat, max_lng, precision):
+                cell = level.get(cell_hash)
+                if not cell:
+                    continue
+                count = sum_lat = sum_lng = 0
+                breakdown = {}
+                for status, sums in cell.items():
+                    if status in statuses:
+                        breakdown[status] = sums[0]
+                        count += sums[0]
+                        sum_lat += sums[1]
+                        sum_lng += sums[2]
+                if count:
+                    result.append({
+                        'geohash': cell_hash,
+                        'count': count,
+                        'centroid': {'lat': round(sum_lat / count, 6), 'lng': round(sum_lng / count, 6)},
+                        'statuses': breakdown
+                    })
+        return result
+
+
+def _position(parcel_id, current_lat, current_lng, pickup_lat, pickup_lng, status):
+    # Where the map shows a parcel: its current position, else its pickup point
+    if current_lat is not None and current_lng is not None:
+        return current_lat, current_lng, status
+    if pickup_lat is not None and pickup_lng is not None:
+        return pickup_lat, pickup_lng, status
+    return None
+
+
+def build_cluster_index(statuses):
+    """Load every parcel in `statuses` into a new ClusterIndex"""
+    index = ClusterIndex(statuses)
+    rows = db.session.execute(
+        select(Parcel.id, Parcel.current_lat, Parcel.current_lng, Parcel.pickup_lat, Parcel.pickup_lng,
+               Parcel.status)
+        .where(Parcel.status.in_(index.statuses))
+        .execution_options(yield_per=10000)
+    )
+    index.apply({row[0]: _position(*row) for row in rows})
+    return index
+
+
+def cluster_index():
+    """Return the app's cluster index, (re)building it when missing or older than CLUSTER_INDEX_TTL.
+
+    Writes made through this worker are applied as they commit; the TTL
+    bounds how long writes from other workers or processes go unseen.
+    """
+    config = current_app.config
+    index = current_app.extensions.get('deliveroo_cluster_index')
+    if index is None or time.monotonic() - index.built_at > config['CLUSTER_INDEX_TTL']:
+        with _build_lock:
+            index = current_app.extensions.get('deliveroo_cluster_index')
+            if index is None or time.monotonic() - index.built_at > config['CLUSTER_INDEX_TTL']:
+                index = build_cluster_index(config['CLUSTER_STATUSES'])
+                current_app.extensions['deliveroo_cluster_index'] = index
+    return index
+
+
+def zoom_precision(zoom, min_lat, min_lng, max_lat, max_lng):
+    """Geohash precision of the clusters shown at a web map zoom level.
+
+    Picks the smallest cells still at least CLUSTER_CELL_PX screen pixels
+    wide, then coarser ones if the box would need more than
+    CLUSTER_MAX_CELLS of them, so the response size depends on the screen
+    and not on the fleet.
+    """
+    config = current_app.config
+    target_width = 360.0 / 2 ** zoom * config['CLUSTER_CELL_PX'] / TILE_SIZE
+    precision = 1
+    for candidate in range(1, INDEX_PRECISION + 1):
+        if geohash.cell_size(candidate)[1] >= target_width:
+            precision = candidate
+    while precision > 1 and geohash.cell_count(min_lat, min_lng, max_lat, max_lng, precision) > config['CLUSTER_MAX_CELLS']:
+        precision -= 1
+    return precision
+
+
+def record_cluster_changes(session, positions):
+    """Queue {parcel_id: (lat, lng, status) or None} for the cluster index on commit.
+
+    Mapper events (see init_clusters) cover ORM writes; bulk statements,
+    which skip them, call this themselves.
+    """
+    session.info.setdefault('cluster_changes', {}).update(positions)
+
+
+def _track_cluster_change(mapper, connection, parcel):
+    # Any move counts, even within one geohash cell: the centroids are sums of coordinates
+    attrs = inspect(parcel).attrs
+    if attrs.status.history.has_changes() or any(attrs[column].history.has_changes()
+                                                 for column in POSITION_COLUMNS):
+        record_cluster_changes(inspect(parcel).session, {parcel.id: _position(
+            parcel.id, parcel.current_lat, parcel.current_lng, parcel.pickup_lat, parcel.pickup_lng, parcel.status
+        )})
+
+
+def _track_cluster_removal(mapper, connection, parcel):
+    record_cluster_changes(inspect(parcel).session, {parcel.id: None})
+
+
+def _apply_cluster_changes(session):
+    changes = session.info.pop('cluster_changes', None)
+    if changes and has_app_context():
+        # Nothing to do until the index is first built from the database
+        index = current_app.extensions.get('deliveroo_cluster_index')
+        if index is not None:
+            index.apply(changes)
+
+
+def _forget_cluster_changes(session):
+    session.info.pop('cluster_changes', None)
+
+
+_LISTENERS = [
+    (Parcel, 'after_insert', _track_cluster_change),
+    (Parcel, 'after_update', _track_cluster_change),
+    (Parcel, 'after_delete', _track_cluster_removal),
+    (Session, 'after_commit', _apply_cluster_changes),
+    (Session, 'after_rollback', _forget_cluster_changes),
+]
+
+
+def init_clusters(app):
+    """Apply committed parcel writes to the cluster index.
+
+    Registered from the app factory, once however many apps are created or
+    however the module is imported.
+    """
+    for target, name, listener in _LISTENERS:
+        if not event.contains(target, name, listener):
+            event.listen(target, name, listener)
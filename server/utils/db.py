@@ -0,0 +1,15 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db
+
+_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def upsert(model):
+    """INSERT construct supporting on_conflict_do_nothing/do_update for the bound dialect"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in _INSERTS:
+        raise NotImplementedError(f'Upserts are not supported on {dialect}')
+    return _INSERTS[dialect](model)
@@ -1,15 +1,12 @@
 from functools import wraps
 from flask import jsonify
-from flask_jwt_extended import get_jwt_identity
-from models import User
+from utils.roles import current_user_role
 
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user or user.role != 'admin':
+        # Role comes from the JWT claim / role cache, not a per-request query
+        if current_user_role() != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         
         return f(*args, **kwargs)
@@ -0,0 +1,218 @@
+import atexit
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, delete, func, bindparam
+from sqlalchemy.exc import IntegrityError
+from models import db, Parcel, User, DispatchJob
+from utils.cache import invalidate_tracking
+from utils.dispatch_solver import solve_dispatch
+
+# A courier's load counts the parcels they still have to deliver
+ACTIVE_STATUSES = ('pending', 'picked_up', 'in_transit')
+MAX_KEPT_JOBS = 20
+
+_pool_lock = threading.Lock()
+
+
+def dispatch_pool():
+    """The app's process pool for dispatch runs, started on first use"""
+    with _pool_lock:
+        pool = current_app.extensions.get('deliveroo_dispatch_pool')
+        if pool is None:
+            pool = current_app.extensions['deliveroo_dispatch_pool'] = ProcessPoolExecutor(
+                max_workers=current_app.config['DISPATCH_WORKERS']
+            )
+            atexit.register(pool.shutdown, wait=False, cancel_futures=True)
+    return pool
+
+
+def _courier_loads(courier_ids=None):
+    # {courier_id: kg of parcels they still have to deliver}
+    query = (select(Parcel.courier_id, func.sum(Parcel.weight))
+             .where(Parcel.courier_id.isnot(None), Parcel.status.in_(ACTIVE_STATUSES))
+             .group_by(Parcel.courier_id))
+    if courier_ids is not None:
+        query = query.where(Parcel.courier_id.in_(courier_ids))
+    return {courier_id: load or 0 for courier_id, load in db.session.execute(query)}
+
+
+def load_dispatch_batch(limit):
+    """Oldest unassigned pending parcels and every courier's spare capacity.
+
+    Returns (parcels, couriers) as column lists ready for solve_dispatch,
+    plus a {parcel_id: tracking_number} map for cache invalidation.
+    """
+    rows = db.session.execute(
+        select(Parcel.id, Parcel.tracking_number, Parcel.pickup_lat, Parcel.pickup_lng, Parcel.weight)
+        .where(Parcel.status == 'pending', Parcel.courier_id.is_(None))
+        .order_by(Parcel.created_at, Parcel.id)
+        .limit(limit)
+    ).all()
+    capacity = current_app.config['DISPATCH_COURIER_CAPACITY_KG']
+    loads = _courier_loads()
+    courier_ids = db.session.scalars(select(User.id).where(User.role == 'courier').order_by(User.id)).all()
+
+    parcels = {
+        'parcel_ids': [row.id for row in rows],
+        'lat': [row.pickup_lat for row in rows],
+        'lng': [row.pickup_lng for row in rows],
+        'weights': [row.weight for row in rows],
+    }
+    couriers = {
+        'courier_ids': courier_ids,
+        'capacities': [max(capacity - (loads.get(courier_id) or 0), 0) for courier_id in courier_ids],
+    }
+    return parcels, couriers, {row.id: row.tracking_number for row in rows}
+
+
+def apply_assignments(assignments, tracking_numbers):
+    """Write {parcel_id: courier_id} and commit, returning how many were applied.
+
+    The couriers' rows are locked and their loads read again first, so a
+    run on another worker since the batch was loaded can't push anyone past
+    DISPATCH_COURIER_CAPACITY_KG: assignments that no longer fit are left
+    out, as are parcels that were assigned, cancelled or picked up meanwhile.
+    """
+    if not assignments:
+        return 0
+    courier_ids = sorted(set(assignments.values()))
+    # Locked in id order so two runs can't deadlock; a no-op on SQLite,
+    # which only has one writer anyway
+    db.session.execute(select(User.id).where(User.id.in_(courier_ids)).order_by(User.id).with_for_update())
+    loads = _courier_loads(courier_ids)
+    weights = dict(db.session.execute(
+        select(Parcel.id, Parcel.weight)
+        .where(Parcel.id.in_(list(assignments)), Parcel.courier_id.is_(None), Parcel.status == 'pending')
+    ).all())
+    capacity = current_app.config['DISPATCH_COURIER_CAPACITY_KG']
+    accepted = {}
+    for parcel_id, courier_id in assignments.items():
+        if parcel_id not in weights:
+            continue
+        load = loads.get(courier_id, 0) + weights[parcel_id]
+        if load <= capacity + 1e-9:  # sums in SQL and here round differently
+            loads[courier_id] = load
+            accepted[parcel_id] = courier_id
+    if not accepted:
+        db.session.rollback()
+        return 0
+
+    table = Parcel.__table__
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(table)
+        .where(table.c.id == bindparam('parcel_id'), table.c.courier_id.is_(None), table.c.status == 'pending')
+        .values(courier_id=bindparam('assigned_courier_id'), updated_at=now),
+        [{'parcel_id': parcel_id, 'assigned_courier_id': courier_id} for parcel_id, courier_id in accepted.items()]
+    )
+    db.session.commit()
+    invalidate_tracking(*(tracking_numbers[parcel_id] for parcel_id in accepted))
+    return result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(accepted)
+
+
+def run_dispatch(batch_size):
+    """Load, solve and write one dispatch batch in this process, returning a summary"""
+    parcels, couriers, tracking_numbers = load_dispatch_batch(batch_size)
+    assignments, unassigned = solve_dispatch(**parcels, **couriers)
+    applied = apply_assignments(assignments, tracking_numbers)
+    return {
+        'parcels': len(parcels['parcel_ids']),
+        'couriers': len(couriers['courier_ids']),
+        'assigned': applied,
+        'unassigned': len(unassigned),
+        'skipped': len(assignments) - applied,
+    }
+
+
+def _update_job(job_id, **fields):
+    db.session.execute(update(DispatchJob).where(DispatchJob.id == job_id).values(**fields))
+    db.session.commit()
+
+
+def _fail_job(job_id, error):
+    _update_job(job_id, status='failed', running=None, error=error, finished_at=datetime.utcnow())
+
+
+def _record_result(job_id, assignments, unassigned, tracking_numbers):
+    applied = apply_assignments(assignments, tracking_numbers)
+    _update_job(job_id, status='done', running=None, assigned=applied, unassigned=len(unassigned),
+                skipped=len(assignments) - applied, finished_at=datetime.utcnow())
+
+
+def _finish(app, job_id, tracking_numbers, future):
+    # Runs on the pool's result thread once the solver returns
+    with app.app_context():
+        try:
+            assignments, unassigned = future.result()
+            _record_result(job_id, assignments, unassigned, tracking_numbers)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f'Dispatch job {job_id} failed: {e}')
+            _fail_job(job_id, str(e))
+        finally:
+            db.session.remove()
+
+
+def _claim_job():
+    """Insert a running job, or return None while another worker's run holds the slot"""
+    now = datetime.utcnow()
+    # A worker that died mid-run would otherwise hold the slot for good
+    db.session.execute(
+        update(DispatchJob)
+        .where(DispatchJob.running.is_(True),
+               DispatchJob.started_at < now - timedelta(seconds=current_app.config['DISPATCH_JOB_TIMEOUT']))
+        .values(status='failed', running=None, error='Timed out', finished_at=now)
+    )
+    # Keep the last few finished jobs around for polling
+    db.session.execute(delete(DispatchJob).where(
+        DispatchJob.running.is_(None),
+        DispatchJob.id.not_in(select(DispatchJob.id).order_by(DispatchJob.started_at.desc()).limit(MAX_KEPT_JOBS))
+    ))
+    job = DispatchJob(id=uuid.uuid4().hex, status='running', running=True, started_at=now)
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    return job.id
+
+
+def start_dispatch():
+    """Queue a dispatch run, returning (job, started).
+
+    The batch is loaded here, the solver runs in the process pool and the
+    assignments are written when it's done, so the request returns at once.
+    Only one run at a time across all workers; while one is going its job
+    is returned with started False (None if it finished meanwhile). With
+    DISPATCH_WORKERS 0 or in tests the solver runs inline.
+    """
+    app = current_app._get_current_object()
+    job_id = _claim_job()
+    if job_id is None:
+        running = db.session.scalars(select(DispatchJob).where(DispatchJob.running.is_(True))).first()
+        return (running.to_dict() if running else None), False
+
+    try:
+        parcels, couriers, tracking_numbers = load_dispatch_batch(app.config['DISPATCH_BATCH_SIZE'])
+        _update_job(job_id, parcels=len(parcels['parcel_ids']), couriers=len(couriers['courier_ids']))
+        if app.testing or not app.config['DISPATCH_WORKERS']:
+            assignments, unassigned = solve_dispatch(**parcels, **couriers)
+            _record_result(job_id, assignments, unassigned, tracking_numbers)
+        else:
+            future = dispatch_pool().submit(solve_dispatch, **parcels, **couriers)
+            future.add_done_callback(lambda done: _finish(app, job_id, tracking_numbers, done))
+    except Exception as e:
+        db.session.rollback()
+        _fail_job(job_id, str(e))
+        raise
+    return get_dispatch_job(job_id), True
+
+
+def get_dispatch_job(job_id):
+    """A dispatch job's state as returned by the API, or None if there's no such job"""
+    job = db.session.get(DispatchJob, job_id, populate_existing=True)
+    return job.to_dict() if job else None
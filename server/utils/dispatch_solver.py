@@ -0,0 +1,126 @@
+"""Courier assignment heuristic, kept free of Flask and database imports so
+it runs cheaply in ProcessPoolExecutor workers (see utils/dispatch.py)."""
+import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _project(lat, lng):
+    # Equirectangular km around the batch's mean latitude, fine at city scale
+    scale = math.cos(math.radians(float(np.mean(lat)))) if len(lat) else 1.0
+    return np.column_stack((np.radians(lng) * scale, np.radians(lat))) * EARTH_RADIUS_KM
+
+
+def kmeans(points, k, iterations=20, seed=0):
+    """Cluster labels and centers for (n, 2) points, k-means++ seeded"""
+    rng = np.random.default_rng(seed)
+    centers = np.empty((k, 2))
+    centers[0] = points[rng.integers(len(points))]
+    closest = ((points - centers[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        total = closest.sum()
+        choice = rng.choice(len(points), p=closest / total) if total > 0 else rng.integers(len(points))
+        centers[i] = points[choice]
+        closest = np.minimum(closest, ((points - centers[i]) ** 2).sum(axis=1))
+
+    labels = None
+    point_norms = (points ** 2).sum(axis=1)[:, None]
+    for _ in range(iterations):
+        # (n, k) squared distances without an (n, k, 2) intermediate
+        distances = point_norms - 2 * points @ centers.T + (centers ** 2).sum(axis=1)[None, :]
+        new_labels = distances.argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=k)
+        for axis in range(2):
+            sums = np.bincount(labels, weights=points[:, axis], minlength=k)
+            centers[counts > 0, axis] = sums[counts > 0] / counts[counts > 0]
+    return labels, centers
+
+
+def _fill(order, weights, capacity):
+    """Indices from `order` taken nearest first until `capacity`, and their load"""
+    taken = []
+    load = 0.0
+    lightest = weights[order].min() if len(order) else 0.0
+    for index in order:
+        if load + weights[index] <= capacity:
+            load += weights[index]
+            taken.append(index)
+            if capacity - load < lightest:
+                break
+    return taken, load
+
+
+def solve_dispatch(parcel_ids, lat, lng, weights, courier_ids, capacities, seed=0):
+    """Assign parcels to couriers by pickup proximity within weight capacity.
+
+    Pickups are clustered with k-means, k being roughly how many couriers
+    the total weight needs. In rounds, each cluster (heaviest leftovers
+    first) takes the idle courier with the most spare capacity, who is
+    filled with the cluster's parcels nearest its center first (parcels
+    that don't fit are skipped), until the clusters or the couriers run
+    out. Couriers left with spare room then top up with the nearest parcels
+    still unassigned, and idle couriers start from whatever is left.
+    Returns ({parcel_id: courier_id}, [unassigned parcel ids]).
+    """
+    lat, lng = np.asarray(lat, dtype=float), np.asarray(lng, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    capacities = np.asarray(capacities, dtype=float)
+    if not len(parcel_ids) or not len(courier_ids):
+        return {}, list(parcel_ids)
+
+    points = _project(lat, lng)
+    usable = capacities[capacities > 0]
+    per_courier = float(usable.mean()) if len(usable) else 1.0
+    k = int(min(len(courier_ids), len(parcel_ids), max(1, math.ceil(weights.sum() / per_courier))))
+    labels, centers = kmeans(points, k, seed=seed)
+
+    remaining = capacities.copy()
+    courier_centers = np.full((len(courier_ids), 2), np.nan)
+    assigned_to = np.full(len(parcel_ids), -1)
+    orders = {}
+    for cluster in range(k):
+        members = np.flatnonzero(labels == cluster)
+        orders[cluster] = members[np.argsort(((points[members] - centers[cluster]) ** 2).sum(axis=1))]
+    # One courier per cluster per round, heaviest leftovers first, so a
+    # short fleet is spread over the city rather than spent on one cluster
+    while orders:
+        for cluster in sorted(orders, key=lambda c: -weights[orders[c]].sum()):
+            idle = np.isnan(courier_centers[:, 0])
+            if not idle.any():
+                orders = {}
+                break
+            courier = int(np.argmax(np.where(idle, remaining, -np.inf)))
+            courier_centers[courier] = centers[cluster]
+            taken, load = _fill(orders[cluster], weights, remaining[courier])
+            remaining[courier] -= load
+            assigned_to[taken] = courier
+            orders[cluster] = orders[cluster][~np.isin(orders[cluster], taken)]
+            if not len(orders[cluster]):
+                del orders[cluster]
+
+    # Clusters rarely split evenly across couriers, so top up the partly
+    # loaded ones from the leftovers, then send idle couriers after the rest
+    for courier in np.argsort(-remaining):
+        pool = np.flatnonzero(assigned_to < 0)
+        if not len(pool):
+            break
+        if remaining[courier] < weights[pool].min():
+            continue
+        center = courier_centers[courier]
+        if np.isnan(center[0]):
+            center = points[pool[np.argmax(weights[pool])]]
+        order = pool[np.argsort(((points[pool] - center) ** 2).sum(axis=1))]
+        taken, load = _fill(order, weights, remaining[courier])
+        remaining[courier] -= load
+        assigned_to[taken] = courier
+
+    assignments = {
+        parcel_ids[index]: courier_ids[courier]
+        for index, courier in enumerate(assigned_to.tolist()) if courier >= 0
+    }
+    unassigned = [parcel_ids[index] for index in np.flatnonzero(assigned_to < 0).tolist()]
+    return assignments, unassigned
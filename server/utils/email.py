@@ -1,46 +1,153 @@
+import json
+from datetime import datetime, timedelta
 from flask import current_app
 from flask_mail import Message, Mail
+from models import db, EmailOutbox
 
 mail = Mail()
 
-def send_welcome_email(email, name):
-    """Send welcome email to new user"""
-    try:
-        msg = Message(
-            subject='Welcome to Deliveroo!',
-            sender=current_app.config['MAIL_USERNAME'],
-            recipients=[email]
-        )
-        msg.html = f"""
-        <h2>Welcome to Deliveroo, {name}!</h2>
-        <p>Thank you for joining our parcel delivery service.</p>
-        <p>You can now create and track your parcels through our platform.</p>
-        <p>Best regards,<br>The Deliveroo Team</p>
-        """
-        mail.send(msg)
-        return True
-    except Exception as e:
-        print(f"Error sending welcome email: {e}")
-        return False
-
-def send_status_update_email(email, tracking_number, old_status, new_status):
-    """Send status update email to user"""
-    try:
-        msg = Message(
-            subject=f'Parcel Update - {tracking_number}',
-            sender=current_app.config['MAIL_USERNAME'],
-            recipients=[email]
-        )
-        msg.html = f"""
-        <h2>Parcel Status Update</h2>
-        <p>Your parcel <strong>{tracking_number}</strong> status has been updated.</p>
-        <p>Previous status: <strong>{old_status}</strong></p>
-        <p>Current status: <strong>{new_status}</strong></p>
-        <p>Track your parcel at: <a href="http://localhost:3000">Deliveroo</a></p>
-        <p>Best regards,<br>The Deliveroo Team</p>
-        """
-        mail.send(msg)
-        return True
-    except Exception as e:
-        print(f"Error sending status update email: {e}")
-        return False
\ No newline at end of file
+def render_template(template_name, **context):
+    """Render an email template from templates/email.
+
+    Flask's Jinja environment compiles each template once and keeps it in
+    its template cache, so rendering a batch only pays for the render.
+    """
+    template = current_app.jinja_env.get_template(f'email/{template_name}.html')
+    return template.render(frontend_url=current_app.config['FRONTEND_URL'], **context)
+
+def render_welcome_email(name):
+    """Welcome email for a new user"""
+    return 'Welcome to Deliveroo!', render_template('welcome', name=name), None
+
+def render_status_update_email(tracking_number, old_status, new_status):
+    """Status update email for a single transition"""
+    html = render_template('status_update', tracking_number=tracking_number,
+                           old_status=old_status, new_status=new_status)
+    return f'Parcel Update - {tracking_number}', html, None
+
+def render_status_digest_email(events):
+    """One email for every status change coalesced into a digest.
+
+    Events are grouped per parcel in the order they happened, so a parcel
+    walked through several statuses shows where it started and ended.
+    """
+    parcels = {}
+    for event in events:
+        parcel = parcels.setdefault(event['tracking_number'], {
+            'tracking_number': event['tracking_number'],
+            'old_status': event['old_status'],
+            'events': []
+        })
+        parcel['new_status'] = event['new_status']
+        parcel['events'].append(event)
+    parcels = list(parcels.values())
+
+    if len(parcels) == 1:
+        subject = f'Parcel Update - {parcels[0]["tracking_number"]}'
+    else:
+        subject = f'Parcel Updates - {len(parcels)} parcels'
+    return subject, render_template('status_digest', parcels=parcels), None
+
+def render_location_update_email(tracking_number, location):
+    """Location update email for a parcel owner"""
+    html = render_template('location_update', tracking_number=tracking_number, location=location)
+    return f'Location Update - {tracking_number}', html, None
+
+def render_raw_email(subject, html, text=None):
+    """Pre-rendered email"""
+    return subject, html, text
+
+# Outbox kind -> renderer taking the row's JSON payload as keyword arguments
+TEMPLATES = {
+    'welcome': render_welcome_email,
+    'status_update': render_status_update_email,
+    'status_digest': render_status_digest_email,
+    'location_update': render_location_update_email,
+    'raw': render_raw_email,
+}
+
+def queue_email(kind, recipient, coalesce_key=None, send_at=None, **context):
+    """Add an email to the outbox in the current session.
+
+    Nothing is sent until the caller commits, so the email is written in the
+    same transaction as the change it reports and is never sent for a
+    rolled back change. Workers in utils/outbox.py deliver it.
+    """
+    row = EmailOutbox(kind=kind, recipient=recipient, payload=json.dumps(context),
+                      coalesce_key=coalesce_key, next_attempt_at=send_at or datetime.utcnow())
+    db.session.add(row)
+    return row
+
+def queue_welcome_email(email, name):
+    """Queue the welcome email for a new user"""
+    return queue_email('welcome', email, name=name)
+
+def _open_digest(coalesce_key, now):
+    # A digest can take more events until it falls due; locking it keeps a
+    # worker (which skips locked rows) from sending it mid-append
+    return (EmailOutbox.query
+            .filter(EmailOutbox.coalesce_key == coalesce_key,
+                    EmailOutbox.status == 'pending',
+                    EmailOutbox.attempts == 0,
+                    EmailOutbox.next_attempt_at > now)
+            .order_by(EmailOutbox.id.desc())
+            .with_for_update()
+            .first())
+
+def _recently_emailed(coalesce_key, since):
+    return db.session.query(
+        EmailOutbox.query.filter(EmailOutbox.coalesce_key == coalesce_key, EmailOutbox.created_at >= since).exists()
+    ).scalar()
+
+def queue_status_update_email(email, tracking_number, old_status, new_status):
+    """Queue a status update email for a parcel owner.
+
+    The first transition is sent right away. Further ones within
+    EMAIL_DIGEST_WINDOW seconds of it are collected into one pending digest,
+    per parcel or per user depending on EMAIL_DIGEST_SCOPE, sent once the
+    window closes; so walking a parcel through several statuses sends two
+    emails rather than one per status.
+    """
+    config = current_app.config
+    window = config['EMAIL_DIGEST_WINDOW']
+    if window <= 0:
+        return queue_email('status_update', email, tracking_number=tracking_number,
+                           old_status=old_status, new_status=new_status)
+
+    coalesce_key = f'status:{email}'
+    if config['EMAIL_DIGEST_SCOPE'] == 'parcel':
+        coalesce_key = f'{coalesce_key}:{tracking_number}'
+
+    now = datetime.utcnow()
+    event = {'tracking_number': tracking_number, 'old_status': old_status,
+             'new_status': new_status, 'at': now.isoformat()}
+    row = _open_digest(coalesce_key, now)
+    if row is not None:
+        payload = json.loads(row.payload)
+        payload['events'].append(event)
+        row.payload = json.dumps(payload)
+        return row
+
+    if not _recently_emailed(coalesce_key, now - timedelta(seconds=window)):
+        # Nothing to coalesce with; the key marks the window for follow-ups
+        return queue_email('status_update', email, coalesce_key=coalesce_key, tracking_number=tracking_number,
+                           old_status=old_status, new_status=new_status)
+    return queue_email('status_digest', email, coalesce_key=coalesce_key,
+                       send_at=now + timedelta(seconds=window), events=[event])
+
+def queue_location_update_email(email, tracking_number, location):
+    """Queue a location update email for a parcel owner"""
+    return queue_email('location_update', email, tracking_number=tracking_number, location=location)
+
+def build_message(row):
+    """Render an outbox row into a flask_mail Message"""
+    subject, html, text = TEMPLATES[row.kind](**json.loads(row.payload))
+    msg = Message(
+        subject=subject,
+        sender=current_app.config['MAIL_USERNAME'],
+        recipients=[row.recipient]
+    )
+    msg.html = html
+    if text:
+        msg.body = text
+    return msg
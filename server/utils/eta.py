@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+from models import db, Parcel, Location
+from utils.cache import get_cache
+from utils.trajectory import haversine_m
+
+
+def eta_cache():
+    """Cache of computed ETAs, keyed by parcel id"""
+    return get_cache('eta', maxsize=current_app.config['ETA_CACHE_SIZE'], ttl=current_app.config['ETA_CACHE_TTL'])
+
+
+def _speeds(parcel_ids, since, all_in_transit=False):
+    """Recent average speed in m/s per parcel (NaN without enough data) and for the fleet.
+
+    Speed is distance over time between consecutive GPS fixes of the same
+    parcel since `since`, summed per parcel with np.bincount. With
+    `all_in_transit` the fixes are selected by joining on the parcel's
+    status rather than by a list of every in-transit parcel's id.
+    """
+    query = (select(Location.parcel_id, Location.latitude, Location.longitude, Location.timestamp)
+             .where(Location.latitude.isnot(None), Location.timestamp >= since)
+             .order_by(Location.parcel_id, Location.timestamp))
+    if all_in_transit:
+        query = query.join(Parcel, Parcel.id == Location.parcel_id).where(Parcel.status == 'in_transit')
+    else:
+        query = query.where(Location.parcel_id.in_(parcel_ids))
+    position = {parcel_id: i for i, parcel_id in enumerate(parcel_ids)}
+    # Parcels that went in transit after `parcel_ids` was read are left out
+    rows = [row for row in db.session.execute(query) if row[0] in position]
+    speeds = np.full(len(parcel_ids), np.nan)
+    if len(rows) < 2:
+        return speeds, np.nan
+
+    owner = np.fromiter((position[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+    lat = np.fromiter((row[1] for row in rows), dtype=float, count=len(rows))
+    lng = np.fromiter((row[2] for row in rows), dtype=float, count=len(rows))
+    seconds = np.fromiter(((row[3] - since).total_seconds() for row in rows), dtype=float, count=len(rows))
+
+    distance = haversine_m(lat[:-1], lng[:-1], lat[1:], lng[1:])
+    elapsed = seconds[1:] - seconds[:-1]
+    # Segments within one parcel; jumps faster than ETA_MAX_SPEED_KMH are GPS noise
+    valid = ((owner[1:] == owner[:-1]) & (elapsed > 0)
+             & (distance <= elapsed * current_app.config['ETA_MAX_SPEED_KMH'] / 3.6))
+    distance = np.where(valid, distance, 0.0)
+    elapsed = np.where(valid, elapsed, 0.0)
+    total_distance = np.bincount(owner[1:], weights=distance, minlength=len(parcel_ids))
+    total_elapsed = np.bincount(owner[1:], weights=elapsed, minlength=len(parcel_ids))
+
+    min_elapsed = current_app.config['ETA_MIN_SAMPLE_SECONDS']
+    measured = total_elapsed >= min_elapsed
+    speeds[measured] = total_distance[measured] / total_elapsed[measured]
+    fleet_elapsed = total_elapsed[measured].sum()
+    fleet = total_distance[measured].sum() / fleet_elapsed if fleet_elapsed else np.nan
+    return speeds, fleet
+
+
+def compute_etas(parcel_ids=None):
+    """ETAs of in-transit parcels (all of them, or those in `parcel_ids`) in one vectorized pass.
+
+    Remaining distance is the great-circle distance from the current
+    position (or pickup point) to the destination, times ETA_ROUTE_FACTOR
+    for roads. Speed is the parcel's own over the last ETA_SPEED_WINDOW
+    seconds, else the fleet's, else ETA_DEFAULT_SPEED_KMH, clamped to
+    [ETA_MIN_SPEED_KMH, ETA_MAX_SPEED_KMH]. Results are cached per parcel.
+    Returns {parcel_id: eta dict}.
+    """
+    config = current_app.config
+    query = select(Parcel.id, Parcel.current_lat, Parcel.current_lng,
+                   Parcel.pickup_lat, Parcel.pickup_lng, Parcel.destination_lat, Parcel.destination_lng
+                   ).where(Parcel.status == 'in_transit')
+    if parcel_ids is not None:
+        query = query.where(Parcel.id.in_(parcel_ids))
+    rows = db.session.execute(query.order_by(Parcel.id)).all()
+    if not rows:
+        return {}
+
+    columns = np.array([[np.nan if value is None else value for value in row[1:]] for row in rows], dtype=float)
+    current_lat, current_lng, pickup_lat, pickup_lng, destination_lat, destination_lng = columns.T
+    located = ~(np.isnan(current_lat) | np.isnan(current_lng))
+    lat = np.where(located, current_lat, pickup_lat)
+    lng = np.where(located, current_lng, pickup_lng)
+    remaining = haversine_m(lat, lng, destination_lat, destination_lng) * config['ETA_ROUTE_FACTOR']
+
+    now = datetime.utcnow()
+    ids = [row[0] for row in rows]
+    speeds, fleet = _speeds(ids, now - timedelta(seconds=config['ETA_SPEED_WINDOW']), parcel_ids is None)
+    fallback = fleet if not np.isnan(fleet) else config['ETA_DEFAULT_SPEED_KMH'] / 3.6
+    speeds = np.where(np.isnan(speeds), fallback, speeds)
+    speeds = np.clip(speeds, config['ETA_MIN_SPEED_KMH'] / 3.6, config['ETA_MAX_SPEED_KMH'] / 3.6)
+    seconds_left = remaining / speeds
+
+    etas = {}
+    for i, row in enumerate(rows):
+        etas[row[0]] = {
+            'distanceRemaining': round(float(remaining[i])),  # meters
+            'speed': round(float(speeds[i]) * 3.6, 1),  # km/h
+            'eta': (now + timedelta(seconds=float(seconds_left[i]))).isoformat(),
+            'computedAt': now.isoformat()
+        }
+    cache = eta_cache()
+    for parcel_id, eta in etas.items():
+        cache.set(str(parcel_id), eta)
+    return etas
+
+
+def parcel_eta(parcel_id, status):
+    """Cached ETA of one parcel, computed on a miss; None unless it's in transit"""
+    if status != 'in_transit':
+        return None
+    eta = eta_cache().get(str(parcel_id))
+    if eta is None:
+        eta = compute_etas([parcel_id]).get(parcel_id)
+    return eta
+
+
+def invalidate_etas(*parcel_ids):
+    """Drop cached ETAs so the next read recomputes them"""
+    eta_cache().delete(*(str(parcel_id) for parcel_id in parcel_ids))
+
+
+def refresh_etas(*parcel_ids):
+    """Recompute cached ETAs after parcels moved or changed status, call after committing.
+
+    Failures are only logged: the stale entries are gone either way, so the
+    next read computes them again.
+    """
+    if not parcel_ids:
+        return
+    invalidate_etas(*parcel_ids)
+    try:
+        compute_etas(list(parcel_ids))
+    except Exception as e:
+        current_app.logger.warning(f'ETA refresh failed: {e}')
@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+from models.parcel import PARCEL_FIELDS
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+# Nested {lat, lng} fields are flattened to two CSV columns
+COORDINATE_FIELDS = {'pickupCoords', 'destinationCoords', 'currentLocation'}
+
+
+def _csv_columns(fields):
+    columns = []
+    for name in fields:
+        if name in COORDINATE_FIELDS:
+            columns.extend((name, key) for key in ('lat', 'lng'))
+        else:
+            columns.append((name, None))
+    return columns
+
+
+def _serialize(row, fields):
+    return {name: PARCEL_FIELDS[name][1](row) for name in fields}
+
+
+def ndjson_chunks(partitions, fields):
+    """Yield one NDJSON chunk per partition of rows"""
+    for rows in partitions:
+        yield ''.join(json.dumps(_serialize(row, fields)) + '\n' for row in rows)
+
+
+def csv_chunks(partitions, fields):
+    """Yield the header row, then one CSV chunk per partition of rows"""
+    columns = _csv_columns(fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(name if key is None else f'{name}.{key}' for name, key in columns)
+
+    for rows in partitions:
+        for row in rows:
+            record = _serialize(row, fields)
+            writer.writerow(
+                record[name] if key is None else (record[name] or {}).get(key)
+                for name, key in columns
+            )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
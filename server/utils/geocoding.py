@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from models import db, GeocodeCache
+from utils.cache import get_cache
+from utils.db import upsert
+
+GOOGLE_GEOCODE_URL = 'https://maps.googleapis.com/maps/api/geocode/json'
+
+# Providers run on worker threads without an app context, so they log here
+logger = logging.getLogger(__name__)
+
+
+class GeocodingError(Exception):
+    """Raised by providers when the upstream service can't be reached"""
+
+
+def normalize_address(address):
+    """Cache key for an address: case, spacing and comma spacing don't matter"""
+    address = re.sub(r'\s*,\s*', ', ', address.strip().casefold())
+    return re.sub(r'\s+', ' ', address).strip(' ,')
+
+
+def address_hash(key):
+    """Fixed-length form of a normalized address, the geocode_cache lookup key"""
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+class GeocodingProvider:
+    """Turns one address into {'lat', 'lng'}, or None when it can't be found"""
+    name = None
+
+    def geocode(self, address):
+        raise NotImplementedError
+
+
+class GoogleGeocodingProvider(GeocodingProvider):
+    """Google Geocoding API over a pooled session with timeouts and retries.
+
+    `base_url` can point at any server speaking the same JSON format, which is
+    how the tests run against a local stub.
+    """
+    name = 'google'
+
+    def __init__(self, api_key, base_url=GOOGLE_GEOCODE_URL, timeout=5.0, retries=3,
+                 backoff=0.3, pool_size=10):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET',)
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def geocode(self, address):
+        try:
+            response = self.session.get(
+                self.base_url,
+                params={'address': address, 'key': self.api_key},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            res_json = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise GeocodingError(str(e))
+
+        if res_json.get('status') == 'OK':
+            location = res_json['results'][0]['geometry']['location']
+            return {'lat': location['lat'], 'lng': location['lng']}
+        if res_json.get('status') != 'ZERO_RESULTS':
+            logger.warning(f'Geocoding "{address}" returned {res_json.get("status")}')
+        return None
+
+
+PROVIDERS = {
+    'google': GoogleGeocodingProvider,
+}
+
+
+class Geocoder:
+    """Normalized-address cache in front of a provider.
+
+    Lookups go in-memory LRU -> geocode_cache table -> provider, and every
+    level that missed is filled on the way back. Provider calls for several
+    addresses are dispatched concurrently on a bounded thread pool.
+    """
+
+    def __init__(self, provider, memory_cache, max_workers=8):
+        self.provider = provider
+        self.memory_cache = memory_cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='geocoder')
+
+    def geocode(self, address):
+        return self.geocode_many([address]).get(address)
+
+    def geocode_many(self, addresses):
+        """Resolve many addresses at once, returning {address: coords or None}.
+
+        One query covers every database hit and the remaining provider calls
+        run in parallel, at most max_workers at a time, so a bulk import costs
+        roughly the slowest lookup per batch rather than the sum of them.
+        """
+        keys = {address: normalize_address(address) for address in addresses}
+        found = {}
+        for key in set(keys.values()):
+            coords = self.memory_cache.get(key) if key else None
+            if coords is not None:
+                found[key] = coords
+
+        missing = {key for key in keys.values() if key and key not in found}
+        if missing:
+            hashes = {address_hash(key): key for key in missing}
+            for row in GeocodeCache.query.filter(GeocodeCache.address_key.in_(hashes)):
+                key = hashes[row.address_key]
+                found[key] = row.to_dict()
+                self.memory_cache.set(key, found[key])
+
+        # One provider call per distinct key, using the first spelling seen
+        to_fetch = {}
+        for address, key in keys.items():
+            if key and key not in found:
+                to_fetch.setdefault(key, address)
+        if len(to_fetch) == 1:
+            results = [self._fetch(*next(iter(to_fetch.items())))]
+        else:
+            results = list(self.executor.map(lambda item: self._fetch(*item), to_fetch.items()))
+
+        for key, coords in results:
+            if coords is not None:
+                self._store(key, coords)
+                self.memory_cache.set(key, coords)
+                found[key] = coords
+
+        return {address: found.get(key) for address, key in keys.items()}
+
+    def _fetch(self, key, address):
+        try:
+            return key, self.provider.geocode(address)
+        except GeocodingError as e:
+            logger.error(f'Geocoding failed for "{address}": {e}')
+            return key, None
+
+    def _store(self, key, coords):
+        # Joins the caller's transaction; a concurrent insert of the same key
+        # is ignored instead of failing the parcel update around it
+        db.session.execute(
+            upsert(GeocodeCache).values(
+                address_key=address_hash(key),
+                address=key,
+                latitude=coords['lat'],
+                longitude=coords['lng'],
+                provider=self.provider.name
+            ).on_conflict_do_nothing(index_elements=['address_key'])
+        )
+
+
+def get_geocoder():
+    """Return the app's Geocoder, built from config on first use"""
+    geocoder = current_app.extensions.get('deliveroo_geocoder')
+    if geocoder is None:
+        config = current_app.config
+        provider = PROVIDERS[config['GEOCODING_PROVIDER']](
+            api_key=config['GOOGLE_MAPS_API_KEY'],
+            base_url=config['GEOCODING_URL'],
+            timeout=config['GEOCODING_TIMEOUT'],
+            retries=config['GEOCODING_RETRIES'],
+            pool_size=config['GEOCODING_MAX_WORKERS']
+        )
+        memory_cache = get_cache('geocode', maxsize=config['GEOCODING_CACHE_SIZE'],
+                                 ttl=config['GEOCODING_CACHE_TTL'])
+        geocoder = current_app.extensions['deliveroo_geocoder'] = Geocoder(
+            provider, memory_cache, max_workers=config['GEOCODING_MAX_WORKERS']
+        )
+    return geocoder
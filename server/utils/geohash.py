@@ -0,0 +1,115 @@
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Stored precision: 9 characters is a cell of roughly 5 x 5 meters
+PRECISION = 9
+METERS_PER_DEGREE = 111320.0
+
+
+def encode(lat, lng, precision=PRECISION):
+    """Geohash of a point; nearby points share long prefixes"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) in degrees of a geohash cell"""
+    lat_bits = 5 * precision // 2
+    lng_bits = 5 * precision - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def _grid(min_lat, min_lng, max_lat, max_lng, precision):
+    height, width = cell_size(precision)
+    first_row, first_col = math.floor((min_lat + 90) / height), math.floor((min_lng + 180) / width)
+    rows = math.floor((max_lat + 90) / height) - first_row + 1
+    cols = math.floor((max_lng + 180) / width) - first_col + 1
+    return first_row, first_col, rows, cols
+
+
+def cell_count(min_lat, min_lng, max_lat, max_lng, precision):
+    """How many cells of `precision` a bounding box overlaps"""
+    _, _, rows, cols = _grid(*_clamp(min_lat, min_lng, max_lat, max_lng), precision)
+    return rows * cols
+
+
+def cells(min_lat, min_lng, max_lat, max_lng, precision):
+    """Geohashes of the `precision` cells a bounding box overlaps"""
+    min_lat, min_lng, max_lat, max_lng = _clamp(min_lat, min_lng, max_lat, max_lng)
+    height, width = cell_size(precision)
+    first_row, first_col, rows, cols = _grid(min_lat, min_lng, max_lat, max_lng, precision)
+    hashes = set()
+    for row in range(rows):
+        for col in range(cols):
+            # Encode each cell's center, which is unambiguous at cell edges
+            lat = min(-90 + (first_row + row + 0.5) * height, 90.0)
+            lng = min(-180 + (first_col + col + 0.5) * width, 180.0)
+            hashes.add(encode(lat, lng, precision))
+    return sorted(hashes)
+
+
+def _clamp(min_lat, min_lng, max_lat, max_lng):
+    return max(min_lat, -90.0), max(min_lng, -180.0), min(max_lat, 90.0), min(max_lng, 180.0)
+
+
+def covering_prefixes(min_lat, min_lng, max_lat, max_lng, max_cells=32):
+    """Geohash prefixes whose cells together cover a bounding box.
+
+    Uses the longest prefix length that needs at most `max_cells` cells, so
+    each prefix becomes one index range scan and few candidates fall
+    outside the box. Boxes crossing the antimeridian aren't supported.
+    """
+    for precision in range(PRECISION, 0, -1):
+        if cell_count(min_lat, min_lng, max_lat, max_lng, precision) <= max_cells or precision == 1:
+            return cells(min_lat, min_lng, max_lat, max_lng, precision)
+
+
+def radius_bbox(lat, lng, radius_m):
+    """Bounding box (min_lat, min_lng, max_lat, max_lng) around a circle"""
+    dlat = radius_m / METERS_PER_DEGREE
+    dlng = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+def _successor(prefix):
+    # Smallest geohash string sorting after every hash starting with `prefix`
+    while prefix and prefix[-1] == BASE32[-1]:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + BASE32[BASE32.index(prefix[-1]) + 1]
+
+
+def prefix_ranges(prefixes):
+    """Half-open [start, end) string ranges matching any of `prefixes`.
+
+    Neighbouring prefixes are merged, so a box covering a run of cells that
+    are adjacent in geohash order costs one index range scan. end is None
+    when the range runs to the end of the keyspace.
+    """
+    ranges = []
+    for prefix in sorted(prefixes):
+        end = _successor(prefix)
+        if ranges and (ranges[-1][1] is None or ranges[-1][1] >= prefix):
+            if ranges[-1][1] is not None:
+                ranges[-1][1] = end
+        else:
+            ranges.append([prefix, end])
+    return [tuple(r) for r in ranges]
@@ -0,0 +1,96 @@
+import hashlib
+from collections import namedtuple
+from datetime import datetime, timezone
+from flask import request, make_response
+from sqlalchemy import func
+from models import db, Parcel, Location
+
+# Everything a parcel representation depends on: the row itself changes
+# updated_at, while timeline appends only show up as a new Location.id
+ParcelVersion = namedtuple('ParcelVersion', ['id', 'updated_at', 'last_location_id', 'last_location_at'])
+
+
+def version_query(query):
+    """Run one cheap metadata query returning a ParcelVersion per parcel of `query`.
+
+    Only parcel ids/updated_at and the newest timeline row per parcel are
+    read, which the (parcel_id, timestamp) index answers without touching the
+    wide columns. Works on limited (paginated) queries and keeps their order.
+    """
+    parcels = query.with_entities(Parcel.id, Parcel.updated_at, Parcel.created_at).subquery()
+    rows = (db.session.query(parcels.c.id, parcels.c.updated_at,
+                             func.max(Location.id), func.max(Location.timestamp))
+            .outerjoin(Location, Location.parcel_id == parcels.c.id)
+            .group_by(parcels.c.id, parcels.c.updated_at, parcels.c.created_at)
+            .order_by(parcels.c.created_at.desc(), parcels.c.id.desc())
+            .all())
+    return [ParcelVersion(*row) for row in rows]
+
+
+def version_from_parcel(parcel, fields):
+    """ParcelVersion of a loaded parcel; the timeline is only read if serialized"""
+    locations = parcel.locations if 'timeline' in fields else []
+    return ParcelVersion(
+        parcel.id,
+        parcel.updated_at,
+        max((location.id for location in locations), default=None),
+        max((location.timestamp for location in locations), default=None)
+    )
+
+
+def version_from_dict(data):
+    """ParcelVersion of a full Parcel.to_dict(), e.g. a cached tracking response"""
+    timeline = data['timeline']
+    return ParcelVersion(
+        data['id'],
+        datetime.fromisoformat(data['updatedAt']),
+        max((location['id'] for location in timeline), default=None),
+        max((datetime.fromisoformat(location['timestamp']) for location in timeline), default=None)
+    )
+
+
+def validators(versions, fields, has_more=False, variant=''):
+    """Strong ETag and Last-Modified for a representation of `versions`.
+
+    The ETag also covers the requested fields, since every projection is a
+    different representation of the same parcels, any other option that
+    changes the body (`variant`), and for list pages whether a next page
+    exists.
+    """
+    include_timeline = 'timeline' in fields
+    digest = hashlib.sha1(f'{",".join(fields)}|{variant}|{has_more}'.encode())
+    last_modified = None
+    for version in versions:
+        digest.update(f'|{version.id}:{version.updated_at.isoformat()}'.encode())
+        changed = version.updated_at
+        if include_timeline:
+            digest.update(f':{version.last_location_id}'.encode())
+            if version.last_location_at:
+                changed = max(changed, version.last_location_at)
+        last_modified = changed if last_modified is None else max(last_modified, changed)
+    return digest.hexdigest(), last_modified
+
+
+def is_conditional():
+    return bool(request.if_none_match) or request.if_modified_since is not None
+
+
+def is_not_modified(etag, last_modified):
+    """Evaluate If-None-Match, falling back to If-Modified-Since"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def with_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return response
+
+
+def not_modified(etag, last_modified):
+    return with_validators(make_response('', 304), etag, last_modified)
@@ -0,0 +1,216 @@
+import atexit
+import json
+import threading
+import uuid
+from datetime import datetime
+from flask import current_app
+from models import db
+from utils.cache import invalidate_tracking, redis
+from utils.locations import apply_location_pings
+from utils.eta import refresh_etas
+
+_start_lock = threading.Lock()
+
+
+class MemoryLocationBuffer:
+    """Newest buffered ping per parcel, private to this worker process"""
+
+    def __init__(self):
+        self._pings = {}
+        self._lock = threading.Lock()
+
+    def put(self, pings):
+        """Keep the newest of `pings` per parcel, returning the buffer size"""
+        with self._lock:
+            for ping in pings:
+                current = self._pings.get(ping['parcel_id'])
+                if current is None or ping['ts'] >= current['ts']:
+                    self._pings[ping['parcel_id']] = ping
+            return len(self._pings)
+
+    def get(self, parcel_id):
+        with self._lock:
+            return self._pings.get(parcel_id)
+
+    def drain(self):
+        with self._lock:
+            pings, self._pings = self._pings, {}
+        return list(pings.values())
+
+
+class RedisLocationBuffer:
+    """Same interface as MemoryLocationBuffer, shared by all workers via a Redis hash.
+
+    Like the in-memory buffer the newest ping per parcel (by `ts`) wins,
+    also across batches and when a failed flush puts its pings back.
+    """
+
+    # Fields come in (parcel id, ping JSON, ts) triples; ISO timestamps
+    # compare as strings
+    _PUT_NEWEST = """
+    for i = 1, #ARGV, 3 do
+        local current = redis.call('HGET', KEYS[1], ARGV[i])
+        if not current or cjson.decode(current)['ts'] <= ARGV[i + 2] then
+            redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+        end
+    end
+    return redis.call('HLEN', KEYS[1])
+    """
+
+    def __init__(self, client, key='deliveroo:location_buffer'):
+        self.client = client
+        self.key = key
+        self._put_newest = client.register_script(self._PUT_NEWEST)
+
+    def put(self, pings):
+        newest = MemoryLocationBuffer()
+        newest.put(pings)
+        args = []
+        for ping in newest.drain():
+            args.extend((ping['parcel_id'], json.dumps(ping), ping['ts']))
+        return self._put_newest(keys=[self.key], args=args)
+
+    def get(self, parcel_id):
+        raw = self.client.hget(self.key, parcel_id)
+        return None if raw is None else json.loads(raw)
+
+    def drain(self):
+        # RENAME is atomic and pings arriving meanwhile start a new hash; the
+        # key is unique to this drain so overlapping flushers (one per
+        # worker) never overwrite each other's batch
+        draining = f'{self.key}:draining:{uuid.uuid4().hex}'
+        try:
+            self.client.rename(self.key, draining)
+        except redis.ResponseError:  # nothing buffered
+            return []
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hgetall(draining)
+        pipe.delete(draining)
+        raw, _ = pipe.execute()
+        return [json.loads(value) for value in raw.values()]
+
+
+def location_buffer():
+    """Return the app's location buffer, on the CACHE_BACKEND of the app"""
+    buffer = current_app.extensions.get('deliveroo_location_buffer')
+    if buffer is None:
+        if current_app.config['CACHE_BACKEND'] == 'redis':
+            if redis is None:
+                raise RuntimeError("CACHE_BACKEND is 'redis' but the redis package is not installed")
+            buffer = RedisLocationBuffer(redis.Redis.from_url(current_app.config['REDIS_URL']))
+        else:
+            buffer = MemoryLocationBuffer()
+        current_app.extensions['deliveroo_location_buffer'] = buffer
+    return buffer
+
+
+def buffer_location_pings(pings):
+    """Hold pings for write-behind instead of writing them now.
+
+    Only the newest ping per parcel is kept until the next flush, so the
+    timeline gets at most one row per parcel per LOCATION_FLUSH_INTERVAL.
+    A full buffer (LOCATION_FLUSH_BATCH_SIZE parcels) is flushed early.
+    """
+    received_at = datetime.utcnow().isoformat()
+    size = location_buffer().put([{
+        'parcel_id': ping['parcel_id'],
+        'lat': ping['lat'],
+        'lng': ping['lng'],
+        'ts': ping['ts'].isoformat(),
+        'received_at': received_at
+    } for ping in pings])
+    flusher = current_app.extensions.get('deliveroo_location_flusher')
+    if flusher and size >= current_app.config['LOCATION_FLUSH_BATCH_SIZE']:
+        flusher.wake()
+
+
+def buffered_position(parcel_id):
+    """Newest unflushed ping for a parcel, or None (always None without write-behind)"""
+    if not current_app.config['LOCATION_WRITE_BEHIND']:
+        return None
+    ping = location_buffer().get(parcel_id)
+    if ping is None:
+        return None
+    return {'lat': ping['lat'], 'lng': ping['lng'], 'received_at': datetime.fromisoformat(ping['received_at'])}
+
+
+def flush_location_buffer():
+    """Write every buffered ping in one transaction, returning how many were written.
+
+    If the write fails the pings go back into the buffer, merged by `ts` so
+    a newer ping for the same parcel that arrived meanwhile is kept.
+    """
+    buffer = location_buffer()
+    buffered = buffer.drain()
+    if not buffered:
+        return 0
+    pings = [{**ping, 'ts': datetime.fromisoformat(ping['ts'])} for ping in buffered]
+    try:
+        applied, tracking_numbers = apply_location_pings(pings)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        buffer.put(buffered)
+        raise
+    invalidate_tracking(*tracking_numbers)
+    refresh_etas(*{ping['parcel_id'] for ping in applied})
+    return len(applied)
+
+
+class LocationFlusher:
+    """Daemon thread flushing the buffer every interval, or sooner when woken"""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='location-flusher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    flush_location_buffer()
+                except Exception as e:
+                    self.app.logger.error(f'Location flush failed: {e}')
+            # The final flush above runs after stop() too
+            if self._stop.is_set():
+                return
+
+
+def start_location_flusher(app):
+    """Start the flusher once per process when write-behind is on"""
+    if not app.config['LOCATION_WRITE_BEHIND'] or app.testing:
+        return None
+    with _start_lock:
+        if 'deliveroo_location_flusher' in app.extensions:
+            return None
+        flusher = app.extensions['deliveroo_location_flusher'] = LocationFlusher(
+            app, app.config['LOCATION_FLUSH_INTERVAL']
+        )
+        flusher.start()
+        # Don't lose the in-memory buffer on a clean shutdown
+        atexit.register(flusher.stop)
+    return flusher
+
+
+def init_location_buffer(app):
+    """Start the flusher on the first request, like the outbox workers"""
+    @app.before_request
+    def ensure_location_flusher():
+        if 'deliveroo_location_flusher' not in app.extensions:
+            start_location_flusher(app)
@@ -0,0 +1,61 @@
+from datetime import datetime
+from sqlalchemy import select, insert, update, func, case
+from models import db, Parcel, Location
+from utils import geohash
+from utils.clusters import record_cluster_changes
+
+
+def apply_location_pings(pings):
+    """Write a batch of GPS pings in the caller's transaction.
+
+    `pings` are dicts with parcel_id, lat, lng and ts (naive UTC). Every ping
+    becomes a timeline row via one executemany INSERT, and each parcel's
+    current position moves to its newest ping with one executemany UPDATE,
+    unless the timeline already has a newer position (late, out of order
+    pings). One query up front resolves the parcels.
+
+    Returns (applied pings, tracking numbers of the parcels touched); pings
+    for unknown parcels are left out of the first.
+    """
+    parcel_ids = {ping['parcel_id'] for ping in pings}
+    rows = db.session.execute(
+        select(Parcel.id, Parcel.status, Parcel.tracking_number,
+               func.max(case((Location.latitude.isnot(None), Location.timestamp))))
+        .outerjoin(Location, Location.parcel_id == Parcel.id)
+        .where(Parcel.id.in_(parcel_ids))
+        .group_by(Parcel.id, Parcel.status, Parcel.tracking_number)
+    ).all()
+    parcels = {row[0]: row for row in rows}
+
+    applied = [ping for ping in pings if ping['parcel_id'] in parcels]
+    if not applied:
+        return [], []
+
+    db.session.execute(insert(Location), [{
+        'status': parcels[ping['parcel_id']].status,
+        'location_description': f"Lat: {ping['lat']}, Lng: {ping['lng']}",
+        'latitude': ping['lat'],
+        'longitude': ping['lng'],
+        'timestamp': ping['ts'],
+        'parcel_id': ping['parcel_id']
+    } for ping in applied])
+
+    latest = {}
+    for ping in applied:
+        current = latest.get(ping['parcel_id'])
+        if current is None or ping['ts'] >= current['ts']:
+            latest[ping['parcel_id']] = ping
+
+    # Bulk UPDATE by primary key doesn't run column onupdate hooks or mapper
+    # events, so updated_at (which the ETags depend on) and geohash are set here
+    now = datetime.utcnow()
+    moves = [{'id': parcel_id, 'current_lat': ping['lat'], 'current_lng': ping['lng'],
+              'geohash': geohash.encode(ping['lat'], ping['lng']), 'updated_at': now}
+             for parcel_id, ping in latest.items()
+             if parcels[parcel_id][3] is None or ping['ts'] >= parcels[parcel_id][3]]
+    if moves:
+        db.session.execute(update(Parcel), moves)
+        record_cluster_changes(db.session, {move['id']: (move['current_lat'], move['current_lng'],
+                                                         parcels[move['id']].status) for move in moves})
+
+    return applied, [parcels[parcel_id].tracking_number for parcel_id in latest]
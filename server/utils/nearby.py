@@ -0,0 +1,145 @@
+import heapq
+from collections import namedtuple
+import numpy as np
+from flask import current_app
+from sqlalchemy import select, update, and_, or_, case, func
+from models import db, Parcel
+from models.parcel import parcel_geohash
+from utils import geohash
+from utils.trajectory import haversine_m
+
+# An area is a circle (center and radius in meters) or a bounding box
+Area = namedtuple('Area', ['min_lat', 'min_lng', 'max_lat', 'max_lng', 'center', 'radius_m'])
+
+MAX_RADIUS_M = 200000
+
+
+class InvalidAreaRequest(ValueError):
+    """Raised when the area query params can't be used"""
+
+
+def _number(args, name):
+    try:
+        return float(args[name])
+    except (TypeError, ValueError):
+        raise InvalidAreaRequest(f'{name} must be a number')
+
+
+def parse_area(args):
+    """Read ?lat=&lng=&radius=<meters> or ?bbox=minLng,minLat,maxLng,maxLat"""
+    if args.get('bbox'):
+        try:
+            min_lng, min_lat, max_lng, max_lat = (float(value) for value in args['bbox'].split(','))
+        except ValueError:
+            raise InvalidAreaRequest('bbox must be minLng,minLat,maxLng,maxLat')
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= max_lng <= 180):
+            raise InvalidAreaRequest('bbox must be minLng,minLat,maxLng,maxLat within valid coordinates')
+        return Area(min_lat, min_lng, max_lat, max_lng, None, None)
+
+    if 'lat' not in args or 'lng' not in args:
+        raise InvalidAreaRequest('Either lat, lng and radius or bbox is required')
+    lat, lng, radius_m = _number(args, 'lat'), _number(args, 'lng'), _number(args, 'radius')
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise InvalidAreaRequest('lat/lng out of range')
+    if not 0 < radius_m <= MAX_RADIUS_M:
+        raise InvalidAreaRequest(f'radius must be between 0 and {MAX_RADIUS_M} meters')
+    return Area(*geohash.radius_bbox(lat, lng, radius_m), (lat, lng), radius_m)
+
+
+def geohash_filter(area):
+    """WHERE clause selecting the parcels whose geohash cell overlaps the area"""
+    prefixes = geohash.covering_prefixes(area.min_lat, area.min_lng, area.max_lat, area.max_lng)
+    return or_(*(
+        and_(Parcel.geohash >= start, Parcel.geohash < end) if end else Parcel.geohash >= start
+        for start, end in geohash.prefix_ranges(prefixes)
+    ))
+
+
+def _position():
+    # A parcel is where it was last seen, or at its pickup point before that
+    seen = and_(Parcel.current_lat.is_not(None), Parcel.current_lng.is_not(None))
+    return (case((seen, Parcel.current_lat), else_=Parcel.pickup_lat),
+            case((seen, Parcel.current_lng), else_=Parcel.pickup_lng))
+
+
+def parcels_in_area(area, status=None, limit=20):
+    """The first `limit` parcels inside `area` and how many there are.
+
+    Returns ([(parcel id, distance in meters or None)], count). The geohash
+    index narrows the table down to a few prefix ranges and the area's
+    bounding box is checked against the parcels' positions in SQL, so boxes
+    are counted and paged (by id) by the database. For circles those
+    candidates are streamed a batch at a time through an exact haversine
+    check keeping only the nearest `limit`; more than NEARBY_MAX_CANDIDATES
+    of them is an InvalidAreaRequest rather than a scan of half the table.
+    """
+    lat, lng = _position()
+    conditions = [geohash_filter(area), lat.between(area.min_lat, area.max_lat),
+                  lng.between(area.min_lng, area.max_lng)]
+    if status:
+        conditions.append(Parcel.status == status)
+
+    if area.radius_m is None:
+        count = db.session.scalar(select(func.count()).select_from(Parcel).where(*conditions))
+        page = db.session.scalars(select(Parcel.id).where(*conditions).order_by(Parcel.id).limit(limit))
+        return [(parcel_id, None) for parcel_id in page], count
+
+    max_candidates = current_app.config['NEARBY_MAX_CANDIDATES']
+    rows = db.session.execute(
+        select(Parcel.id, lat, lng).where(*conditions).limit(max_candidates + 1)
+        .execution_options(yield_per=1000)
+    )
+    # Max-heap of the nearest (distance, id) so far, negated for heapq
+    count, candidates, nearest = 0, 0, []
+    for chunk in rows.partitions():
+        candidates += len(chunk)
+        if candidates > max_candidates:
+            rows.close()
+            raise InvalidAreaRequest(f'More than {max_candidates} parcels around that point, '
+                                     'use a smaller radius or a status')
+        ids, lats, lngs = zip(*chunk)
+        distances = haversine_m(area.center[0], area.center[1], np.array(lats, dtype=float),
+                                np.array(lngs, dtype=float))
+        for parcel_id, distance in zip(ids, distances.tolist()):
+            if distance > area.radius_m:
+                continue
+            count += 1
+            item = (-distance, -parcel_id)
+            if len(nearest) < limit:
+                heapq.heappush(nearest, item)
+            elif item > nearest[0]:
+                heapq.heapreplace(nearest, item)
+    return [(-parcel_id, -distance) for distance, parcel_id in sorted(nearest, reverse=True)], count
+
+
+def unindexed_count(status=None):
+    """Parcels that proximity searches can't see yet: no geohash until
+    `flask geo backfill` has run over rows older than the column"""
+    query = select(func.count()).select_from(Parcel).where(Parcel.geohash.is_(None))
+    if status:
+        query = query.where(Parcel.status == status)
+    return db.session.scalar(query)
+
+
+def backfill_geohashes(batch_size=1000, recompute=False):
+    """Set the geohash of parcels missing one (or of every parcel), returning how many.
+
+    Walks the table by id a batch at a time, one executemany UPDATE and
+    commit per batch. updated_at is left alone since no API field changes.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        query = (select(Parcel.id, Parcel.current_lat, Parcel.current_lng, Parcel.pickup_lat, Parcel.pickup_lng)
+                 .where(Parcel.id > last_id).order_by(Parcel.id).limit(batch_size))
+        if not recompute:
+            query = query.where(Parcel.geohash.is_(None))
+        rows = db.session.execute(query).all()
+        if not rows:
+            return updated
+        db.session.execute(update(Parcel), [
+            {'id': row.id, 'geohash': parcel_geohash(*row[1:])} for row in rows
+        ])
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
@@ -0,0 +1,136 @@
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db, EmailOutbox
+from utils.email import mail, build_message
+
+_start_lock = threading.Lock()
+
+
+def _due_rows(batch_size):
+    # SKIP LOCKED lets several workers drain concurrently without sending the
+    # same row twice; databases without row locks (SQLite) ignore it
+    return (EmailOutbox.query
+            .filter(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= datetime.utcnow())
+            .order_by(EmailOutbox.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all())
+
+
+def _record_failure(row, error, now):
+    config = current_app.config
+    row.attempts = (row.attempts or 0) + 1
+    row.last_error = str(error)
+    if row.attempts >= config['EMAIL_OUTBOX_MAX_ATTEMPTS']:
+        row.status = 'dead'
+        current_app.logger.error(f'Email {row.id} to {row.recipient} dead-lettered: {error}')
+    else:
+        delay = config['EMAIL_OUTBOX_RETRY_BACKOFF'] * 2 ** (row.attempts - 1)
+        row.next_attempt_at = now + timedelta(seconds=delay)
+
+
+def drain_outbox(batch_size=None):
+    """Send one batch of due outbox emails over a single SMTP connection.
+
+    Failed rows are retried with exponential backoff and dead-lettered after
+    EMAIL_OUTBOX_MAX_ATTEMPTS. Returns the number of rows processed.
+    """
+    rows = _due_rows(batch_size or current_app.config['EMAIL_OUTBOX_BATCH_SIZE'])
+    if not rows:
+        db.session.commit()
+        return 0
+
+    now = datetime.utcnow()
+    # Render the whole batch before holding an SMTP connection open; a row
+    # whose template fails is retried like a failed send
+    messages = []
+    for row in rows:
+        try:
+            messages.append((row, build_message(row)))
+        except Exception as e:
+            _record_failure(row, e, now)
+
+    attempted = set()
+    try:
+        with mail.connect() as connection:
+            for row, message in messages:
+                attempted.add(row.id)
+                try:
+                    connection.send(message)
+                    row.status = 'sent'
+                    row.sent_at = now
+                except Exception as e:
+                    _record_failure(row, e, now)
+    except Exception as e:
+        # Connecting (or the connection dropping) failed the rest of the
+        # batch; rows already sent or failed above are settled
+        for row, message in messages:
+            if row.id not in attempted:
+                _record_failure(row, e, now)
+
+    db.session.commit()
+    return len(rows)
+
+
+class OutboxWorkerPool:
+    """Fixed number of daemon threads draining the outbox in a loop"""
+
+    def __init__(self, app, workers, poll_interval):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'email-outbox-{n}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    processed = drain_outbox()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f'Email outbox worker failed: {e}')
+                    processed = 0
+            # Keep draining while there is a backlog, otherwise poll
+            if not processed:
+                self._stop.wait(self.poll_interval)
+
+
+def start_outbox_workers(app):
+    """Start the in-process worker pool once per process, unless disabled"""
+    workers = app.config['EMAIL_OUTBOX_WORKERS']
+    if workers <= 0 or app.testing:
+        return None
+    with _start_lock:
+        if 'deliveroo_outbox_pool' in app.extensions:
+            return None
+        pool = app.extensions['deliveroo_outbox_pool'] = OutboxWorkerPool(
+            app, workers, app.config['EMAIL_OUTBOX_POLL_INTERVAL']
+        )
+        pool.start()
+    return pool
+
+
+def init_outbox(app):
+    """Start the worker pool on the first request each worker process serves.
+
+    Deferred to the first request so it runs after the final config is
+    applied and after gunicorn has forked. Set EMAIL_OUTBOX_WORKERS=0 to run
+    `flask outbox work` as a separate process instead.
+    """
+    @app.before_request
+    def ensure_outbox_workers():
+        if 'deliveroo_outbox_pool' not in app.extensions:
+            start_outbox_workers(app)
@@ -0,0 +1,64 @@
+import base64
+import binascii
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import tuple_
+
+
+class InvalidPageRequest(ValueError):
+    """Raised when the limit or cursor query params can't be used"""
+
+
+def encode_cursor(created_at, row_id):
+    """Encode the (created_at, id) position of the last row on a page"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor back into (created_at, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, row_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidPageRequest('Invalid cursor')
+
+
+def parse_page_args(args):
+    """Read limit/cursor from the query string, clamped to MAX_PAGE_SIZE"""
+    default_size = current_app.config['DEFAULT_PAGE_SIZE']
+    max_size = current_app.config['MAX_PAGE_SIZE']
+
+    try:
+        limit = int(args.get('limit', default_size))
+    except (TypeError, ValueError):
+        raise InvalidPageRequest('limit must be an integer')
+    if limit < 1:
+        raise InvalidPageRequest('limit must be at least 1')
+
+    cursor = args.get('cursor')
+    return min(limit, max_size), decode_cursor(cursor) if cursor else None
+
+
+def keyset_page_query(query, model, limit, cursor=None):
+    """Order `query` newest first and seek past `cursor`, fetching limit + 1 rows.
+
+    The page is seeked with a row-value comparison on (created_at, id) so the
+    database walks the composite index instead of counting past an OFFSET.
+    """
+    if cursor:
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(*cursor))
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+
+def paginate_keyset(query, model, limit, cursor=None):
+    """Return one page of `query` ordered newest first, plus the next cursor"""
+    rows = keyset_page_query(query, model, limit, cursor).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
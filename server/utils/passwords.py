@@ -0,0 +1,61 @@
+import threading
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when no hashing slot frees up within PASSWORD_HASH_QUEUE_TIMEOUT"""
+
+
+class PasswordHasher:
+    """Caps how many password hashes run at once per process.
+
+    At most `max_workers` hashes run at a time, on the calling threads;
+    callers beyond that wait up to `queue_timeout` seconds for a slot and
+    then get PasswordHasherBusy, so a login burst is shed instead of pinning
+    every CPU while parcel requests queue behind it. hashlib's KDFs release
+    the GIL, so the admitted hashes run in parallel.
+    """
+
+    def __init__(self, method, salt_length, max_workers=2, queue_timeout=5.0):
+        self.method = method
+        self.salt_length = salt_length
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_workers)
+        # werkzeug fills in defaults (e.g. 'pbkdf2' -> 'pbkdf2:sha256:600000'),
+        # stored hashes are compared against the expanded form
+        self.stored_method = generate_password_hash('', method, salt_length=1).split('$', 1)[0]
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy('Too many password operations in progress, try again shortly')
+        try:
+            return fn(*args)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if the hash was made with other parameters than the configured ones"""
+        method, _, rest = password_hash.partition('$')
+        salt = rest.partition('$')[0]
+        return method != self.stored_method or len(salt) != self.salt_length
+
+
+def get_password_hasher():
+    """Return the app's PasswordHasher, built from config on first use"""
+    hasher = current_app.extensions.get('deliveroo_password_hasher')
+    if hasher is None:
+        config = current_app.config
+        hasher = current_app.extensions['deliveroo_password_hasher'] = PasswordHasher(
+            method=config['PASSWORD_HASH_METHOD'],
+            salt_length=config['PASSWORD_SALT_LENGTH'],
+            max_workers=config['PASSWORD_HASH_WORKERS'],
+            queue_timeout=config['PASSWORD_HASH_QUEUE_TIMEOUT']
+        )
+    return hasher
@@ -0,0 +1,44 @@
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def encode(coords, precision=5):
+    """Google encoded polyline of [(lat, lng), ...]"""
+    factor = 10 ** precision
+    output = []
+    prev_lat = prev_lng = 0
+    for lat, lng in coords:
+        lat, lng = round(lat * factor), round(lng * factor)
+        output.append(_encode_value(lat - prev_lat))
+        output.append(_encode_value(lng - prev_lng))
+        prev_lat, prev_lng = lat, lng
+    return ''.join(output)
+
+
+def decode(polyline, precision=5):
+    """Inverse of encode, returning [(lat, lng), ...]"""
+    factor = 10 ** precision
+    coords = []
+    index = lat = lng = 0
+    while index < len(polyline):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(polyline[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        coords.append((lat / factor, lng / factor))
+    return coords
@@ -0,0 +1,155 @@
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+from flask import current_app
+from utils.trajectory import haversine_m
+
+# Weight bands: (upper limit in kg, inclusive; rate in Ksh per kg)
+WEIGHT_BANDS = ((1, 150), (5, 120), (20, 90), (math.inf, 60))
+# Flat fees in Ksh added to every parcel
+FEES = {'base': 100, 'insurance': 50, 'handling': 75, 'fuel': 30}
+FEES_TOTAL = sum(FEES.values())
+
+_BAND_LIMITS = np.array([limit for limit, _ in WEIGHT_BANDS[:-1]], dtype=float)
+_BAND_RATES = np.array([rate for _, rate in WEIGHT_BANDS], dtype=float)
+
+
+class InvalidQuoteRequest(ValueError):
+    """Raised when a shipment can't be priced"""
+
+
+class DistanceMemo:
+    """LRU of route distances in km keyed by rounded (pickup, destination).
+
+    Merchants quote the same few depots to the same areas over and over,
+    and a road-distance provider would sit behind route_distances_km(), so
+    each pair is only worked out once per worker.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        with self._lock:
+            found = {}
+            for key in keys:
+                value = self._data.get(key)
+                if value is not None:
+                    self._data.move_to_end(key)
+                    found[key] = value
+            return found
+
+    def set_many(self, items):
+        with self._lock:
+            self._data.update(items)
+            for key, _ in items:
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+def distance_memo():
+    memo = current_app.extensions.get('deliveroo_distance_memo')
+    if memo is None:
+        memo = current_app.extensions['deliveroo_distance_memo'] = DistanceMemo(
+            current_app.config['PRICING_DISTANCE_MEMO_SIZE']
+        )
+    return memo
+
+
+def route_distances_km(coords):
+    """Route distance in km for an (n, 4) array of pickup lat/lng, destination lat/lng.
+
+    Coordinates are rounded to 5 decimals (about a meter) so repeated pairs
+    in a batch are computed once via np.unique, and pairs seen before come
+    from the per-worker memo. The distance is great-circle times
+    PRICING_ROUTE_FACTOR.
+    """
+    rounded = np.round(np.asarray(coords, dtype=float), 5)
+    unique, inverse = np.unique(rounded, axis=0, return_inverse=True)
+    keys = [tuple(row) for row in unique.tolist()]
+
+    memo = distance_memo()
+    known = memo.get_many(keys)
+    distances = np.array([known.get(key, np.nan) for key in keys], dtype=float)
+    missing = np.isnan(distances)
+    if missing.any():
+        todo = unique[missing]
+        distances[missing] = (haversine_m(todo[:, 0], todo[:, 1], todo[:, 2], todo[:, 3]) / 1000
+                              * current_app.config['PRICING_ROUTE_FACTOR'])
+        memo.set_many([(key, float(distance)) for key, distance, new in zip(keys, distances, missing) if new])
+    return distances[inverse.reshape(-1)]
+
+
+def quote(weights, coords):
+    """Price many shipments at once.
+
+    `weights` are in kg and `coords` an (n, 4) array as for
+    route_distances_km(). The price is the weight band rate times the
+    weight, plus PRICING_PER_KM for every km past PRICING_INCLUDED_KM, plus
+    the flat FEES. Returns a dict of arrays: price, rate, weightCharge,
+    distanceKm, distanceCharge.
+    """
+    config = current_app.config
+    weights = np.asarray(weights, dtype=float)
+    distance_km = route_distances_km(coords) if len(weights) else np.zeros(0)
+    rates = _BAND_RATES[np.searchsorted(_BAND_LIMITS, weights, side='left')]
+    weight_charge = weights * rates
+    distance_charge = np.maximum(distance_km - config['PRICING_INCLUDED_KM'], 0) * config['PRICING_PER_KM']
+    return {
+        'price': np.round(weight_charge + distance_charge + FEES_TOTAL, 2),
+        'rate': rates,
+        'weightCharge': np.round(weight_charge, 2),
+        'distanceKm': np.round(distance_km, 2),
+        'distanceCharge': np.round(distance_charge, 2),
+    }
+
+
+def quote_price(weight, pickup, destination):
+    """Price of one shipment; pickup and destination are {'lat', 'lng'} dicts"""
+    return float(quote([weight], [[pickup['lat'], pickup['lng'], destination['lat'], destination['lng']]])['price'][0])
+
+
+def _coordinate(item, name, errors):
+    value = item.get(name)
+    try:
+        lat, lng = float(value['lat']), float(value['lng'])
+    except (TypeError, KeyError, ValueError):
+        errors[name] = ['Expected {"lat": number, "lng": number}']
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        errors[name] = ['Coordinates out of range']
+        return None
+    return lat, lng
+
+
+def parse_quote_items(items):
+    """Split quote request items into (weights, coords, indexes) and [rejected].
+
+    Plain checks rather than a marshmallow schema per item, which would
+    cost more than the pricing itself for a few thousand rows.
+    """
+    weights, coords, indexes, rejected = [], [], [], []
+    for index, item in enumerate(items):
+        errors = {}
+        if not isinstance(item, dict):
+            rejected.append({'index': index, 'errors': {'_schema': ['Expected an object']}})
+            continue
+        try:
+            weight = float(item.get('weight'))
+            if not 0.1 <= weight <= 1000:
+                errors['weight'] = ['Must be between 0.1 and 1000 kg']
+        except (TypeError, ValueError):
+            errors['weight'] = ['Expected a number']
+        pickup = _coordinate(item, 'pickupCoords', errors)
+        destination = _coordinate(item, 'destinationCoords', errors)
+        if errors:
+            rejected.append({'index': index, 'errors': errors})
+            continue
+        weights.append(weight)
+        coords.append((*pickup, *destination))
+        indexes.append(index)
+    return weights, coords, indexes, rejected
@@ -0,0 +1,48 @@
+from sqlalchemy.orm import load_only, selectinload
+from models import Parcel
+from models.parcel import PARCEL_FIELDS
+
+# Named projections accepted by ?fields=<name>
+PROJECTIONS = {
+    'full': tuple(PARCEL_FIELDS),
+    'summary': tuple(name for name in PARCEL_FIELDS if name != 'timeline'),
+    'tracking': ('id', 'trackingNumber', 'status', 'pickupCoords', 'destinationCoords',
+                 'currentLocation', 'updatedAt', 'timeline'),
+}
+
+
+class InvalidFieldsRequest(ValueError):
+    """Raised when ?fields= names an unknown field or projection"""
+
+
+def parse_fields(value, default='full'):
+    """Resolve ?fields= (a projection name or comma separated field names)"""
+    value = (value or default).strip()
+    if value in PROJECTIONS:
+        return PROJECTIONS[value]
+
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in PARCEL_FIELDS]
+    if not fields or unknown:
+        raise InvalidFieldsRequest(
+            f'Unknown fields: {", ".join(unknown) or value}. '
+            f'Use one of {", ".join(PROJECTIONS)} or a list of: {", ".join(PARCEL_FIELDS)}'
+        )
+    return fields
+
+
+def project_query(query, fields):
+    """Restrict a Parcel query to the columns `fields` needs.
+
+    id and created_at are always loaded because keyset pagination orders on
+    them, and updated_at because the ETag is derived from it. The timeline is
+    batch loaded only when it was asked for.
+    """
+    columns = {'id', 'created_at', 'updated_at'}
+    for name in fields:
+        columns.update(PARCEL_FIELDS[name][0])
+
+    query = query.options(load_only(*(getattr(Parcel, column) for column in sorted(columns))))
+    if 'timeline' in fields:
+        query = query.options(selectinload(Parcel.locations))
+    return query
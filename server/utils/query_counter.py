@@ -0,0 +1,31 @@
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_query_count = g.get('sql_query_count', 0) + 1
+
+
+def get_query_count():
+    """Number of SQL statements the current request has executed so far"""
+    return g.get('sql_query_count', 0)
+
+
+def init_query_counter(app):
+    """Count SQL statements per request, exposed as X-Query-Count when enabled"""
+    if not event.contains(Engine, 'before_cursor_execute', _count_query):
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+
+    @app.before_request
+    def reset_query_count():
+        g.sql_query_count = 0
+
+    @app.after_request
+    def add_query_count_header(response):
+        if app.config.get('SQL_QUERY_COUNTER'):
+            response.headers[QUERY_COUNT_HEADER] = str(get_query_count())
+        return response
@@ -0,0 +1,107 @@
+import time
+from datetime import datetime
+from flask import current_app, has_app_context
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import event, inspect, select, delete
+from sqlalchemy.orm import Session
+from models import db, User, RoleRevocation
+from utils.cache import get_cache
+from utils.db import upsert
+
+
+def role_claims(user):
+    """Additional JWT claims for `user`, checked by the role decorators"""
+    return {'role': user.role}
+
+
+def _role_cache():
+    config = current_app.config
+    return get_cache('user_roles', maxsize=config['USER_ROLE_CACHE_SIZE'],
+                     ttl=config['USER_ROLE_CACHE_TTL'])
+
+
+def get_user_role(user_id):
+    """Role of a user from the short-TTL cache, read from the database on a miss"""
+    cache = _role_cache()
+    role = cache.get(str(user_id))
+    if role is None:
+        role = db.session.execute(db.select(User.role).filter_by(id=user_id)).scalar()
+        if role is not None:
+            cache.set(str(user_id), role)
+    return role
+
+
+def _revocations():
+    """{user_id: revoked_at} from role_revocations, this worker's copy.
+
+    The table only holds role changes younger than the token lifetime, so
+    it's read whole, at most once every USER_ROLE_REVOCATION_REFRESH
+    seconds per worker rather than once per request.
+    """
+    snapshot = current_app.extensions.get('deliveroo_role_revocations')
+    now = time.monotonic()
+    if snapshot is None or now >= snapshot[0]:
+        rows = db.session.execute(select(RoleRevocation.user_id, RoleRevocation.revoked_at)).all()
+        snapshot = (now + current_app.config['USER_ROLE_REVOCATION_REFRESH'], dict(rows))
+        current_app.extensions['deliveroo_role_revocations'] = snapshot
+    return snapshot[1]
+
+
+def current_user_role():
+    """Role of the user behind the current request's JWT, or None.
+
+    The role claim is trusted unless the user's role changed after the token
+    was issued. Role changes are recorded in role_revocations in the same
+    transaction; the worker making the change sees it at once, the others
+    within USER_ROLE_REVOCATION_REFRESH seconds (see _revocations). Revoked
+    tokens read the role from the database, tokens without the claim go
+    through get_user_role.
+    """
+    user_id = get_jwt_identity()
+    if user_id is None:
+        return None
+    claims = get_jwt()
+    revoked_at = _revocations().get(int(user_id))
+    if 'role' in claims and (revoked_at is None or datetime.utcfromtimestamp(claims['iat']) > revoked_at):
+        return claims['role']
+    if revoked_at is not None:
+        # Other workers' role caches may still hold the old role
+        return db.session.execute(select(User.role).filter_by(id=user_id)).scalar()
+    return get_user_role(user_id)
+
+
+def forget_user_role(user_id):
+    """Drop this worker's cached role for `user_id`, called after a role change commits"""
+    _role_cache().delete(str(user_id))
+    current_app.extensions.pop('deliveroo_role_revocations', None)
+
+
+def _record_revocation(connection, user_id):
+    now = datetime.utcnow()
+    statement = upsert(RoleRevocation).values(user_id=user_id, revoked_at=now)
+    connection.execute(statement.on_conflict_do_update(index_elements=['user_id'],
+                                                       set_={'revoked_at': now}))
+    # Tokens older than this have expired anyway
+    expired = now - current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    connection.execute(delete(RoleRevocation).where(RoleRevocation.revoked_at < expired))
+
+
+@event.listens_for(User, 'after_update')
+def _track_role_change(mapper, connection, user):
+    if inspect(user).attrs.role.history.has_changes():
+        _record_revocation(connection, user.id)
+        session = inspect(user).session
+        session.info.setdefault('role_changes', set()).add(user.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _revoke_changed_roles(session):
+    user_ids = session.info.pop('role_changes', None)
+    if user_ids and has_app_context():
+        for user_id in user_ids:
+            forget_user_role(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_role_changes(session):
+    session.info.pop('role_changes', None)
@@ -0,0 +1,243 @@
+import hashlib
+import time
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+from models import db, Parcel
+from utils.cache import TTLCache
+from utils.dispatch import ACTIVE_STATUSES
+from utils.trajectory import haversine_m
+
+
+class InvalidRouteRequest(ValueError):
+    """Raised when the route query params can't be used"""
+
+
+def parse_route_args(args):
+    """Read optional ?lat=&lng= (where the courier is now) and ?budgetMs=.
+
+    Returns (start, budget_seconds); start is None for an open start.
+    """
+    start = None
+    if 'lat' in args or 'lng' in args:
+        try:
+            start = (float(args['lat']), float(args['lng']))
+        except (KeyError, TypeError, ValueError):
+            raise InvalidRouteRequest('lat and lng must both be numbers')
+        if not (-90 <= start[0] <= 90 and -180 <= start[1] <= 180):
+            raise InvalidRouteRequest('lat/lng out of range')
+
+    config = current_app.config
+    budget_ms = config['ROUTE_TIME_BUDGET_MS']
+    if args.get('budgetMs'):
+        try:
+            budget_ms = int(args['budgetMs'])
+        except ValueError:
+            raise InvalidRouteRequest('budgetMs must be an integer')
+        if not 0 <= budget_ms <= config['ROUTE_MAX_TIME_BUDGET_MS']:
+            raise InvalidRouteRequest(f"budgetMs must be between 0 and {config['ROUTE_MAX_TIME_BUDGET_MS']}")
+    return start, budget_ms / 1000
+
+
+def _matrix_cache():
+    # Kept in-process whatever CACHE_BACKEND says, an n x n float array is
+    # cheaper to rebuild than to ship through Redis as JSON
+    cache = current_app.extensions.get('deliveroo_route_matrices')
+    if cache is None:
+        cache = current_app.extensions['deliveroo_route_matrices'] = TTLCache(
+            maxsize=current_app.config['ROUTE_MATRIX_CACHE_SIZE'],
+            ttl=current_app.config['ROUTE_MATRIX_CACHE_TTL']
+        )
+    return cache
+
+
+def _road_distances(lat1, lng1, lat2, lng2):
+    # Same detour factor as ETAs, both stand in for a road network
+    return haversine_m(lat1, lng1, lat2, lng2) * current_app.config['ETA_ROUTE_FACTOR']
+
+
+def distance_matrix(coords):
+    """(n, n) road distance estimates in meters between (lat, lng) points and
+    whether it came from the cache.
+
+    Keyed by the points rounded to ~1 m, so planning the same courier's
+    stops again (from wherever they are now) skips the work.
+    """
+    coords = np.round(np.asarray(coords, dtype=float).reshape(-1, 2), 5)
+    key = hashlib.sha1(coords.tobytes()).hexdigest()
+    cache = _matrix_cache()
+    matrix = cache.get(key)
+    if matrix is not None:
+        return matrix, True
+    lat, lng = coords[:, 0], coords[:, 1]
+    matrix = _road_distances(lat[:, None], lng[:, None], lat[None, :], lng[None, :])
+    matrix.setflags(write=False)
+    cache.set(key, matrix)
+    return matrix, False
+
+
+def nearest_neighbour(matrix, pickup_of, start=None):
+    """Stop order visiting the nearest stop that's allowed next.
+
+    pickup_of[i] is the node that must come before node i, or -1. Nodes
+    are the matrix rows; `start` (if given) is a node the route begins at
+    and is included first. Without one the route starts from the allowed
+    stop farthest from the rest, so it sweeps inwards.
+    """
+    n = len(matrix)
+    visited = np.zeros(n, dtype=bool)
+    ready = pickup_of < 0
+    dropoff_of = np.full(n, -1)
+    dropoff_of[pickup_of[pickup_of >= 0]] = np.flatnonzero(pickup_of >= 0)
+    if start is None:
+        current = int(np.argmax(np.where(ready, matrix.sum(axis=1), -np.inf)))
+    else:
+        current = start
+    route = []
+    while True:
+        route.append(current)
+        visited[current] = True
+        if dropoff_of[current] >= 0:
+            ready[dropoff_of[current]] = True
+        candidates = ready & ~visited
+        if not candidates.any():
+            return route
+        current = int(np.argmin(np.where(candidates, matrix[current], np.inf)))
+
+
+def two_opt(matrix, route, pickup_of, deadline, fixed_start=False):
+    """Improve an open route by reversing segments until no reversal helps
+    or time.perf_counter() passes `deadline`.
+
+    A reversal that would put a drop-off before its own pickup is never
+    made. The matrix is symmetric, so only the two edges at the ends of the
+    segment change. Returns (route, converged).
+    """
+    path = np.asarray(route)
+    n = len(path)
+    position = np.empty(n, dtype=int)
+    first = 1 if fixed_start else 0
+    improved = True
+    position[path] = np.arange(n)
+    before = np.where(pickup_of[path] >= 0, position[np.maximum(pickup_of[path], 0)], -1)
+    while improved:
+        improved = False
+        for i in range(first, n - 1):
+            if time.perf_counter() > deadline:
+                return path.tolist(), False
+            # Reversing i..j is only allowed up to the first stop whose
+            # pickup is at i or later
+            blocked = np.flatnonzero(before[i + 1:] >= i)
+            last = i + (blocked[0] if len(blocked) else n - 1 - i)
+            if last <= i:
+                continue
+            b = path[i]
+            ends = path[i + 1:last + 1]
+            delta = np.zeros(len(ends))
+            if i > 0:
+                a = path[i - 1]
+                delta += matrix[a, ends] - matrix[a, b]
+            following = path[i + 2:last + 2]
+            delta[:len(following)] += matrix[b, following] - matrix[ends[:len(following)], following]
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-6:
+                j = i + 1 + best
+                path[i:j + 1] = path[i:j + 1][::-1].copy()
+                position[path[i:j + 1]] = np.arange(i, j + 1)
+                before = np.where(pickup_of[path] >= 0, position[np.maximum(pickup_of[path], 0)], -1)
+                improved = True
+    return path.tolist(), True
+
+
+def route_length(matrix, route):
+    return float(matrix[route[:-1], route[1:]].sum()) if len(route) > 1 else 0.0
+
+
+def plan_route(coords, pickup_of, start=None, budget=0.2):
+    """Order stops (pickups before their drop-offs) to keep the route short.
+
+    `coords` are the stops' (lat, lng), `pickup_of` as in
+    nearest_neighbour, `start` the courier's (lat, lng) or None. Builds
+    (or reuses) the distance matrix, then improves the nearest-neighbour
+    route with 2-opt until `budget` seconds have passed since the call.
+    Returns a dict with the stop order (indexes into coords), the meters
+    between consecutive stops and how the search went.
+    """
+    began = time.perf_counter()
+    pickup_of = np.asarray(pickup_of, dtype=int)
+    matrix, cached = distance_matrix(coords)
+    if start is not None:
+        # The start is node 0, bordering the cached matrix
+        lat, lng = np.asarray(coords, dtype=float).T
+        row = _road_distances(start[0], start[1], lat, lng)
+        matrix = np.block([[np.zeros((1, 1)), row[None, :]], [row[:, None], matrix]])
+        pickup_of = np.concatenate(([-1], np.where(pickup_of >= 0, pickup_of + 1, -1)))
+
+    offset = 0 if start is None else 1
+    initial = nearest_neighbour(matrix, pickup_of, start=0 if start is not None else None)
+    route, converged = two_opt(matrix, initial, pickup_of, began + budget, fixed_start=start is not None)
+    legs = matrix[route[:-1], route[1:]].tolist()
+    if start is None:
+        legs = [0.0, *legs]
+    return {
+        'order': [node - offset for node in route[offset:]],
+        'legs': legs,
+        'distance': route_length(matrix, route),
+        'initialDistance': route_length(matrix, initial),
+        'converged': converged,
+        'matrixCached': cached,
+        'elapsedMs': (time.perf_counter() - began) * 1000,
+    }
+
+
+def courier_stops(courier_id):
+    """Stops for the parcels a courier still has to move.
+
+    Pending parcels need a pickup and a drop-off, parcels already picked up
+    only the drop-off. Returns (stops, coords, pickup_of) in the form
+    plan_route takes, stops being (parcel row, 'pickup'|'dropoff').
+    """
+    rows = db.session.execute(
+        select(Parcel.id, Parcel.tracking_number, Parcel.status, Parcel.pickup_lat, Parcel.pickup_lng,
+               Parcel.destination_lat, Parcel.destination_lng)
+        .where(Parcel.courier_id == courier_id, Parcel.status.in_(ACTIVE_STATUSES))
+        .order_by(Parcel.id)
+        .limit(current_app.config['ROUTE_MAX_STOPS'] // 2)
+    ).all()
+    stops, coords, pickup_of = [], [], []
+    for row in rows:
+        pickup = -1
+        if row.status == 'pending':
+            pickup = len(stops)
+            stops.append((row, 'pickup'))
+            coords.append((row.pickup_lat, row.pickup_lng))
+            pickup_of.append(-1)
+        stops.append((row, 'dropoff'))
+        coords.append((row.destination_lat, row.destination_lng))
+        pickup_of.append(pickup)
+    return stops, coords, pickup_of
+
+
+def courier_route(courier_id, start=None, budget=0.2):
+    """Planned stop sequence for a courier's active parcels, as returned by the API"""
+    stops, coords, pickup_of = courier_stops(courier_id)
+    if not stops:
+        return {'courierId': courier_id, 'stops': [], 'distance': 0.0, 'initialDistance': 0.0,
+                'converged': True, 'matrixCached': False, 'elapsedMs': 0.0}
+    plan = plan_route(coords, pickup_of, start=start, budget=budget)
+    return {
+        'courierId': courier_id,
+        'stops': [{
+            'parcelId': stops[index][0].id,
+            'trackingNumber': stops[index][0].tracking_number,
+            'type': stops[index][1],
+            'lat': coords[index][0],
+            'lng': coords[index][1],
+            'distanceFromPrevious': round(leg, 1),
+        } for index, leg in zip(plan['order'], plan['legs'])],
+        'distance': round(plan['distance'], 1),
+        'initialDistance': round(plan['initialDistance'], 1),
+        'converged': plan['converged'],
+        'matrixCached': plan['matrixCached'],
+        'elapsedMs': round(plan['elapsedMs'], 1),
+    }
@@ -0,0 +1,105 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+from utils import polyline
+from utils.trajectory import simplify_track, pinned_points, GPS_DESCRIPTION
+
+# ?timeline= values; 'verbose' is the list of Location.to_dict() entries
+TIMELINE_FORMATS = ('verbose', 'compact')
+
+TimelineOptions = namedtuple('TimelineOptions', ['simplify', 'format'])
+DEFAULT_TIMELINE = TimelineOptions(None, 'verbose')
+
+
+class InvalidTimelineRequest(ValueError):
+    """Raised when the timeline query params can't be used"""
+
+
+def parse_timeline_options(args):
+    """Read ?simplify=<meters> and ?timeline=<format> from the query string"""
+    simplify = args.get('simplify')
+    if simplify in (None, ''):
+        simplify = None
+    else:
+        try:
+            simplify = float(simplify)
+        except ValueError:
+            raise InvalidTimelineRequest('simplify must be a number of meters')
+        if not 0 < simplify <= 100000:
+            raise InvalidTimelineRequest('simplify must be between 0 and 100000 meters')
+
+    timeline_format = args.get('timeline') or 'verbose'
+    if timeline_format not in TIMELINE_FORMATS:
+        raise InvalidTimelineRequest(f'timeline must be one of {", ".join(TIMELINE_FORMATS)}')
+    return TimelineOptions(simplify, timeline_format)
+
+
+def timeline_variant(options):
+    """Part of the ETag for responses shaped by `options`"""
+    if options == DEFAULT_TIMELINE:
+        return ''
+    return f'simplify={options.simplify}|timeline={options.format}'
+
+
+def simplify_timeline(timeline, tolerance_m):
+    """Drop redundant GPS points from a serialized timeline.
+
+    The same entries are pinned as in stored-trail compaction, see
+    utils/trajectory.pinned_points.
+    """
+    pinned = pinned_points([(entry['status'], bool(entry['coordinates']), entry['location'])
+                            for entry in timeline])
+    points = [(entry['coordinates'] and entry['coordinates']['lat'],
+               entry['coordinates'] and entry['coordinates']['lng'],
+               datetime.fromisoformat(entry['timestamp']), pinned[i])
+              for i, entry in enumerate(timeline)]
+    return [timeline[i] for i in simplify_track(points, tolerance_m)]
+
+
+def compact_timeline(timeline):
+    """Columnar form of a serialized timeline, a fraction of the verbose size.
+
+    - points: Google encoded polyline (precision 5) of the entries with
+      coordinates; noCoordinates lists the indexes of the others
+    - timestamps: epoch seconds of the first entry, then whole-second deltas
+    - statuses: [index, status] wherever the status changes
+    - locations: descriptions by index, except generated 'Lat: .., Lng: ..'
+      ones which the coordinates already carry
+    """
+    coords, no_coordinates, timestamps, statuses, locations = [], [], [], [], {}
+    previous_time = None
+    for i, entry in enumerate(timeline):
+        if entry['coordinates']:
+            coords.append((entry['coordinates']['lat'], entry['coordinates']['lng']))
+        else:
+            no_coordinates.append(i)
+
+        seconds = round(datetime.fromisoformat(entry['timestamp']).replace(tzinfo=timezone.utc).timestamp())
+        timestamps.append(seconds if previous_time is None else seconds - previous_time)
+        previous_time = seconds
+
+        if not statuses or statuses[-1][1] != entry['status']:
+            statuses.append([i, entry['status']])
+        if not (entry['coordinates'] and GPS_DESCRIPTION.match(entry['location'] or '')):
+            locations[str(i)] = entry['location']
+
+    return {
+        'encoding': 'polyline5',
+        'count': len(timeline),
+        'points': polyline.encode(coords),
+        'noCoordinates': no_coordinates,
+        'timestamps': timestamps,
+        'statuses': statuses,
+        'locations': locations,
+    }
+
+
+def shape_timeline(data, options):
+    """Apply the timeline options to one serialized parcel"""
+    if 'timeline' not in data or options == DEFAULT_TIMELINE:
+        return data
+    timeline = data['timeline']
+    if options.simplify:
+        timeline = simplify_timeline(timeline, options.simplify)
+    if options.format == 'compact':
+        timeline = compact_timeline(timeline)
+    return {**data, 'timeline': timeline}
@@ -0,0 +1,169 @@
+import math
+import re
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import select, delete, update, func
+from models import db, Parcel, Location
+from utils.cache import invalidate_tracking
+
+EARTH_RADIUS_M = 6371008.8
+DELETE_CHUNK_SIZE = 5000
+
+# Description written for plain GPS fixes, see utils/locations.py and
+# ParcelController.update_parcel_location; anything else was typed by a person
+GPS_DESCRIPTION = re.compile(r'^Lat: -?[\d.e-]+, Lng: -?[\d.e-]+$')
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters, element-wise (and broadcast) when given arrays"""
+    lat1, lng1, lat2, lng2 = (np.radians(a) for a in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _segment_distance_m(point, start, end):
+    # Local equirectangular projection around `start`, plenty accurate at
+    # the scale of one stretch of GPS trail
+    scale = math.cos(math.radians(start[0]))
+
+    def project(p):
+        return (math.radians(p[1] - start[1]) * scale * EARTH_RADIUS_M,
+                math.radians(p[0] - start[0]) * EARTH_RADIUS_M)
+
+    px, py = project(point)
+    ex, ey = project(end)
+    length2 = ex * ex + ey * ey
+    t = 0.0 if length2 == 0 else max(0.0, min(1.0, (px * ex + py * ey) / length2))
+    return math.hypot(px - t * ex, py - t * ey)
+
+
+def douglas_peucker(coords, tolerance_m):
+    """Indexes of `coords` [(lat, lng), ...] kept by Douglas-Peucker, endpoints included"""
+    if len(coords) < 3:
+        return list(range(len(coords)))
+    keep = {0, len(coords) - 1}
+    stack = [(0, len(coords) - 1)]
+    while stack:
+        first, last = stack.pop()
+        farthest, distance = None, tolerance_m
+        for i in range(first + 1, last):
+            d = _segment_distance_m(coords[i], coords[first], coords[last])
+            if d > distance:
+                farthest, distance = i, d
+        if farthest is not None:
+            keep.add(farthest)
+            stack.extend(((first, farthest), (farthest, last)))
+    return sorted(keep)
+
+
+def simplify_track(points, tolerance_m, max_gap_s=None):
+    """Indexes of a timeline's points worth keeping.
+
+    `points` are (lat, lng, timestamp, pinned) tuples in time order. Pinned
+    points (status changes, manual entries, anything without coordinates)
+    are always kept and split the trail into stretches that are simplified
+    independently with Douglas-Peucker. With `max_gap_s`, a point is also
+    kept whenever the previous kept one is older than that, so long stops
+    still show up in the timeline.
+    """
+    keep = set()
+    run = []
+
+    def close_run():
+        if not run:
+            return
+        kept = {run[i] for i in douglas_peucker([points[j][:2] for j in run], tolerance_m)}
+        if max_gap_s:
+            last = points[run[0]][2]
+            for j in run:
+                if j in kept or (points[j][2] - last).total_seconds() >= max_gap_s:
+                    kept.add(j)
+                    last = points[j][2]
+        keep.update(kept)
+        run.clear()
+
+    for i, (lat, lng, timestamp, pinned) in enumerate(points):
+        if pinned or lat is None or lng is None:
+            close_run()
+            keep.add(i)
+        else:
+            run.append(i)
+    close_run()
+    return sorted(keep)
+
+
+def pinned_points(entries):
+    """Which timeline entries simplification must never drop.
+
+    `entries` are (status, has_coordinates, description) in time order. The
+    first and last entry, status changes, entries without coordinates and
+    manually described entries are pinned.
+    """
+    pinned = []
+    previous_status = None
+    for i, (status, has_coordinates, description) in enumerate(entries):
+        pinned.append(
+            i == 0 or i == len(entries) - 1
+            or status != previous_status
+            or not has_coordinates
+            or not GPS_DESCRIPTION.match(description or '')
+        )
+        previous_status = status
+    return pinned
+
+
+def compact_trajectories(tolerance_m, max_gap_s=None, min_age_s=0, batch_size=500, min_points=3):
+    """Delete redundant GPS rows from stored timelines.
+
+    Parcels with at least `min_points` timeline rows are processed
+    `batch_size` at a time: one query loads their timelines, bulk DELETEs
+    removes the dropped rows, then the batch commits. Status changes,
+    manually described rows, the first and last row, and rows newer than
+    `min_age_s` (the live tail) are always kept. Returns
+    (parcels compacted, rows deleted).
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=min_age_s)
+    candidates = select(Location.parcel_id).group_by(Location.parcel_id).having(func.count() >= min_points)
+    parcel_ids = db.session.scalars(candidates.order_by(Location.parcel_id)).all()
+
+    compacted = deleted = 0
+    for start in range(0, len(parcel_ids), batch_size):
+        batch = parcel_ids[start:start + batch_size]
+        timelines = {}
+        for location in db.session.scalars(
+                select(Location).where(Location.parcel_id.in_(batch))
+                .order_by(Location.parcel_id, Location.timestamp, Location.id)):
+            timelines.setdefault(location.parcel_id, []).append(location)
+
+        drop = []
+        touched = []
+        for parcel_id, locations in timelines.items():
+            pinned = pinned_points([(location.status, location.latitude is not None, location.location_description)
+                                    for location in locations])
+            points = [(location.latitude, location.longitude, location.timestamp,
+                       pinned[i] or location.timestamp >= cutoff)
+                      for i, location in enumerate(locations)]
+            kept = set(simplify_track(points, tolerance_m, max_gap_s))
+            dropped = [location.id for i, location in enumerate(locations) if i not in kept]
+            if dropped:
+                drop.extend(dropped)
+                touched.append(parcel_id)
+
+        if drop:
+            for chunk in range(0, len(drop), DELETE_CHUNK_SIZE):
+                db.session.execute(delete(Location).where(Location.id.in_(drop[chunk:chunk + DELETE_CHUNK_SIZE])))
+            # Removing rows from the middle of a timeline leaves its newest
+            # row alone, so bump updated_at to change the parcels' ETags
+            db.session.execute(update(Parcel).where(Parcel.id.in_(touched)).values(updated_at=datetime.utcnow()))
+            tracking_numbers = db.session.scalars(
+                select(Parcel.tracking_number).where(Parcel.id.in_(touched))
+            ).all()
+            db.session.commit()
+            invalidate_tracking(*tracking_numbers)
+            compacted += len(touched)
+            deleted += len(drop)
+        else:
+            db.session.rollback()
+        # Loaded rows aren't needed past their batch
+        db.session.expunge_all()
+    return compacted, deleted
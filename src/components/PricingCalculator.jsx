@@ -1,54 +1,53 @@
 import React, { useState, useEffect } from 'react';
-import { Calculator, Info, Package } from 'lucide-react';
+import { Info, Package } from 'lucide-react';
+import api from '../services/api';
+import useDebounce from '../hooks/useDebounce';
 
-function PricingCalculator({ weight, onPriceCalculated }) {
-  const [calculatedPrice, setCalculatedPrice] = useState(0);
-  const [breakdown, setBreakdown] = useState({});
+// Quotes come from POST /api/parcels/quote, the same pricing the server
+// charges when the parcel is created
+function PricingCalculator({ weight, pickupCoords, destinationCoords, onPriceCalculated }) {
+  const [breakdown, setBreakdown] = useState(null);
+  const [loading, setLoading] = useState(false);
+  const [error, setError] = useState(null);
 
-  const pricingTiers = [
-    { min: 0, max: 1, rate: 150, label: 'Light Package (0-1kg)', color: 'text-green-600' },
-    { min: 1, max: 5, rate: 120, label: 'Medium Package (1-5kg)', color: 'text-blue-600' },
-    { min: 5, max: 20, rate: 90, label: 'Heavy Package (5-20kg)', color: 'text-orange-600' },
-    { min: 20, max: Infinity, rate: 60, label: 'Extra Heavy (20kg+)', color: 'text-red-600' },
-  ];
-
-  const additionalFees = {
-    base: 100,
-    insurance: 50,
-    handling: 75,
-    fuel: 30,
-  };
+  const debouncedWeight = useDebounce(weight, 400);
+  const hasCoords = Boolean(pickupCoords && destinationCoords);
 
   useEffect(() => {
-    if (weight > 0) {
-      calculatePrice(weight);
+    if (!(debouncedWeight > 0) || !hasCoords) {
+      setBreakdown(null);
+      return undefined;
     }
-  }, [weight]);
-
-  const calculatePrice = (weightValue) => {
-    const tier = pricingTiers.find(t => weightValue > t.min && weightValue <= t.max);
-    const basePrice = weightValue * tier.rate;
-    const feesTotal = Object.values(additionalFees).reduce((sum, fee) => sum + fee, 0);
-    const total = basePrice + feesTotal;
-    
-    const priceBreakdown = {
-      weight: weightValue,
-      tier: tier.label,
-      tierColor: tier.color,
-      rate: tier.rate,
-      basePrice,
-      fees: additionalFees,
-      feesTotal,
-      total: Math.round(total * 100) / 100,
+    let cancelled = false;
+    setLoading(true);
+    setError(null);
+    api.post('/parcels/quote', [{
+      weight: debouncedWeight,
+      pickupCoords: { lat: pickupCoords.lat, lng: pickupCoords.lng },
+      destinationCoords: { lat: destinationCoords.lat, lng: destinationCoords.lng },
+    }])
+      .then((response) => {
+        if (cancelled) return;
+        const [quote] = response.data.quotes;
+        setBreakdown(quote);
+        if (onPriceCalculated) {
+          onPriceCalculated(quote.price);
+        }
+      })
+      .catch((err) => {
+        if (cancelled) return;
+        setBreakdown(null);
+        setError(err.response?.data?.error || 'Could not get a price right now');
+      })
+      .finally(() => {
+        if (!cancelled) setLoading(false);
+      });
+    return () => {
+      cancelled = true;
     };
+  }, [debouncedWeight, pickupCoords?.lat, pickupCoords?.lng, destinationCoords?.lat, destinationCoords?.lng]);
 
-    setCalculatedPrice(priceBreakdown.total);
-    setBreakdown(priceBreakdown);
-    
-    if (onPriceCalculated) {
-      onPriceCalculated(priceBreakdown.total);
-    }
-  };
+  const feesTotal = breakdown ? breakdown.price - breakdown.weightCharge - breakdown.distanceCharge : 0;
 
   return (
     <div className="bg-gray-50 p-4 rounded-lg">
@@ -57,42 +56,29 @@ function PricingCalculator({ weight, onPriceCalculated }) {
         <h4 className="font-medium text-gray-900">Price Calculator</h4>
       </div>
 
-      {weight > 0 && breakdown.total && (
+      {weight > 0 && breakdown && (
         <div className="space-y-2">
           <div className="flex justify-between text-sm">
-            <span className="text-gray-600">Ksh{breakdown.rate}/kg</span>
+            <span className="text-gray-600">Base Cost ({weight}kg × Ksh{breakdown.rate})</span>
+            <span>Ksh{breakdown.weightCharge.toFixed(2)}</span>
           </div>
-          <div className="flex justify-between text-sm">
-            <span>Ksh{breakdown.basePrice.toFixed(2)}</span>
-          </div>
-          
-          <div className="border-t pt-2 space-y-1">
-            <div className="flex justify-between text-xs text-gray-500">
-            <span className={`font-medium Ksh{breakdown.tierColor}`}>{breakdown.tier}</span>
-              <span>Service Fee</span>
-            </div>
-            <div className="flex justify-between text-xs text-gray-500">
-            <span className="text-gray-600">Base Cost ({breakdown.weight}kg × Ksh{breakdown.rate})</span>
-              <span>Insurance</span>
+          {breakdown.distanceCharge > 0 && (
+            <div className="flex justify-between text-sm">
+              <span className="text-gray-600">Distance ({breakdown.distanceKm}km)</span>
+              <span>Ksh{breakdown.distanceCharge.toFixed(2)}</span>
             </div>
-            <div className="flex justify-between text-xs text-gray-500">
-              <span>Handling</span>
-            </div>
-            <div className="flex justify-between text-xs text-gray-500">
-              <span>Ksh{breakdown.fees.base.toFixed(2)}</span>
-              <span>Fuel Surcharge</span>
-              <span>Ksh{breakdown.fees.fuel.toFixed(2)}</span>
-            </div>
-              <span>Ksh{breakdown.fees.insurance.toFixed(2)}</span>
+          )}
+          <div className="flex justify-between text-sm">
+            <span className="text-gray-600">Service, insurance, handling & fuel</span>
+            <span>Ksh{feesTotal.toFixed(2)}</span>
           </div>
-          
+
           <hr className="my-2" />
-              <span>Ksh{breakdown.fees.handling.toFixed(2)}</span>
           <div className="flex justify-between font-bold text-lg">
             <span>Total</span>
-            <span className="text-emerald-600">Ksh{breakdown.total}</span>
+            <span className="text-emerald-600">Ksh{breakdown.price.toFixed(2)}</span>
           </div>
-          
+
           <div className="flex items-start space-x-2 mt-3 p-2 bg-emerald-50 rounded">
             <Info className="h-4 w-4 text-blue-600 mt-0.5 flex-shrink-0" />
             <p className="text-xs text-emerald-700">
@@ -102,23 +88,23 @@ function PricingCalculator({ weight, onPriceCalculated }) {
         </div>
       )}
 
-      {weight === 0 && (
-        <p className="text-sm text-gray-500">Enter weight to calculate price</p>
+      {weight > 0 && loading && !breakdown && (
+        <p className="text-sm text-gray-500">Calculating price...</p>
+      )}
+
+      {weight > 0 && error && (
+        <p className="text-sm text-red-600">{error}</p>
+      )}
+
+      {weight > 0 && !hasCoords && (
+        <p className="text-sm text-gray-500">Choose pickup and destination to calculate price</p>
       )}
-      
+
       {weight === 0 && (
-        <div className="mt-3 space-y-2">
-          <h5 className="text-sm font-medium text-gray-700">Pricing Tiers:</h5>
-          {pricingTiers.map((tier, index) => (
-            <div key={index} className="flex justify-between text-xs">
-              <span className={tier.color}>{tier.label}</span>
-              <span className="text-gray-600">Ksh{tier.rate}/kg</span>
-            </div>
-          ))}
-        </div>
+        <p className="text-sm text-gray-500">Enter weight to calculate price</p>
       )}
     </div>
   );
 }
 
-export default PricingCalculator;
\ No newline at end of file
+export default PricingCalculator;
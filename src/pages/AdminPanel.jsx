@@ -22,7 +22,7 @@ function AdminPanel() {
   });
 
   const isMounted = useRef(true);
-  const { parcels, loading } = useSelector(state => state.parcels);
+  const { parcels, loading, loadingMore, nextCursor } = useSelector(state => state.parcels);
   const safeParcels = Array.isArray(parcels) ? parcels : [];
 
   const dispatch = useDispatch();
@@ -403,6 +403,17 @@ function AdminPanel() {
                 </tbody>
               </table>
             </div>
+            {nextCursor && (
+              <div className="p-3 text-center border-t border-gray-200">
+                <button
+                  onClick={() => dispatch(fetchAllParcelsForAdmin({ cursor: nextCursor }))}
+                  disabled={loadingMore}
+                  className="px-4 py-2 text-xs sm:text-sm border border-gray-300 text-gray-700 rounded-md hover:bg-gray-50 disabled:opacity-50"
+                >
+                  {loadingMore ? 'Loading...' : 'Load more parcels'}
+                </button>
+              </div>
+            )}
           </div>
 
           {/* Edit Modal */}
@@ -44,7 +44,7 @@ function Dashboard() {
     destinationCoords: null,
   });
 
-  const { parcels, loading, error } = useSelector(state => state.parcels);
+  const { parcels, loading, loadingMore, nextCursor, error } = useSelector(state => state.parcels);
   const { user } = useSelector(state => state.user);
   const dispatch = useDispatch();
 
@@ -476,6 +476,18 @@ function Dashboard() {
         )}
       </div>
 
+      {nextCursor && (
+        <div className="mt-6 text-center">
+          <button
+            onClick={() => dispatch(fetchParcels({ cursor: nextCursor }))}
+            disabled={loadingMore}
+            className="px-6 py-2 border border-gray-300 text-gray-700 rounded-lg hover:bg-gray-50 transition-colors disabled:opacity-50"
+          >
+            {loadingMore ? 'Loading...' : 'Load more parcels'}
+          </button>
+        </div>
+      )}
+
       {/* Create Parcel Modal */}
       <Modal
         isOpen={showCreateModal}
@@ -684,6 +696,8 @@ function Dashboard() {
                 <div>
                   <PricingCalculator
                     weight={parseFloat(formData.weight) || 0}
+                    pickupCoords={mapLocations.pickup || formData.pickupCoords}
+                    destinationCoords={mapLocations.destination || formData.destinationCoords}
                     onPriceCalculated={handlePriceCalculated}
                   />
                 </div>
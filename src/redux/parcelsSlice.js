@@ -2,19 +2,19 @@ import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import api from '../services/api';
 import axios from 'axios'; 
 
-// Fetch parcels for the logged-in user
+// Fetch one page of the logged-in user's parcels; pass { cursor } for the next page
 export const fetchParcels = createAsyncThunk(
   'parcels/fetchParcels',
-  async () => {
-    const response = await api.get('/parcels');
-    return response.data;
+  async ({ cursor } = {}) => {
+    const response = await api.get('/parcels', { params: cursor ? { cursor } : {} });
+    return { parcels: response.data.parcels, nextCursor: response.data.next_cursor };
   }
 );
 
-// Fetch ALL parcels (admin-only)
+// Fetch one page of ALL parcels (admin-only); pass { cursor } for the next page
 export const fetchAllParcelsForAdmin = createAsyncThunk(
   'parcels/fetchAllParcelsForAdmin',
-  async (_, thunkAPI) => {
+  async ({ cursor } = {}, thunkAPI) => {
     try {
       const state = thunkAPI.getState();
       const token = state.user?.token;
@@ -23,9 +23,9 @@ export const fetchAllParcelsForAdmin = createAsyncThunk(
         headers: {
           Authorization: `Bearer ${token}`,
         },
+        params: cursor ? { cursor } : {},
       });
-
-      return response.data;
+      return { parcels: response.data.parcels, nextCursor: response.data.next_cursor };
     } catch (error) {
       console.error('Admin fetch error:', error);
       return thunkAPI.rejectWithValue(
@@ -35,6 +35,23 @@ export const fetchAllParcelsForAdmin = createAsyncThunk(
   }
 );
 
+// First page replaces the list, later pages are appended
+const receivePage = (state, action) => {
+  const page = Array.isArray(action.payload?.parcels) ? action.payload.parcels : [];
+  state.loading = false;
+  state.loadingMore = false;
+  state.parcels = action.meta.arg?.cursor ? [...state.parcels, ...page] : page;
+  state.nextCursor = action.payload?.nextCursor || null;
+};
+
+const requestPage = (state, action) => {
+  if (action.meta.arg?.cursor) {
+    state.loadingMore = true;
+  } else {
+    state.loading = true;
+  }
+};
+
 
 // Create parcel
 export const createParcel = createAsyncThunk(
@@ -176,8 +193,10 @@ export const cancelParcel = createAsyncThunk(
 // Initial state
 const initialState = {
   parcels: [],
+  nextCursor: null,
   currentParcel: null,
   loading: false,
+  loadingMore: false,
   error: null,
 };
 
@@ -195,30 +214,20 @@ const parcelsSlice = createSlice({
   extraReducers: (builder) => {
     builder
       // User's own parcels
-      .addCase(fetchParcels.pending, (state) => {
-        state.loading = true;
-      })
-      .addCase(fetchParcels.fulfilled, (state, action) => {
-        state.loading = false;
-        // state.parcels = action.payload;
-        state.parcels = Array.isArray(action.payload) ? action.payload : [];
-      })
+      .addCase(fetchParcels.pending, requestPage)
+      .addCase(fetchParcels.fulfilled, receivePage)
       .addCase(fetchParcels.rejected, (state, action) => {
         state.loading = false;
+        state.loadingMore = false;
         state.error = action.error.message;
       })
 
       // Admin: all parcels
-      .addCase(fetchAllParcelsForAdmin.pending, (state) => {
-        state.loading = true;
-      })
-      .addCase(fetchAllParcelsForAdmin.fulfilled, (state, action) => {
-        state.loading = false;
-        // state.parcels = action.payload;
-        state.parcels = Array.isArray(action.payload) ? action.payload : [];
-      })
+      .addCase(fetchAllParcelsForAdmin.pending, requestPage)
+      .addCase(fetchAllParcelsForAdmin.fulfilled, receivePage)
       .addCase(fetchAllParcelsForAdmin.rejected, (state, action) => {
         state.loading = false;
+        state.loadingMore = false;
         state.error = action.payload || action.error.message;
       })
 
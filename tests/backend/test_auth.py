@@ -1,5 +1,6 @@
 import pytest
 import json
+import time
 from server.app import create_app
 from server.models import db, User
 from server.config import Config
@@ -143,4 +144,67 @@ class TestAuthAPI:
     def test_get_profile_invalid_token(self, client):
         headers = {'Authorization': 'Bearer invalid-token'}
         response = client.get('/api/auth/profile', headers=headers)
-        assert response.status_code == 401
\ No newline at end of file
+        assert response.status_code == 401
+    def test_admin_role_claim_and_revocation(self, client):
+        admin = User(name='Admin', email='admin@example.com', phone='+1234567890', role='admin')
+        admin.set_password('password123')
+        db.session.add(admin)
+        db.session.commit()
+        
+        client.post('/api/auth/login', json={'email': 'admin@example.com', 'password': 'password123'},
+                    base_url='https://localhost')
+        response = client.get('/api/admin/parcels', base_url='https://localhost')
+        assert response.status_code == 200
+        
+        # The token still claims admin, but the committed role change revokes it
+        admin.role = 'user'
+        db.session.commit()
+        response = client.get('/api/admin/parcels', base_url='https://localhost')
+        assert response.status_code == 403
+
+    def test_role_revocation_reaches_other_workers(self, tmp_path, monkeypatch):
+        # Two app instances stand in for two worker processes sharing a database
+        monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'shared.db'}")
+        first, second = create_app(), create_app()
+        for app in (first, second):
+            app.config.update(TESTING=True, JWT_SECRET_KEY='test-secret-key')
+        with first.app_context():
+            db.create_all()
+            admin = User(name='Admin', email='admin@example.com', phone='+1234567890', role='admin')
+            admin.set_password('password123')
+            db.session.add(admin)
+            db.session.commit()
+        
+        second.config['USER_ROLE_REVOCATION_REFRESH'] = 0.5
+        first_client, second_client = first.test_client(), second.test_client()
+        first_client.post('/api/auth/login', json={'email': 'admin@example.com', 'password': 'password123'},
+                          base_url='https://localhost')
+        token = first_client.get_cookie('access_token_cookie').value
+        second_client.set_cookie('access_token_cookie', token)
+        assert second_client.get('/api/admin/parcels', base_url='https://localhost').status_code == 200
+        
+        # Demoted through the first worker: refused there at once, by the
+        # second once its copy of the revocations is refreshed
+        with first.app_context():
+            User.query.filter_by(email='admin@example.com').one().role = 'user'
+            db.session.commit()
+        assert first_client.get('/api/admin/parcels', base_url='https://localhost').status_code == 403
+        assert second_client.get('/api/admin/parcels', base_url='https://localhost').status_code == 200
+        time.sleep(0.5)
+        assert second_client.get('/api/admin/parcels', base_url='https://localhost').status_code == 403
+
+    def test_login_rehashes_outdated_password_hash(self, client):
+        from werkzeug.security import generate_password_hash
+        user = User(name='John Doe', email='john@example.com', phone='+1234567890',
+                    password_hash=generate_password_hash('password123', 'scrypt'))
+        db.session.add(user)
+        db.session.commit()
+        assert user.password_needs_rehash()
+        
+        response = client.post('/api/auth/login', json={'email': 'john@example.com', 'password': 'password123'})
+        
+        assert response.status_code == 200
+        db.session.refresh(user)
+        assert user.password_hash.startswith(TestConfig.PASSWORD_HASH_METHOD)
+        assert not user.password_needs_rehash()
+        assert user.check_password('password123')
@@ -0,0 +1,113 @@
+import pytest
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from server.app import create_app
+from server.models import db, GeocodeCache
+from server.config import Config
+from server.utils.geocoding import get_geocoder, normalize_address
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    JWT_SECRET_KEY = 'test-secret-key'
+    GEOCODING_RETRIES = 0
+
+class StubGeocodeHandler(BaseHTTPRequestHandler):
+    """Speaks the Google Geocoding JSON format"""
+    requests_seen = []
+    delay = 0
+    
+    def do_GET(self):
+        address = parse_qs(urlparse(self.path).query)['address'][0]
+        self.requests_seen.append(address)
+        time.sleep(self.delay)
+        if 'nowhere' in address.lower():
+            body = {'status': 'ZERO_RESULTS', 'results': []}
+        else:
+            body = {'status': 'OK', 'results': [{'geometry': {'location': {'lat': -1.2921, 'lng': 36.8219}}}]}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    StubGeocodeHandler.requests_seen = []
+    StubGeocodeHandler.delay = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubGeocodeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def app(stub_server):
+    app = create_app()
+    app.config.from_object(TestConfig)
+    app.config['GEOCODING_URL'] = f'http://127.0.0.1:{stub_server.server_port}/geocode/json'
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+class TestGeocoding:
+    def test_normalize_address(self):
+        assert normalize_address('  Kenyatta Ave ,Nairobi  ') == 'kenyatta ave, nairobi'
+        assert normalize_address('KENYATTA   AVE, Nairobi') == 'kenyatta ave, nairobi'
+
+    def test_geocode_hits_provider_once(self, app):
+        geocoder = get_geocoder()
+        
+        first = geocoder.geocode('Kenyatta Ave, Nairobi')
+        second = geocoder.geocode('  kenyatta ave ,NAIROBI ')
+        
+        assert first == second == {'lat': -1.2921, 'lng': 36.8219}
+        assert len(StubGeocodeHandler.requests_seen) == 1
+
+    def test_geocode_persists_to_database(self, app):
+        get_geocoder().geocode('Kenyatta Ave, Nairobi')
+        db.session.commit()
+        assert GeocodeCache.query.filter_by(address='kenyatta ave, nairobi').count() == 1
+        
+        # A fresh in-memory cache is filled from the table, not the provider
+        get_geocoder().memory_cache.clear()
+        assert get_geocoder().geocode('Kenyatta Ave, Nairobi') == {'lat': -1.2921, 'lng': 36.8219}
+        assert len(StubGeocodeHandler.requests_seen) == 1
+
+    def test_geocode_unknown_address(self, app):
+        assert get_geocoder().geocode('Nowhere Street') is None
+        assert GeocodeCache.query.count() == 0
+
+    def test_geocode_many_runs_concurrently(self, app):
+        StubGeocodeHandler.delay = 0.3
+        addresses = [f'{n} Moi Avenue, Nairobi' for n in range(1, 5)]
+        
+        started = time.monotonic()
+        results = get_geocoder().geocode_many(addresses + ['1 moi avenue,  nairobi'])
+        elapsed = time.monotonic() - started
+        
+        assert all(results[address] for address in addresses)
+        # Four distinct addresses, one provider call each, in parallel
+        assert len(StubGeocodeHandler.requests_seen) == 4
+        assert elapsed < 0.3 * 3
+
+    def test_geocode_persists_long_addresses(self, app):
+        address = 'Kenyatta Ave, ' + 'Block 7, ' * 80 + 'Nairobi'
+        get_geocoder().geocode(address)
+        db.session.commit()
+        
+        row = GeocodeCache.query.one()
+        assert len(row.address) > 500
+        assert len(row.address_key) == 40
+        get_geocoder().memory_cache.clear()
+        assert get_geocoder().geocode(address) == {'lat': -1.2921, 'lng': 36.8219}
+        assert len(StubGeocodeHandler.requests_seen) == 1
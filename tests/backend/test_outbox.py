@@ -0,0 +1,122 @@
+import pytest
+from datetime import datetime, timedelta
+from server.app import create_app
+from server.models import db, User, EmailOutbox
+from server.config import Config
+from server.utils.email import mail, queue_status_update_email
+from server.utils.outbox import drain_outbox
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    JWT_SECRET_KEY = 'test-secret-key'
+    MAIL_USERNAME = 'noreply@example.com'
+    EMAIL_OUTBOX_MAX_ATTEMPTS = 2
+    EMAIL_DIGEST_WINDOW = 0
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.from_object(TestConfig)
+    app.extensions['mail'].suppress = True
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+class TestEmailOutbox:
+    def test_register_queues_welcome_email(self, client):
+        client.post('/api/auth/register', json={
+            'name': 'John Doe',
+            'email': 'john@example.com',
+            'password': 'password123',
+            'phone': '+1234567890'
+        })
+        
+        row = EmailOutbox.query.one()
+        assert row.kind == 'welcome'
+        assert row.recipient == 'john@example.com'
+        assert row.status == 'pending'
+
+    def test_drain_sends_batch(self, app):
+        for n in range(3):
+            queue_status_update_email(f'user{n}@example.com', f'DEL{n}', 'pending', 'in_transit')
+        db.session.commit()
+        
+        with mail.record_messages() as outbox:
+            assert drain_outbox() == 3
+        
+        assert [msg.recipients for msg in outbox] == [[f'user{n}@example.com'] for n in range(3)]
+        assert EmailOutbox.query.filter_by(status='sent').count() == 3
+        assert drain_outbox() == 0
+
+    def test_failed_email_is_retried_then_dead_lettered(self, app, monkeypatch):
+        def fail(self, message):
+            raise RuntimeError('SMTP unavailable')
+        monkeypatch.setattr('flask_mail.Connection.send', fail)
+        
+        queue_status_update_email('user@example.com', 'DEL1', 'pending', 'in_transit')
+        db.session.commit()
+        
+        drain_outbox()
+        row = EmailOutbox.query.one()
+        assert row.status == 'pending'
+        assert row.attempts == 1
+        assert row.next_attempt_at > datetime.utcnow()
+        
+        # Not due yet
+        assert drain_outbox() == 0
+        
+        row.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        drain_outbox()
+        assert row.status == 'dead'
+        assert row.last_error == 'SMTP unavailable'
+
+    def test_connection_drop_does_not_record_a_failure_twice(self, app, monkeypatch):
+        sent = []
+        def send(self, message):
+            if not sent:
+                sent.append(message)
+                raise RuntimeError('Mailbox unavailable')
+        def drop(self, *exc):
+            raise RuntimeError('Connection dropped')
+        monkeypatch.setattr('flask_mail.Connection.send', send)
+        monkeypatch.setattr('flask_mail.Connection.__exit__', drop)
+        
+        for n in range(2):
+            queue_status_update_email(f'user{n}@example.com', f'DEL{n}', 'pending', 'in_transit')
+        db.session.commit()
+        
+        drain_outbox()
+        failed, delivered = EmailOutbox.query.order_by(EmailOutbox.id).all()
+        assert (failed.status, failed.attempts, failed.last_error) == ('pending', 1, 'Mailbox unavailable')
+        assert delivered.status == 'sent'
+
+    def test_rapid_status_changes_coalesce_into_one_digest(self, app):
+        app.config['EMAIL_DIGEST_WINDOW'] = 60
+        for old, new in [('pending', 'picked_up'), ('picked_up', 'in_transit'), ('in_transit', 'delivered')]:
+            queue_status_update_email('user@example.com', 'DEL1', old, new)
+            db.session.commit()
+        
+        # The first change goes out at once, the rest wait for the window
+        first, digest = EmailOutbox.query.order_by(EmailOutbox.id).all()
+        assert (first.kind, digest.kind) == ('status_update', 'status_digest')
+        with mail.record_messages() as outbox:
+            assert drain_outbox() == 1
+        assert 'picked up' in outbox[0].html
+        assert drain_outbox() == 0
+        
+        digest.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        with mail.record_messages() as outbox:
+            assert drain_outbox() == 1
+        
+        assert len(outbox) == 1
+        assert outbox[0].subject == 'Parcel Update - DEL1'
+        assert 'in transit &rarr; delivered' in outbox[0].html
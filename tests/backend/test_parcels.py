@@ -1,5 +1,8 @@
 import pytest
 import json
+import importlib.util
+import inspect
+from sqlalchemy import update
 from server.app import create_app
 from server.models import db, User, Parcel, Location
 from server.config import Config
@@ -23,6 +26,13 @@ def app():
 def client(app):
     return app.test_client()
 
+def login(client, email, password):
+    # The auth cookie stays in the client's cookie jar for later requests
+    response = client.post('/api/auth/login', json={'email': email, 'password': password},
+                           base_url='https://localhost')
+    assert response.status_code == 200
+    return {}
+
 @pytest.fixture
 def auth_headers(client):
     # Create test user
@@ -31,12 +41,7 @@ def auth_headers(client):
     db.session.add(user)
     db.session.commit()
     
-    # Login to get token
-    response = client.post('/api/auth/login', 
-                          json={'email': 'test@example.com', 'password': 'password'})
-    token = json.loads(response.data)['token']
-    
-    return {'Authorization': f'Bearer {token}'}
+    return login(client, 'test@example.com', 'password')
 
 @pytest.fixture
 def admin_headers(client):
@@ -46,12 +51,7 @@ def admin_headers(client):
     db.session.add(admin)
     db.session.commit()
     
-    # Login to get token
-    response = client.post('/api/auth/login', 
-                          json={'email': 'admin@example.com', 'password': 'admin'})
-    token = json.loads(response.data)['token']
-    
-    return {'Authorization': f'Bearer {token}'}
+    return login(client, 'admin@example.com', 'admin')
 
 class TestParcelAPI:
     def test_create_parcel_success(self, client, auth_headers):
@@ -89,6 +89,34 @@ class TestParcelAPI:
         
         assert response.status_code == 400
 
+    def test_bulk_create_parcels(self, app, client, auth_headers):
+        app.config['SQL_QUERY_COUNTER'] = True
+        parcel_data = {
+            'senderName': 'John Doe',
+            'receiverName': 'Jane Smith',
+            'pickupAddress': '123 Main St, New York, NY',
+            'destinationAddress': '456 Oak Ave, Brooklyn, NY',
+            'pickupCoords': {'lat': 40.7128, 'lng': -74.0060},
+            'destinationCoords': {'lat': 40.6782, 'lng': -73.9442},
+            'weight': 2.5,
+            'price': 15.99
+        }
+        items = [parcel_data] * 200 + [{**parcel_data, 'weight': 0}]
+        
+        response = client.post('/api/parcels/bulk', json=items, headers=auth_headers)
+        
+        assert response.status_code == 207
+        data = json.loads(response.data)
+        assert data['created'] == 200
+        assert data['failed'] == 1
+        assert data['results'][-1]['status'] == 'error'
+        assert 'weight' in data['results'][-1]['errors']
+        assert len({result['trackingNumber'] for result in data['results'][:-1]}) == 200
+        # Batched inserts, not one round trip per parcel
+        assert int(response.headers['X-Query-Count']) < 10
+        assert Parcel.query.count() == 200
+        assert Location.query.filter_by(status='pending').count() == 200
+
     def test_get_user_parcels(self, client, auth_headers):
         # Create a test parcel first
         user = User.query.filter_by(email='test@example.com').first()
@@ -113,8 +141,84 @@ class TestParcelAPI:
         
         assert response.status_code == 200
         data = json.loads(response.data)
-        assert len(data) == 1
-        assert data[0]['trackingNumber'] == 'TEST123'
+        assert len(data['parcels']) == 1
+        assert data['parcels'][0]['trackingNumber'] == 'TEST123'
+        assert data['next_cursor'] is None
+
+    def test_get_user_parcels_cursor_pagination(self, client, auth_headers):
+        user = User.query.filter_by(email='test@example.com').first()
+        for i in range(5):
+            db.session.add(Parcel(
+                tracking_number=f'TEST{i}',
+                sender_name='John Doe',
+                receiver_name='Jane Smith',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                pickup_lat=40.7128,
+                pickup_lng=-74.0060,
+                destination_lat=40.6782,
+                destination_lng=-73.9442,
+                weight=2.5,
+                price=15.99,
+                user_id=user.id
+            ))
+        db.session.commit()
+        
+        seen = []
+        cursor = None
+        while True:
+            query = {'limit': 2, 'cursor': cursor} if cursor else {'limit': 2}
+            response = client.get('/api/parcels', query_string=query, headers=auth_headers)
+            assert response.status_code == 200
+            data = json.loads(response.data)
+            assert len(data['parcels']) <= 2
+            seen.extend(p['trackingNumber'] for p in data['parcels'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        
+        # Newest first, every parcel exactly once
+        assert seen == [f'TEST{i}' for i in reversed(range(5))]
+
+    def test_get_user_parcels_invalid_cursor(self, client, auth_headers):
+        response = client.get('/api/parcels?cursor=not-a-cursor', headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_list_query_count_is_constant(self, app, client, auth_headers):
+        app.config['SQL_QUERY_COUNTER'] = True
+        user = User.query.filter_by(email='test@example.com').first()
+        
+        counts = {}
+        for page_size in (2, 10):
+            for i in range(page_size):
+                parcel = Parcel(
+                    tracking_number=f'TEST{page_size}-{i}',
+                    sender_name='John Doe',
+                    receiver_name='Jane Smith',
+                    pickup_address='123 Main St',
+                    destination_address='456 Oak Ave',
+                    pickup_lat=40.7128,
+                    pickup_lng=-74.0060,
+                    destination_lat=40.6782,
+                    destination_lng=-73.9442,
+                    weight=2.5,
+                    price=15.99,
+                    user_id=user.id
+                )
+                db.session.add(parcel)
+                db.session.flush()
+                db.session.add(Location(status='pending', location_description='123 Main St', parcel_id=parcel.id))
+            db.session.commit()
+            
+            for fields in ('full', 'summary'):
+                response = client.get('/api/parcels', query_string={'limit': 50, 'fields': fields},
+                                      headers=auth_headers)
+                assert response.status_code == 200
+                counts[(page_size, fields)] = int(response.headers['X-Query-Count'])
+        
+        assert counts[(2, 'full')] == counts[(10, 'full')]
+        assert counts[(2, 'summary')] == counts[(10, 'summary')]
+        assert counts[(10, 'summary')] < counts[(10, 'full')]
 
     def test_get_parcel_details(self, client, auth_headers):
         user = User.query.filter_by(email='test@example.com').first()
@@ -141,6 +245,74 @@ class TestParcelAPI:
         data = json.loads(response.data)
         assert data['trackingNumber'] == 'TEST123'
 
+    def test_get_parcel_sparse_fields(self, client, auth_headers):
+        user = User.query.filter_by(email='test@example.com').first()
+        parcel = Parcel(
+            tracking_number='TEST123',
+            sender_name='John Doe',
+            receiver_name='Jane Smith',
+            pickup_address='123 Main St',
+            destination_address='456 Oak Ave',
+            pickup_lat=40.7128,
+            pickup_lng=-74.0060,
+            destination_lat=40.6782,
+            destination_lng=-73.9442,
+            weight=2.5,
+            price=15.99,
+            user_id=user.id
+        )
+        db.session.add(parcel)
+        db.session.commit()
+        
+        response = client.get(f'/api/parcels/{parcel.id}?fields=id,trackingNumber,status',
+                              headers=auth_headers)
+        assert response.status_code == 200
+        assert json.loads(response.data) == {'id': parcel.id, 'trackingNumber': 'TEST123', 'status': 'pending'}
+        
+        response = client.get('/api/parcels?fields=summary', headers=auth_headers)
+        assert 'timeline' not in json.loads(response.data)['parcels'][0]
+        
+        response = client.get('/api/parcels/track/TEST123?fields=tracking')
+        data = json.loads(response.data)
+        assert 'timeline' in data
+        assert 'senderName' not in data
+        
+        response = client.get('/api/parcels?fields=bogus', headers=auth_headers)
+        assert response.status_code == 400
+
+    def test_get_parcel_conditional_requests(self, client, auth_headers):
+        user = User.query.filter_by(email='test@example.com').first()
+        parcel = Parcel(
+            tracking_number='TEST123',
+            sender_name='John Doe',
+            receiver_name='Jane Smith',
+            pickup_address='123 Main St',
+            destination_address='456 Oak Ave',
+            pickup_lat=40.7128,
+            pickup_lng=-74.0060,
+            destination_lat=40.6782,
+            destination_lng=-73.9442,
+            weight=2.5,
+            price=15.99,
+            user_id=user.id
+        )
+        db.session.add(parcel)
+        db.session.commit()
+        
+        for url in (f'/api/parcels/{parcel.id}', '/api/parcels', '/api/parcels/track/TEST123'):
+            response = client.get(url, headers=auth_headers)
+            etag = response.headers['ETag']
+            
+            response = client.get(url, headers={**auth_headers, 'If-None-Match': etag})
+            assert response.status_code == 304
+            assert response.data == b''
+        
+        # A new timeline entry changes the representation
+        db.session.add(Location(status='pending', location_description='Depot', parcel_id=parcel.id))
+        db.session.commit()
+        response = client.get(f'/api/parcels/{parcel.id}', headers={**auth_headers, 'If-None-Match': etag})
+        assert response.status_code == 200
+
     def test_update_parcel_success(self, client, auth_headers):
         user = User.query.filter_by(email='test@example.com').first()
         parcel = Parcel(
@@ -174,6 +346,34 @@ class TestParcelAPI:
         data = json.loads(response.data)
         assert data['receiverName'] == 'Updated Receiver'
 
+    def test_update_parcel_reprices_and_ignores_client_price(self, client, auth_headers):
+        from server.utils.pricing import quote_price
+        user = User.query.filter_by(email='test@example.com').first()
+        pickup, destination = {'lat': 40.7128, 'lng': -74.0060}, {'lat': 40.6782, 'lng': -73.9442}
+        parcel = Parcel(
+            tracking_number='TEST123',
+            sender_name='John Doe',
+            receiver_name='Jane Smith',
+            pickup_address='123 Main St',
+            destination_address='456 Oak Ave',
+            pickup_lat=pickup['lat'],
+            pickup_lng=pickup['lng'],
+            destination_lat=destination['lat'],
+            destination_lng=destination['lng'],
+            weight=2.5,
+            price=quote_price(2.5, pickup, destination),
+            user_id=user.id,
+            status='pending'
+        )
+        db.session.add(parcel)
+        db.session.commit()
+        
+        response = client.put(f'/api/parcels/{parcel.id}', json={'weight': 10, 'price': 1}, headers=auth_headers)
+        assert response.status_code == 200
+        db.session.refresh(parcel)
+        assert parcel.price == quote_price(10, pickup, destination)
+        assert parcel.price > quote_price(2.5, pickup, destination)
+
     def test_update_delivered_parcel_fails(self, client, auth_headers):
         user = User.query.filter_by(email='test@example.com').first()
         parcel = Parcel(
@@ -230,6 +430,40 @@ class TestParcelAPI:
         updated_parcel = Parcel.query.get(parcel.id)
         assert updated_parcel.status == 'cancelled'
 
+    def test_quote_parcels(self, client, auth_headers):
+        nairobi = {'lat': -1.2921, 'lng': 36.8219}
+        # 0.1 degrees north is ~11.1 km, ~14.5 km by road
+        north = {'lat': -1.1921, 'lng': 36.8219}
+        items = [
+            {'weight': 0.5, 'pickupCoords': nairobi, 'destinationCoords': nairobi},
+            {'weight': 10, 'pickupCoords': nairobi, 'destinationCoords': north},
+            {'weight': 'heavy', 'pickupCoords': nairobi, 'destinationCoords': north},
+        ]
+        response = client.post('/api/parcels/quote', json=items, headers=auth_headers)
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert [quote['index'] for quote in data['quotes']] == [0, 1]
+        # 0.5 kg at 150/kg plus the 255 in fees, no distance charge inside 5 km
+        assert data['quotes'][0]['price'] == 330.0
+        assert data['quotes'][1]['rate'] == 90.0
+        assert data['quotes'][1]['distanceKm'] == 14.46
+        assert data['quotes'][1]['price'] == 1296.83
+        assert data['rejected'] == [{'index': 2, 'errors': {'weight': ['Expected a number']}}]
+        
+        # Parcels are priced the same way, whatever price the client sends
+        response = client.post('/api/parcels', json={
+            'senderName': 'John Doe',
+            'receiverName': 'Jane Smith',
+            'pickupAddress': '123 Main St, Nairobi',
+            'destinationAddress': '456 Oak Ave, Nairobi',
+            'pickupCoords': nairobi,
+            'destinationCoords': north,
+            'weight': 10,
+            'price': 1
+        }, headers=auth_headers)
+        assert json.loads(response.data)['price'] == 1296.83
+
 class TestAdminAPI:
     def test_admin_get_all_parcels(self, client, admin_headers):
         response = client.get('/api/admin/parcels', headers=admin_headers)
@@ -275,6 +509,545 @@ class TestAdminAPI:
         updated_parcel = Parcel.query.get(parcel.id)
         assert updated_parcel.status == 'in_transit'
 
+    def test_admin_export_parcels_streams(self, app, client, admin_headers):
+        app.config['EXPORT_BATCH_SIZE'] = 2
+        admin = User.query.filter_by(email='admin@example.com').first()
+        for i in range(5):
+            db.session.add(Parcel(
+                tracking_number=f'TEST{i}',
+                sender_name='John Doe',
+                receiver_name='Jane Smith',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                pickup_lat=40.7128,
+                pickup_lng=-74.0060,
+                destination_lat=40.6782,
+                destination_lng=-73.9442,
+                weight=2.5,
+                price=15.99,
+                user_id=admin.id
+            ))
+        db.session.commit()
+        
+        response = client.get('/api/admin/parcels/export?fields=id,trackingNumber',
+                              headers=admin_headers)
+        assert response.status_code == 200
+        assert response.is_streamed
+        lines = response.data.decode().splitlines()
+        assert [json.loads(line)['trackingNumber'] for line in lines] == [f'TEST{i}' for i in range(5)]
+        
+        response = client.get('/api/admin/parcels/export?format=csv&fields=id,pickupCoords',
+                              headers=admin_headers)
+        lines = response.data.decode().splitlines()
+        assert lines[0] == 'id,pickupCoords.lat,pickupCoords.lng'
+        assert len(lines) == 6
+
+    def test_tracking_cache_invalidated_on_status_update(self, client, admin_headers):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        parcel = Parcel(
+            tracking_number='TEST123',
+            sender_name='John Doe',
+            receiver_name='Jane Smith',
+            pickup_address='123 Main St',
+            destination_address='456 Oak Ave',
+            pickup_lat=40.7128,
+            pickup_lng=-74.0060,
+            destination_lat=40.6782,
+            destination_lng=-73.9442,
+            weight=2.5,
+            price=15.99,
+            user_id=admin.id,
+            status='pending'
+        )
+        db.session.add(parcel)
+        db.session.commit()
+        
+        # Prime the cache
+        response = client.get('/api/parcels/track/TEST123')
+        assert json.loads(response.data)['status'] == 'pending'
+        
+        client.put(f'/api/admin/parcels/{parcel.id}/status',
+                   json={'status': 'in_transit', 'location': 'Depot'},
+                   headers=admin_headers)
+        
+        response = client.get('/api/parcels/track/TEST123')
+        data = json.loads(response.data)
+        assert data['status'] == 'in_transit'
+        assert data['timeline'][-1]['location'] == 'Depot'
+        
+        # A read that started before the commit can't cache what it loaded
+        from server.utils.cache import tracking_cache, invalidate_tracking
+        cache = tracking_cache()
+        generation = cache.generation('TEST123')
+        invalidate_tracking('TEST123')
+        assert not cache.set_if_generation('TEST123', {'status': 'pending'}, generation)
+        assert cache.get('TEST123') is None
+
+    def test_tracking_falls_back_to_database_without_redis(self, app, client, admin_headers):
+        app.config.update(CACHE_BACKEND='redis', REDIS_URL='redis://127.0.0.1:1/0')
+        app.extensions.pop('deliveroo_caches', None)
+        admin = User.query.filter_by(email='admin@example.com').first()
+        db.session.add(Parcel(
+            tracking_number='TEST123',
+            sender_name='John Doe',
+            receiver_name='Jane Smith',
+            pickup_address='123 Main St',
+            destination_address='456 Oak Ave',
+            pickup_lat=40.7128,
+            pickup_lng=-74.0060,
+            destination_lat=40.6782,
+            destination_lng=-73.9442,
+            weight=2.5,
+            price=15.99,
+            user_id=admin.id
+        ))
+        db.session.commit()
+        
+        response = client.get('/api/parcels/track/TEST123')
+        assert response.status_code == 200
+        assert json.loads(response.data)['status'] == 'pending'
+
+    def test_admin_ingest_location_batch(self, app, client, admin_headers):
+        app.config['SQL_QUERY_COUNTER'] = True
+        admin = User.query.filter_by(email='admin@example.com').first()
+        parcels = []
+        for i in range(2):
+            parcel = Parcel(
+                tracking_number=f'TEST{i}',
+                sender_name='John Doe',
+                receiver_name='Jane Smith',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                pickup_lat=40.7128,
+                pickup_lng=-74.0060,
+                destination_lat=40.6782,
+                destination_lng=-73.9442,
+                weight=2.5,
+                price=15.99,
+                user_id=admin.id
+            )
+            db.session.add(parcel)
+            parcels.append(parcel)
+        db.session.commit()
+        
+        points = [
+            {'parcel_id': parcels[0].id, 'lat': 40.70, 'lng': -74.00, 'ts': '2030-01-01T10:00:00Z'},
+            {'parcel_id': parcels[0].id, 'lat': 40.69, 'lng': -73.98, 'ts': '2030-01-01T10:01:00Z'},
+            {'parcel_id': parcels[1].id, 'lat': 40.68, 'lng': -73.95, 'ts': 1893492000},
+            {'parcel_id': 9999, 'lat': 40.0, 'lng': -74.0},
+            {'parcel_id': parcels[1].id, 'lat': 200, 'lng': -74.0}
+        ]
+        # The worker's first role check loads its copy of the revocations
+        client.get('/api/admin/parcels?limit=1', headers=admin_headers)
+        response = client.post('/api/admin/parcels/locations', json=points, headers=admin_headers)
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['accepted'] == 3
+        assert [item['index'] for item in data['rejected']] == [3, 4]
+        assert int(response.headers['X-Query-Count']) <= 3
+        
+        response = client.get('/api/parcels/track/TEST0')
+        data = json.loads(response.data)
+        assert data['currentLocation'] == {'lat': 40.69, 'lng': -73.98}
+        assert len(data['timeline']) == 2
+
+    def test_write_behind_locations_visible_before_flush(self, app, client, admin_headers):
+        from server.utils.location_buffer import flush_location_buffer
+        app.config['LOCATION_WRITE_BEHIND'] = True
+        admin = User.query.filter_by(email='admin@example.com').first()
+        parcel = Parcel(
+            tracking_number='TEST123',
+            sender_name='John Doe',
+            receiver_name='Jane Smith',
+            pickup_address='123 Main St',
+            destination_address='456 Oak Ave',
+            pickup_lat=40.7128,
+            pickup_lng=-74.0060,
+            destination_lat=40.6782,
+            destination_lng=-73.9442,
+            weight=2.5,
+            price=15.99,
+            user_id=admin.id
+        )
+        db.session.add(parcel)
+        db.session.commit()
+        
+        points = [{'parcel_id': parcel.id, 'lat': 40.70 - i * 0.01, 'lng': -74.0, 'ts': f'2030-01-01T10:0{i}:00Z'}
+                  for i in range(3)]
+        response = client.post('/api/admin/parcels/locations', json=points, headers=admin_headers)
+        assert response.status_code == 202
+        assert Location.query.count() == 0
+        
+        response = client.get('/api/parcels/track/TEST123')
+        assert json.loads(response.data)['currentLocation'] == {'lat': 40.68, 'lng': -74.0}
+        
+        # Only the newest ping per parcel is written
+        assert flush_location_buffer() == 1
+        db.session.refresh(parcel)
+        assert (parcel.current_lat, parcel.current_lng) == (40.68, -74.0)
+        assert Location.query.count() == 1
+
+    def test_find_parcels_nearby(self, client, admin_headers):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        # 0, ~1.1 km and ~11 km north of the search center
+        for i, offset in enumerate([0.0, 0.01, 0.1]):
+            db.session.add(Parcel(
+                tracking_number=f'NEAR{i}',
+                sender_name='John Doe',
+                receiver_name='Jane Smith',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                pickup_lat=40.7128 + offset,
+                pickup_lng=-74.0060,
+                destination_lat=40.6782,
+                destination_lng=-73.9442,
+                weight=2.5,
+                price=15.99,
+                user_id=admin.id
+            ))
+        db.session.commit()
+        assert Parcel.query.filter_by(tracking_number='NEAR0').first().geohash.startswith('dr5r')
+        
+        response = client.get('/api/admin/parcels/nearby?lat=40.7128&lng=-74.0060&radius=2000',
+                              headers=admin_headers)
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['count'] == 2
+        assert [p['trackingNumber'] for p in data['parcels']] == ['NEAR0', 'NEAR1']
+        assert 1000 < data['parcels'][1]['distance'] < 1200
+        
+        response = client.get('/api/admin/parcels/nearby?bbox=-74.1,40.7,-73.9,40.9&fields=trackingNumber',
+                              headers=admin_headers)
+        assert json.loads(response.data) == {'count': 3, 'unindexed': 0, 'parcels': [
+            {'trackingNumber': 'NEAR0'}, {'trackingNumber': 'NEAR1'}, {'trackingNumber': 'NEAR2'}
+        ]}
+        
+        response = client.get('/api/admin/parcels/nearby?lat=40.7128&lng=-74.0060&radius=20000&limit=1',
+                              headers=admin_headers)
+        data = json.loads(response.data)
+        assert data['count'] == 3
+        assert [p['trackingNumber'] for p in data['parcels']] == ['NEAR0']
+        
+        # Rows from before the geohash column are reported until backfilled
+        db.session.execute(update(Parcel).where(Parcel.tracking_number == 'NEAR2').values(geohash=None))
+        db.session.commit()
+        response = client.get('/api/admin/parcels/nearby?bbox=-74.1,40.7,-73.9,40.9', headers=admin_headers)
+        assert (json.loads(response.data)['count'], json.loads(response.data)['unindexed']) == (2, 1)
+        
+        client.application.config['NEARBY_MAX_CANDIDATES'] = 1
+        response = client.get('/api/admin/parcels/nearby?lat=40.7128&lng=-74.0060&radius=2000',
+                              headers=admin_headers)
+        assert response.status_code == 400
+        
+        response = client.get('/api/admin/parcels/nearby?lat=40.7', headers=admin_headers)
+        assert response.status_code == 400
+
+    def test_parcel_clusters(self, client, admin_headers):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        parcels = []
+        for i, (lat, lng, status) in enumerate([(40.71, -74.00, 'pending'), (40.72, -74.01, 'in_transit'),
+                                                (40.71, -74.01, 'delivered'), (41.50, -73.00, 'pending')]):
+            parcels.append(Parcel(
+                tracking_number=f'MAP{i}',
+                sender_name='John Doe',
+                receiver_name='Jane Smith',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                pickup_lat=lat,
+                pickup_lng=lng,
+                destination_lat=40.6782,
+                destination_lng=-73.9442,
+                weight=2.5,
+                price=15.99,
+                status=status,
+                user_id=admin.id
+            ))
+        db.session.add_all(parcels)
+        db.session.commit()
+        
+        # Delivered parcels aren't on the live map
+        response = client.get('/api/admin/parcels/clusters?bbox=-75,40,-72,42&zoom=5', headers=admin_headers)
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['total'] == 3
+        assert len(data['clusters']) == 1
+        assert data['clusters'][0]['statuses'] == {'pending': 2, 'in_transit': 1}
+        
+        # Zoomed in, the two parcels near the city are one cluster
+        response = client.get('/api/admin/parcels/clusters?bbox=-75,40,-72,42&zoom=9', headers=admin_headers)
+        clusters = sorted(json.loads(response.data)['clusters'], key=lambda cluster: cluster['count'])
+        assert [cluster['count'] for cluster in clusters] == [1, 2]
+        assert clusters[1]['centroid'] == {'lat': 40.715, 'lng': -74.005}
+        
+        # Location updates move parcels between clusters without a rebuild
+        response = client.put(f'/api/admin/parcels/{parcels[1].id}/location',
+                              json={'currentLocation': {'lat': 41.5, 'lng': -73.0}}, headers=admin_headers)
+        assert response.status_code == 200
+        response = client.get('/api/admin/parcels/clusters?bbox=-75,40,-72,42&zoom=9&status=in_transit',
+                              headers=admin_headers)
+        clusters = json.loads(response.data)['clusters']
+        assert len(clusters) == 1
+        assert clusters[0]['centroid'] == {'lat': 41.5, 'lng': -73.0}
+        
+        # So do moves of a few meters that stay in the same cell
+        client.put(f'/api/admin/parcels/{parcels[1].id}/location',
+                   json={'currentLocation': {'lat': 41.50002, 'lng': -73.00002}}, headers=admin_headers)
+        response = client.get('/api/admin/parcels/clusters?bbox=-75,40,-72,42&zoom=9&status=in_transit',
+                              headers=admin_headers)
+        assert json.loads(response.data)['clusters'][0]['centroid'] == {'lat': 41.50002, 'lng': -73.00002}
+        
+        response = client.get('/api/admin/parcels/clusters?bbox=-75,40,-72,42', headers=admin_headers)
+        assert response.status_code == 400
+
+    def test_admin_analytics_from_rollups(self, client, admin_headers):
+        from server.utils.analytics import backfill_rollups
+        # The app imports utils.analytics and tests server.utils.analytics, a
+        # second copy of the module must not count every parcel twice
+        spec = importlib.util.spec_from_file_location('analytics_copy', inspect.getfile(backfill_rollups))
+        spec.loader.exec_module(importlib.util.module_from_spec(spec))
+        admin = User.query.filter_by(email='admin@example.com').first()
+        parcels = []
+        for i in range(3):
+            parcel = Parcel(
+                tracking_number=f'STAT{i}',
+                sender_name='John Doe',
+                receiver_name='Jane Smith',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                pickup_lat=40.7128,
+                pickup_lng=-74.0060,
+                destination_lat=40.6782,
+                destination_lng=-73.9442,
+                weight=2.0,
+                price=10.0 * (i + 1),
+                user_id=admin.id
+            )
+            parcel.locations.append(Location(status='pending', location_description='123 Main St'))
+            parcels.append(parcel)
+        db.session.add_all(parcels)
+        db.session.commit()
+        
+        client.put(f'/api/admin/parcels/{parcels[0].id}/status', json={'status': 'delivered'}, headers=admin_headers)
+        client.put(f'/api/admin/parcels/{parcels[1].id}/status', json={'status': 'cancelled'}, headers=admin_headers)
+        
+        response = client.get('/api/admin/analytics?range=week', headers=admin_headers)
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['totalParcels'] == 3
+        assert data['totalDeliveries'] == 1
+        assert data['successRate'] == 50.0
+        assert data['revenue'] == 10.0
+        assert data['totalWeight'] == 6.0
+        assert data['dailyDeliveries'] == [0, 0, 0, 0, 0, 0, 1]
+        assert data['statusBreakdown'] == {'pending': 1, 'delivered': 1, 'cancelled': 1}
+        
+        # Rebuilding from the parcels gives the same numbers
+        assert backfill_rollups() == 3
+        response = client.get('/api/admin/analytics?range=week', headers=admin_headers)
+        assert json.loads(response.data) == data
+        
+        response = client.get('/api/admin/analytics?range=decade', headers=admin_headers)
+        assert response.status_code == 400
+
+    def test_parcel_eta(self, client, admin_headers):
+        from datetime import datetime, timedelta
+        from server.utils.eta import invalidate_etas, compute_etas
+        admin = User.query.filter_by(email='admin@example.com').first()
+        parcel = Parcel(
+            tracking_number='TEST123',
+            sender_name='John Doe',
+            receiver_name='Jane Smith',
+            pickup_address='123 Main St',
+            destination_address='456 Oak Ave',
+            pickup_lat=0.0,
+            pickup_lng=36.0,
+            destination_lat=0.5,
+            destination_lng=36.0,
+            current_lat=0.1,
+            current_lng=36.0,
+            weight=2.5,
+            price=15.99,
+            status='in_transit',
+            user_id=admin.id
+        )
+        # ~1.1 km a minute for the last ten minutes
+        now = datetime.utcnow()
+        for minute in range(11):
+            parcel.locations.append(Location(status='in_transit', location_description='GPS',
+                                             latitude=0.01 * minute, longitude=36.0,
+                                             timestamp=now - timedelta(minutes=10 - minute)))
+        db.session.add(parcel)
+        db.session.commit()
+        
+        response = client.get('/api/parcels/track/TEST123')
+        eta = json.loads(response.data)['eta']
+        assert eta['speed'] == 66.7
+        assert 57000 < eta['distanceRemaining'] < 58500  # 0.4 degrees by road
+        
+        # A recomputed ETA is a new representation even though the parcel isn't
+        etag = response.headers['ETag']
+        assert client.get('/api/parcels/track/TEST123', headers={'If-None-Match': etag}).status_code == 304
+        invalidate_etas(parcel.id)
+        response = client.get('/api/parcels/track/TEST123', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert json.loads(response.data)['eta']['computedAt'] != eta['computedAt']
+        
+        response = client.get('/api/admin/parcels/eta?limit=1', headers=admin_headers)
+        data = json.loads(response.data)
+        assert (data['count'], data['next_cursor']) == (1, None)
+        assert data['etas'][0]['id'] == parcel.id
+        # The whole fleet at once selects GPS fixes by status, not by an id list
+        assert compute_etas()[parcel.id]['speed'] == 66.7
+        too_many = ','.join(str(n) for n in range(client.application.config['MAX_PAGE_SIZE'] + 1))
+        assert client.get(f'/api/admin/parcels/eta?ids={too_many}', headers=admin_headers).status_code == 400
+        
+        # Moving the parcel refreshes its ETA; delivered parcels have none
+        client.put(f'/api/admin/parcels/{parcel.id}/location', json={'currentLocation': {'lat': 0.4, 'lng': 36.0}},
+                   headers=admin_headers)
+        eta = json.loads(client.get('/api/parcels/track/TEST123').data)['eta']
+        assert eta['distanceRemaining'] < 15000
+        client.put(f'/api/admin/parcels/{parcel.id}/status', json={'status': 'delivered'}, headers=admin_headers)
+        assert json.loads(client.get('/api/parcels/track/TEST123').data)['eta'] is None
+
+    def test_dispatch_assigns_pending_parcels_within_capacity(self, app, client, admin_headers):
+        app.config['DISPATCH_COURIER_CAPACITY_KG'] = 10
+        admin = User.query.filter_by(email='admin@example.com').first()
+        couriers = [User(name=f'Courier {i}', email=f'courier{i}@example.com', phone='+1234567890',
+                         password_hash='x', role='courier') for i in range(2)]
+        db.session.add_all(couriers)
+        # Two pickup spots across town, 24 kg pending for 20 kg of couriers
+        for i in range(8):
+            db.session.add(Parcel(
+                tracking_number=f'DISP{i}',
+                sender_name='John Doe',
+                receiver_name='Jane Smith',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                pickup_lat=-1.28 if i % 2 else -1.20,
+                pickup_lng=36.82,
+                destination_lat=-1.30,
+                destination_lng=36.80,
+                weight=3.0,
+                price=15.99,
+                user_id=admin.id
+            ))
+        db.session.commit()
+        
+        response = client.post('/api/admin/dispatch', headers=admin_headers)
+        assert response.status_code == 202
+        job = json.loads(response.data)
+        assert job['status'] == 'done'
+        assert (job['parcels'], job['couriers'], job['assigned'], job['unassigned']) == (8, 2, 6, 2)
+        
+        response = client.get(f"/api/admin/dispatch/{job['id']}", headers=admin_headers)
+        assert json.loads(response.data)['assigned'] == 6
+        loads = {}
+        for parcel in Parcel.query.filter(Parcel.courier_id.isnot(None)):
+            loads.setdefault(parcel.courier_id, []).append(parcel.pickup_lat)
+        assert {len(lats) for lats in loads.values()} == {3}
+        assert all(len(set(lats)) == 1 for lats in loads.values())  # one pickup spot each
+        
+        # Couriers are full now, so a second run assigns nothing
+        job = json.loads(client.post('/api/admin/dispatch', headers=admin_headers).data)
+        assert (job['parcels'], job['assigned']) == (2, 0)
+        assert client.get('/api/admin/dispatch/unknown', headers=admin_headers).status_code == 404
+
+    def test_dispatch_is_shared_between_workers(self, app, client, admin_headers):
+        from server.models import DispatchJob
+        from server.utils.dispatch import load_dispatch_batch, apply_assignments
+        app.config['DISPATCH_COURIER_CAPACITY_KG'] = 10
+        admin = User.query.filter_by(email='admin@example.com').first()
+        courier = User(name='Courier', email='courier@example.com', phone='+1234567890',
+                       password_hash='x', role='courier')
+        db.session.add(courier)
+        for i in range(3):
+            db.session.add(Parcel(
+                tracking_number=f'DISP{i}',
+                sender_name='John Doe',
+                receiver_name='Jane Smith',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                pickup_lat=-1.28,
+                pickup_lng=36.82,
+                destination_lat=-1.30,
+                destination_lng=36.80,
+                weight=4.0,
+                price=15.99,
+                user_id=admin.id
+            ))
+        db.session.commit()
+        
+        # Another worker's run gave the courier a parcel after this batch was loaded
+        parcels, couriers, tracking_numbers = load_dispatch_batch(10)
+        assert couriers['capacities'] == [10]
+        first = Parcel.query.filter_by(tracking_number='DISP0').first()
+        first.courier_id = courier.id
+        db.session.commit()
+        assignments = {parcel_id: courier.id for parcel_id in parcels['parcel_ids'][1:]}
+        assert apply_assignments(assignments, tracking_numbers) == 1
+        assert Parcel.query.filter_by(courier_id=courier.id).count() == 2
+        
+        # A run started by another worker blocks new ones and can be polled here
+        db.session.add(DispatchJob(id='other', status='running', running=True, parcels=5))
+        db.session.commit()
+        response = client.post('/api/admin/dispatch', headers=admin_headers)
+        assert response.status_code == 409
+        assert json.loads(response.data)['job']['id'] == 'other'
+        assert json.loads(client.get('/api/admin/dispatch/other', headers=admin_headers).data)['parcels'] == 5
+        
+        # Unless it's been running so long its worker must have died
+        app.config['DISPATCH_JOB_TIMEOUT'] = 0
+        assert client.post('/api/admin/dispatch', headers=admin_headers).status_code == 202
+        assert json.loads(client.get('/api/admin/dispatch/other', headers=admin_headers).data)['status'] == 'failed'
+
+    def test_courier_route_plan(self, client, admin_headers):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        courier = User(name='Courier', email='courier@example.com', phone='+1234567890',
+                       password_hash='x', role='courier')
+        db.session.add(courier)
+        db.session.flush()
+        # Along a road north: A picks up at 0.01 for 0.03, B at 0.02 for 0.04,
+        # C is already on board for 0.005
+        for number, status, pickup, destination in [('A', 'pending', 0.01, 0.03), ('B', 'pending', 0.02, 0.04),
+                                                    ('C', 'in_transit', 0.0, 0.005)]:
+            db.session.add(Parcel(
+                tracking_number=f'ROUTE{number}',
+                sender_name='John Doe',
+                receiver_name='Jane Smith',
+                pickup_address='123 Main St',
+                destination_address='456 Oak Ave',
+                pickup_lat=pickup,
+                pickup_lng=36.0,
+                destination_lat=destination,
+                destination_lng=36.0,
+                weight=1.0,
+                price=15.99,
+                status=status,
+                user_id=admin.id,
+                courier_id=courier.id
+            ))
+        db.session.commit()
+        
+        response = client.get(f'/api/admin/couriers/{courier.id}/route?lat=0.04&lng=36.0&budgetMs=100',
+                              headers=admin_headers)
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        stops = [(stop['trackingNumber'], stop['type']) for stop in data['stops']]
+        # Starting at the far end the pickups have to come before their drop-offs
+        assert stops == [('ROUTEB', 'pickup'), ('ROUTEA', 'pickup'), ('ROUTEC', 'dropoff'),
+                         ('ROUTEA', 'dropoff'), ('ROUTEB', 'dropoff')]
+        assert data['converged'] is True
+        assert data['distance'] == pytest.approx(sum(stop['distanceFromPrevious'] for stop in data['stops']), abs=0.5)
+        
+        # The distance matrix is reused for the same stops
+        response = client.get(f'/api/admin/couriers/{courier.id}/route', headers=admin_headers)
+        assert json.loads(response.data)['matrixCached'] is True
+        
+        response = client.get(f'/api/admin/couriers/{courier.id}/route?budgetMs=100000', headers=admin_headers)
+        assert response.status_code == 400
+        assert client.get(f'/api/admin/couriers/{admin.id}/route', headers=admin_headers).status_code == 404
+
     def test_non_admin_cannot_access_admin_endpoints(self, client, auth_headers):
         response = client.get('/api/admin/parcels', headers=auth_headers)
         assert response.status_code == 403
\ No newline at end of file
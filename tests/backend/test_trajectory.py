@@ -0,0 +1,105 @@
+import pytest
+from datetime import datetime, timedelta
+from server.app import create_app
+from server.models import db, User, Parcel, Location
+from server.config import Config
+from server.utils.trajectory import douglas_peucker, compact_trajectories
+from server.utils import polyline
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    JWT_SECRET_KEY = 'test-secret-key'
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config.from_object(TestConfig)
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def parcel(app):
+    user = User(name='Test User', email='test@example.com', phone='+1234567890', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    parcel = Parcel(
+        tracking_number='TEST123',
+        sender_name='John Doe',
+        receiver_name='Jane Smith',
+        pickup_address='123 Main St',
+        destination_address='456 Oak Ave',
+        pickup_lat=40.0,
+        pickup_lng=-74.0,
+        destination_lat=40.1,
+        destination_lng=-74.0,
+        weight=2.5,
+        price=15.99,
+        user_id=user.id
+    )
+    db.session.add(parcel)
+    db.session.flush()
+    
+    # 100 GPS fixes due north, with a status change and a manual entry midway
+    start = datetime.utcnow() - timedelta(days=1)
+    for i in range(100):
+        lat = 40.0 + i * 0.001
+        status = 'picked_up' if i < 50 else 'in_transit'
+        description = 'Sorting hub' if i == 70 else f'Lat: {lat}, Lng: -74.0'
+        db.session.add(Location(status=status, location_description=description, latitude=lat,
+                                longitude=-74.0, timestamp=start + timedelta(seconds=10 * i),
+                                parcel_id=parcel.id))
+    db.session.commit()
+    return parcel
+
+class TestTrajectory:
+    def test_douglas_peucker_keeps_corners(self):
+        coords = [(0, 0), (0, 0.001), (0, 0.002), (0.001, 0.002), (0.002, 0.002)]
+        assert douglas_peucker(coords, tolerance_m=5) == [0, 2, 4]
+
+    def test_simplify_on_read(self, client, parcel):
+        response = client.get('/api/parcels/track/TEST123', query_string={'simplify': 10})
+        
+        assert response.status_code == 200
+        timeline = response.get_json()['timeline']
+        # Pinned entries plus the ends of each straight stretch between them
+        kept = [0, 1, 49, 50, 51, 69, 70, 71, 98, 99]
+        assert [entry['location'] for entry in timeline] == [
+            'Sorting hub' if i == 70 else f'Lat: {40.0 + i * 0.001}, Lng: -74.0' for i in kept
+        ]
+        assert client.get('/api/parcels/track/TEST123', query_string={'simplify': 'x'}).status_code == 400
+
+    def test_compaction_preserves_status_changes(self, app, parcel):
+        assert compact_trajectories(10, min_age_s=3600) == (1, 90)
+        
+        kept = Location.query.order_by(Location.timestamp).all()
+        first_in_transit = next(location for location in kept if location.status == 'in_transit')
+        assert first_in_transit.latitude == pytest.approx(40.05)
+        assert 'Sorting hub' in [location.location_description for location in kept]
+        assert compact_trajectories(10, min_age_s=3600) == (0, 0)
+
+    def test_polyline_round_trip(self):
+        coords = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+        assert polyline.encode(coords) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+        assert polyline.decode(polyline.encode(coords)) == coords
+
+    def test_compact_timeline_format(self, client, parcel):
+        verbose = client.get('/api/parcels/track/TEST123')
+        compact = client.get('/api/parcels/track/TEST123', query_string={'timeline': 'compact'})
+        
+        assert compact.status_code == 200
+        assert len(compact.data) < len(verbose.data) / 4
+        assert compact.headers['ETag'] != verbose.headers['ETag']
+        timeline = compact.get_json()['timeline']
+        assert timeline['count'] == 100
+        assert polyline.decode(timeline['points'])[-1] == (40.099, -74.0)
+        assert timeline['timestamps'][1:] == [10] * 99
+        assert timeline['statuses'] == [[0, 'picked_up'], [50, 'in_transit']]
+        assert timeline['locations'] == {'70': 'Sorting hub'}